@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Decimation before fitting a long recording (examples/batch/
+water_level.csv, about 24000 samples): time and deviation of 
+the results from the fit of all data, for pt3_sim and for the
+inflectional tangent method, with each decimation method, 
+several sizes and with polishing on all data.
+'''
+
+import os
+import time
+import warnings
+
+from sitforc import load_csv, modellib
+from sitforc.core import ITMIdentifier
+from sitforc.fitting import ModelFitter
+
+FNAME = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch',
+                     'water_level.csv')
+SIZES = [500, 2000, 4000]
+METHODS = ['uniform', 'bin', 'lttb', 'minmax']
+MODEL = modellib.pt3_sim
+
+def best_time(func, repeat=5):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        result = func()
+        times.append(time.time() - start)
+    return min(times), result
+
+def deviation(params, expected):
+    return max(abs(params[key] / expected[key] - 1) for key in expected)
+
+warnings.simplefilter('ignore')
+x, y = load_csv(FNAME, cache=False)
+t_model, mf = best_time(lambda: ModelFitter(x, y, MODEL, guess=True))
+t_itm, itmi = best_time(lambda: ITMIdentifier(x, y))
+expected = dict(tu=itmi.tu, tg=itmi.tg)
+print '{0} samples: {1} {2:.1f}ms, itm {3:.1f}ms'.format(
+    len(x), MODEL.name, t_model * 1e3, t_itm * 1e3)
+print '{0:<8}{1:>6}{2:>7}{3:>11}{4:>10}{5:>11}{6:>10}'.format(
+    'method', 'size', 'polish', 'model', 'error', 'itm', 'error')
+for method in METHODS:
+    for size in SIZES:
+        for polish in (False, True):
+            options = dict(decimate=(size, method), polish=polish)
+            t1, mf2 = best_time(lambda: ModelFitter(x, y, MODEL, guess=True,
+                                                    **options))
+            t2, itmi2 = best_time(lambda: ITMIdentifier(x, y, **options))
+            print ('{0:<8}{1:>6}{2:>7}{3:>9.1f}ms{4:>9.2%}{5:>9.1f}ms'
+                   '{6:>9.2%}').format(
+                method, size, polish, t1 * 1e3, 
+                deviation(mf2.params, mf.params), t2 * 1e3, 
+                deviation(dict(tu=itmi2.tu, tg=itmi2.tg), expected))
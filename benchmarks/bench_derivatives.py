@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Evaluation of the 1st-3rd derivation of fitted models on a 
+20000 point series: the old pipeline (sympy differentiation, 
+string conversion and eval for each order) against the compiled 
+derivations of the model (``Model.derivative``).
+'''
+
+import timeit
+
+import numpy
+
+from sitforc import modellib, numlib, symlib
+from sitforc.fitting import ModelFitter
+
+SIZE = 20000
+ORDERS = [1, 2, 3]
+MODELS = ['pt1', 'pt2', 'pt3', 'pt3_sim', 'exp_approach']
+
+def old_derivates(mf):
+    params = dict((key, float(value)) for key, value in mf.params.items())
+    sym_func = symlib.generate_sym_func(mf.model.funcstring, params)
+    values = []
+    for n in ORDERS:
+        sym_func = symlib.diff_func(sym_func, 1)
+        func = numlib.generate_func(sym_func)
+        values.append(func(mf.x, None))
+    return values
+
+def new_derivates(mf):
+    mf.data_cache = {0: mf.data_cache[0]}
+    return [mf.get_values(n) for n in ORDERS]
+
+x = numpy.linspace(0.01, 10, SIZE)
+print '{0:<14}{1:>12}{2:>12}{3:>12}{4:>10}'.format(
+    'Model', 'sympy', 'compile', 'compiled', 'Speedup')
+for name in MODELS:
+    model = modellib[name]
+    mf = ModelFitter(x, model(x), model)
+    t_old = min(timeit.repeat(lambda: old_derivates(mf), number=1, 
+                              repeat=3))
+    model._derivatives.clear()
+    model._derivative_sources.clear()
+    t_cold = timeit.timeit(lambda: new_derivates(mf), number=1)
+    t_new = min(timeit.repeat(lambda: new_derivates(mf), number=1, 
+                              repeat=10))
+    for old, new in zip(old_derivates(mf), new_derivates(mf)):
+        assert numpy.allclose(old, new)
+    print '{0:<14}{1:>10.1f}ms{2:>10.1f}ms{3:>10.2f}ms{4:>9.0f}x'.format(
+        name, t_old * 1e3, t_cold * 1e3, t_new * 1e3, t_old / t_new)
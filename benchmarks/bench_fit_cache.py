@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Refitting pt2 like the GUI and a monitoring loop do: the data is
+shifted step by step, grows by new chunks of samples and every
+tenth fit repeats the previous data. ``ModelFitter`` from the
+default parameters against ``FitCache.fit``.
+'''
+
+import time
+import warnings
+
+import numpy
+
+from sitforc import modellib
+from sitforc.core import shift_data
+from sitforc.fitting import FitCache, ModelFitter
+
+FITS = 200
+
+def datasets():
+    rng = numpy.random.RandomState(0)
+    x = numpy.linspace(0, 60, 6000)
+    y = modellib.pt2(x, dict(c=3.2, t1=6.0, t2=2.5)) 
+    y += 0.02 * rng.randn(len(x))
+    data = []
+    for i in range(FITS):
+        if i % 10 == 9:
+            data.append(data[-1])
+        elif i % 2:
+            data.append(shift_data(x, y, 0.01 * i))
+        else:
+            n = 3000 + 15 * i
+            data.append((x[:n], y[:n]))
+    return data
+
+def run(fit, data):
+    start = time.time()
+    for x, y in data:
+        mf = fit(x, y, modellib.pt2)
+        assert mf.success
+    return time.time() - start
+
+warnings.simplefilter('ignore')
+data = datasets()
+t_plain = run(ModelFitter, data)
+cache = FitCache()
+t_cache = run(cache.fit, data)
+print 'ModelFitter: {0:8.1f}ms'.format(t_plain * 1e3)
+print 'FitCache:    {0:8.1f}ms  ({1:.1f}x)'.format(t_cache * 1e3, 
+                                                   t_plain / t_cache)
+print 'Statistics: ', cache.stats
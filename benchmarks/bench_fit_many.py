@@ -0,0 +1,61 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Fitting pt2 to 200 noisy channels on a shared time axis: a loop
+over ``numlib.modelfit`` against the batched Levenberg-Marquardt
+of ``ModelFitter.fit_many``, for several series lengths.
+'''
+
+import time
+import warnings
+
+import numpy
+
+from sitforc import modellib, numlib
+from sitforc.fitting import ModelFitter
+
+CHANNELS = 200
+SAMPLES = [100, 500, 2000, 20000]
+
+def loop(x, Y, model):
+    params = []
+    for y in Y:
+        p = dict(model.default_params)
+        numlib.modelfit(model, p, x, y)
+        params.append([p[name] for name in model.param_names])
+    return numpy.array(params)
+
+def rss(model, x, Y, params):
+    return numpy.array([numpy.sum((y - model.vfunc(x, p))**2) 
+                        for y, p in zip(Y, params)])
+
+def best_time(func, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+warnings.simplefilter('ignore')
+model = modellib.pt2
+rng = numpy.random.RandomState(0)
+print '{0:>8}{1:>12}{2:>12}{3:>9}{4:>11}{5:>10}'.format(
+    'Samples', 'loop', 'fit_many', 'Speedup', 'Converged', 'Worse')
+for n in SAMPLES:
+    x = numpy.linspace(0, 20, n)
+    theta = numpy.c_[rng.uniform(1, 5, CHANNELS), 
+                     rng.uniform(0.3, 1.5, CHANNELS),
+                     rng.uniform(1.6, 4, CHANNELS)]
+    Y = numpy.array([model.vfunc(x, t) for t in theta])
+    Y += 0.01 * rng.randn(*Y.shape)
+    
+    params, success = ModelFitter.fit_many(x, Y, model)
+    worse = rss(model, x, Y, params) > 1.0001 * rss(model, x, Y, 
+                                                    loop(x, Y, model))
+    t_loop = best_time(lambda: loop(x, Y, model))
+    t_many = best_time(lambda: ModelFitter.fit_many(x, Y, model))
+    print '{0:>8}{1:>10.1f}ms{2:>10.1f}ms{3:>8.1f}x{4:>11}{5:>10}'.format(
+        n, t_loop * 1e3, t_many * 1e3, t_loop / t_many, success.sum(), 
+        worse.sum())
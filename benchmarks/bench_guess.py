@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Fitting noisy step responses of different scales: start from the
+default parameters of the model against the estimated start
+parameters (``guess=True``) and the multi-start fit
+(``guess="multistart"``). Counts the evaluations of the model
+and of its Jacobian and the failed fits.
+'''
+
+import time
+import warnings
+
+import numpy
+
+from sitforc import modellib
+from sitforc.fitting import ModelFitter
+
+MODELS = ['pt1', 'pt2', 'pt3', 'pt3_sim', 'exp_approach']
+SCALES = [0.2, 1.0, 5.0, 25.0]
+
+class Counted(object):
+    '''
+    Model wrapper which counts the function evaluations.
+    '''
+    def __init__(self, model):
+        self.model = model
+        self.name = model.name
+        self.default_params = model.default_params
+        self.param_names = model.param_names
+        self.func = model.func
+        self.calls = 0
+        
+    def vfunc(self, x, theta):
+        self.calls += 1
+        return self.model.vfunc(x, theta)
+    
+    def __call__(self, x, params):
+        return self.model(x, params)
+    
+    @property
+    def jacobian(self):
+        return self.model.jacobian
+    
+warnings.simplefilter('ignore')
+rng = numpy.random.RandomState(0)
+print '{0:<14}{1:>12}{2:>8}{3:>8}{4:>10}'.format(
+    'Model', 'mode', 'evals', 'failed', 'time')
+for name in MODELS:
+    model = modellib[name]
+    data = []
+    for scale in SCALES:
+        params = dict((key, value * scale) for key, value 
+                      in model.default_params.items())
+        params['c'] = model.default_params['c'] / scale
+        span = 10 * sum(value for key, value in params.items() 
+                        if key != 'c')
+        x = numpy.linspace(0, span, 2000)
+        y = model(x, params)
+        data.append((x, y + 0.01 * abs(params['c']) * rng.randn(len(x))))
+    for mode in (False, True, 'multistart'):
+        counted = Counted(model)
+        failed = 0
+        start = time.time()
+        for x, y in data:
+            mf = ModelFitter(x, y, counted, guess=mode)
+            rss = numpy.sum((y - mf.y)**2)
+            failed += not (mf.success and rss < 0.01 * numpy.sum(y**2))
+        wall = time.time() - start
+        print '{0:<14}{1:>12}{2:>8}{3:>8}{4:>8.1f}ms'.format(
+            name, str(mode), counted.calls, failed, wall * 1e3)
@@ -0,0 +1,46 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Import time of ``sitforc`` in a fresh interpreter, compared 
+with importing all dependencies eagerly (as ``sitforc`` did 
+before plotting and sympy were loaded lazily).
+'''
+
+import os
+import subprocess
+import sys
+
+REPEAT = 5
+HEAVY = ['sympy', 'matplotlib', 'matplotlib.pyplot', 'gtk']
+
+STATEMENTS = [
+    ('import sitforc', 'import sitforc'),
+    ('load_csv + ModelFitter', 
+     'import numpy; from sitforc import load_csv, ModelFitter, modellib; '
+     'x = numpy.linspace(0, 5, 100); '
+     'ModelFitter(x, modellib.pt1(x), modellib.pt1).y'),
+    ('eager dependencies', 
+     'import numpy, scipy.optimize, configobj, sympy, matplotlib.pyplot'),
+]
+
+SCRIPT = '''
+import sys, time
+start = time.time()
+{0}
+print time.time() - start
+print ','.join(m for m in {1!r} if m in sys.modules)
+'''
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+env = dict(os.environ, PYTHONPATH=root, MPLBACKEND='Agg')
+print '{0:<26}{1:>10}  {2}'.format('Statement', 'Time', 'Heavy modules')
+for name, statement in STATEMENTS:
+    times = []
+    for i in xrange(REPEAT):
+        output = subprocess.check_output(
+            [sys.executable, '-c', SCRIPT.format(statement, HEAVY)], env=env)
+        seconds, modules = output.splitlines()[-2:]
+        times.append(float(seconds))
+    print '{0:<26}{1:>8.0f}ms  {2}'.format(name, min(times) * 1e3, 
+                                          modules or '-')
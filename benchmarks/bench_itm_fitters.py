@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Approximation for the inflectional tangent method on the
+bundled batch files: global polynomial (``PolyFitter``, 
+degree 11 and 21) against the quintic regression spline 
+(``SplineFitter``). Reports the fit and inflection point time,
+the maximum residual and the first inflection point.
+'''
+
+import glob
+import os
+import timeit
+import warnings
+
+import numpy
+
+from sitforc.fitting import PolyFitter, SplineFitter
+from sitforc.iolib import load_csv
+
+FITTERS = [('poly 11', lambda x, y: PolyFitter(x, y, 11, 'chebyshev')),
+           ('poly 21', lambda x, y: PolyFitter(x, y, 21, 'chebyshev')),
+           ('spline 16', lambda x, y: SplineFitter(x, y, 16)),
+           ('spline 32', lambda x, y: SplineFitter(x, y, 32))]
+
+def itm(fitter, x, y):
+    f = fitter(x, y)
+    return f, f.get_inflec_points()
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch')
+warnings.simplefilter('ignore')
+print '{0:<18}{1:>8}{2:<11}{3:>10}{4:>12}{5:>12}'.format(
+    'File', 'Samples', '  Fitter', 'Time', 'Max error', 'Inflection')
+for fname in sorted(glob.glob(os.path.join(folder, '*.csv'))):
+    x, y = load_csv(fname, cache=False)
+    for name, fitter in FITTERS:
+        f, points = itm(fitter, x, y)
+        t = min(timeit.repeat(lambda: itm(fitter, x, y), number=1, 
+                              repeat=5))
+        inflec = points['x'][0] if len(points) else numpy.nan
+        print '{0:<18}{1:>8}  {2:<9}{3:>8.2f}ms{4:>12.4f}{5:>12.3f}'.format(
+            os.path.basename(fname), len(x), name, t * 1e3, 
+            numpy.abs(f.y - y).max(), inflec)
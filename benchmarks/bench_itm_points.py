@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Inflectional tangent method on the water level recording:
+split point search with the former Python loop against the
+vectorized search, and switching between the points of 
+inflection (first calculation against cached results).
+'''
+
+import os
+import timeit
+from itertools import izip
+
+import numpy
+
+from sitforc.core import ITMIdentifier
+from sitforc.iolib import load_csv
+
+def loop_split_point(itmi, begin, slope):
+    x = itmi.fitter.x
+    y = itmi.fitter.get_values(1)
+    i = numpy.nonzero(x > begin)
+    x, y = x[i], y[i]
+    for x_val, y_val in izip(x, y):
+        if abs(y_val - slope) > 0.1:
+            return x_val
+
+def switch(itmi):
+    for num in range(len(itmi.i_points)):
+        itmi.calculate_inflec_point(num)
+        itmi.t_x, itmi.t_y
+
+fname = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch',
+                     'water_level.csv')
+x, y = load_csv(fname, cache=False)
+itmi = ITMIdentifier(x, y, 11)
+begin, _, slope = itmi.i_points[0]
+assert (loop_split_point(itmi, begin, slope) == 
+        itmi._calculate_split_point(begin, slope))
+
+t_loop = min(timeit.repeat(lambda: loop_split_point(itmi, begin, slope), 
+                           number=10, repeat=3)) / 10
+t_vec = min(timeit.repeat(lambda: itmi._calculate_split_point(begin, slope),
+                          number=10, repeat=3)) / 10
+print 'Split point: loop {0:.2f}ms, vectorized {1:.2f}ms'.format(
+    t_loop * 1e3, t_vec * 1e3)
+
+t_first = timeit.timeit(lambda: switch(itmi), number=1)
+t_cached = min(timeit.repeat(lambda: switch(itmi), number=1, repeat=5))
+print 'Switching {0} points: first {1:.1f}ms, cached {2:.3f}ms'.format(
+    len(itmi.i_points), t_first * 1e3, t_cached * 1e3)
+
+for threads in (None, 4):
+    t = min(timeit.repeat(lambda: ITMIdentifier(x, y, 11, precompute=True,
+                                                threads=threads), 
+                          number=1, repeat=3))
+    print 'Precompute all points (threads={0}): {1:.1f}ms'.format(
+        threads, t * 1e3)
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Compares fits with finite-difference Jacobian and with the
+analytic Jacobian of the models (``Model.jacobian``).
+'''
+
+import os
+import timeit
+
+from sitforc import modellib, numlib, load_csv
+from sitforc.core import shift_data
+
+REPEAT = 5
+MODELS = ['pt1', 'pt2', 'pt3', 'pt2_sim', 'pt3_sim', 'exp_approach']
+
+class CountingModel(object):
+    '''
+    Wraps a model and counts the function evaluations.
+    '''
+    def __init__(self, model, analytic):
+        self.model = model
+        self.param_names = model.param_names
+        self.jacobian = model.jacobian if analytic else None
+        self.calls = 0
+        
+    def vfunc(self, x, theta):
+        self.calls += 1
+        return self.model.vfunc(x, theta)
+
+def fit(model, analytic):
+    counter = CountingModel(model, analytic)
+    params = dict(model.default_params)
+    numlib.modelfit(counter, params, x, y)
+    return counter.calls, params
+
+fname = os.path.join(os.path.dirname(__file__), '..', 'examples', 'data.csv')
+x, y = shift_data(*load_csv(fname), width=1.8)
+
+print '{0:<14}{1:>10}{2:>10}{3:>12}{4:>12}{5:>10}'.format(
+    'Model', 'evals FD', 'evals AJ', 'time FD', 'time AJ', 'Speedup')
+for name in MODELS:
+    model = modellib[name]
+    calls_fd = fit(model, False)[0]
+    calls_aj = fit(model, True)[0]
+    t_fd = min(timeit.repeat(lambda: fit(model, False), number=1, 
+                             repeat=REPEAT))
+    t_aj = min(timeit.repeat(lambda: fit(model, True), number=1, 
+                             repeat=REPEAT))
+    print '{0:<14}{1:>10}{2:>10}{3:>10.2f}ms{4:>10.2f}ms{5:>9.2f}x'.format(
+        name, calls_fd, calls_aj, t_fd * 1e3, t_aj * 1e3, t_fd / t_aj)
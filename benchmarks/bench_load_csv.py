@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Compares the old ``numpy.loadtxt`` based CSV loader with
+``sitforc.iolib.load_csv`` (parsing and memory-mapped cache)
+on the bundled batch files.
+'''
+
+import glob
+import os
+import timeit
+
+import numpy
+
+from sitforc import iolib
+
+REPEAT = 5
+
+def _convert_excel_float(value):
+    return float(value.replace(',', '.'))
+
+def loadtxt_csv(fname):
+    return numpy.loadtxt(fname, delimiter=';', unpack=True,
+                         converters={0: _convert_excel_float,
+                                     1: _convert_excel_float})
+
+def best_time(func, fname):
+    return min(timeit.repeat(lambda: func(fname), number=1, repeat=REPEAT))
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch')
+print '{0:<20}{1:>8}{2:>12}{3:>12}{4:>12}{5:>12}{6:>10}'.format(
+    'File', 'Rows', 'loadtxt', 'load_csv', 'iter_csv', 'cached', 'Speedup')
+for fname in sorted(glob.glob(os.path.join(folder, '*.csv'))):
+    x_old, y_old = loadtxt_csv(fname)
+    x_new, y_new = iolib.load_csv(fname, cache=False)
+    assert numpy.array_equal(x_old, x_new)
+    assert numpy.array_equal(y_old, y_new)
+    
+    t_old = best_time(loadtxt_csv, fname)
+    t_new = best_time(lambda f: iolib.load_csv(f, cache=False), fname)
+    t_iter = best_time(lambda f: list(iolib.iter_csv(f, 1 << 16)), fname)
+    iolib.load_csv(fname)
+    t_cache = best_time(iolib.load_csv, fname)
+    print ('{0:<20}{1:>8}{2:>10.1f}ms{3:>10.1f}ms{4:>10.1f}ms{5:>10.2f}ms'
+           '{6:>9.1f}x').format(
+        os.path.basename(fname), len(x_new), t_old * 1e3, t_new * 1e3,
+        t_iter * 1e3, t_cache * 1e3, t_old / t_new)
@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Startup time of the model library for growing numbers of
+models: creating the library, first access of one model and 
+compiling all models, without and with the model cache.
+'''
+
+import os
+import shutil
+import tempfile
+import time
+
+from configobj import ConfigObj
+
+from sitforc.core import ModelLibrary
+
+SIZES = [10, 100, 500]
+
+def timed(func):
+    start = time.time()
+    func()
+    return time.time() - start
+
+template = ConfigObj(os.path.join(os.path.dirname(__file__), '..', 
+                                  'sitforc', 'modellib.sfm'))
+folder = tempfile.mkdtemp()
+try:
+    print '{0:>7}  {1:<8}{2:>10}{3:>12}{4:>12}'.format(
+        'Models', 'Cache', 'create', 'first', 'all')
+    for size in SIZES:
+        config = ConfigObj()
+        config.filename = os.path.join(folder, 'lib{0}.sfm'.format(size))
+        names = sorted(template)
+        for i in xrange(size):
+            name = names[i % len(names)]
+            config['{0}_{1}'.format(name, i)] = template[name]
+        config.write()
+        
+        for cache in ('cold', 'warm'):
+            lib = []
+            t_create = timed(lambda: lib.append(
+                ModelLibrary(config.filename)))
+            lib = lib[0]
+            t_first = timed(lambda: lib['pt2_{0}'.format(
+                names.index('pt2'))])
+            t_all = timed(lambda: list(lib))
+            lib._store_cache()
+            print '{0:>7}  {1:<8}{2:>8.1f}ms{3:>10.2f}ms{4:>10.1f}ms'.format(
+                size, cache, t_create * 1e3, t_first * 1e3, t_all * 1e3)
+finally:
+    shutil.rmtree(folder)
@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Microbenchmark for each model of the model library: the 
+lambda-function with parameter dictionary (``numlib.generate_func``) 
+against the compiled function with parameter vector.
+'''
+
+import timeit
+
+import numpy
+
+from sitforc import modellib, numlib
+
+SIZE = 20000
+NUMBER = 200
+
+x = numpy.linspace(0.01, 10, SIZE)
+print '{0:<14}{1:>6}{2:>14}{3:>14}{4:>10}'.format(
+    'Model', 'Temps', 'lambda', 'compiled', 'Speedup')
+for name in sorted(model.name for model in modellib):
+    model = modellib[name]
+    params = dict(model.default_params)
+    theta = [params[key] for key in model.param_names]
+    
+    func = numlib.generate_func(model.funcstring)
+    vfunc = model.vfunc
+    assert numpy.allclose(func(x, params), vfunc(x, theta))
+    
+    t_old = min(timeit.repeat(lambda: func(x, params), 
+                              number=NUMBER, repeat=3)) / NUMBER
+    t_new = min(timeit.repeat(lambda: vfunc(x, theta), 
+                              number=NUMBER, repeat=3)) / NUMBER
+    temps = model.func.source.count(' = ') - 1
+    print '{0:<14}{1:>6}{2:>12.1f}us{3:>12.1f}us{4:>9.2f}x'.format(
+        name, temps, t_old * 1e6, t_new * 1e6, t_old / t_new)
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Redrawing the plot of the GUI with the Agg backend for the water
+level recording (about 24000 points): a new figure per refresh 
+(the former ``GUI.refresh``) against updating the lines of one 
+figure, with and without min/max decimation to the canvas width.
+'''
+
+import os
+import timeit
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from sitforc.core import ITMIdentifier
+from sitforc.iolib import load_csv
+from sitforc.numlib import decimate_minmax
+
+WIDTH = 450
+
+fname = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch',
+                     'water_level.csv')
+x, y = load_csv(fname, cache=False)
+itmi = ITMIdentifier(x, y, 11)
+c = itmi.height
+
+def new_figure():
+    fig = Figure(figsize=(4.5, 2), dpi=100)
+    axes = fig.add_subplot(111)
+    axes.plot(x, y)
+    axes.plot([x[0], x[-1]], [c, c], '--')
+    axes.plot(itmi.t_x, itmi.t_y)
+    FigureCanvasAgg(fig).draw()
+
+fig = Figure(figsize=(4.5, 2), dpi=100)
+axes = fig.add_subplot(111)
+lines = [axes.plot([], [], style)[0] for style in ('-', '--', '-')]
+canvas = FigureCanvasAgg(fig)
+
+def update(decimate):
+    data = [(x, y), ([x[0], x[-1]], [c, c]), (itmi.t_x, itmi.t_y)]
+    for line, (x_vals, y_vals) in zip(lines, data):
+        if decimate:
+            x_vals, y_vals = decimate_minmax(x_vals, y_vals, WIDTH)
+        line.set_data(x_vals, y_vals)
+    axes.relim()
+    axes.autoscale_view()
+    canvas.draw()
+
+for name, func in (('new figure', new_figure), 
+                   ('set_data', lambda: update(False)),
+                   ('set_data + decimation', lambda: update(True))):
+    t = min(timeit.repeat(func, number=5, repeat=3)) / 5
+    print '{0:<24}{1:>8.1f}ms'.format(name, t * 1e3)
@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Polynomial approximation for the inflectional tangent method:
+fit and inflection points in the monomial basis (``numpy.polyfit``)
+against the scaled Chebyshev basis of ``PolyFitter``, for a 
+pt2-like step response on a long time axis.
+'''
+
+import timeit
+import warnings
+
+import numpy
+
+from sitforc.fitting import PolyFitter
+
+SIZE = 20000
+DEGREES = [7, 11, 15, 21]
+
+def itm(x, y, degree, basis):
+    pf = PolyFitter(x, y, degree, basis)
+    return pf, pf.get_inflec_points()
+
+x = numpy.linspace(0, 3600, SIZE)
+y = 1 - numpy.exp(-x / 400.0) * (1 + x / 400.0)
+print '{0:<8}{1:<11}{2:>12}{3:>12}{4:>10}{5:>10}'.format(
+    'Degree', 'Basis', 'Max error', 'Inflection', 'Warning', 'Time')
+for degree in DEGREES:
+    for basis in ('monomial', 'chebyshev'):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            pf, points = itm(x, y, degree, basis)
+        error = numpy.abs(pf.y - y).max()
+        inflec = points['x'][numpy.abs(points['x'] - 400.0).argmin()] \
+                 if len(points) else float('nan')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            t = min(timeit.repeat(lambda: itm(x, y, degree, basis), 
+                                  number=1, repeat=5))
+        print '{0:<8}{1:<11}{2:>12.2e}{3:>12.1f}{4:>10}{5:>8.2f}ms'.format(
+            degree, basis, error, inflec, 'yes' if caught else 'no', 
+            t * 1e3)
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Residual evaluations per second in the fitting loop: the
+old loop (sorting the parameter names and rewriting the parameter
+dictionary on each call) against ``numlib.residual_funcs``.
+'''
+
+import os
+import timeit
+
+import numpy
+
+from sitforc import modellib, numlib, load_csv
+
+CALLS = 2000
+REPEAT = 5
+MODELS = ['linear', 'pt1', 'pt2', 'pt3']
+
+def old_residual(function, paramdict, x, y):
+    def fill_pdict(params):
+        for i, key in enumerate(sorted(paramdict.keys())):
+            paramdict[key] = params[i]
+            
+    def f_error(params):
+        fill_pdict(params)
+        return y - function(x, paramdict)
+    return f_error
+
+def calls_per_second(f_error, theta):
+    best = min(timeit.repeat(lambda: f_error(theta), number=CALLS, 
+                             repeat=REPEAT))
+    return CALLS / best
+
+folder = os.path.join(os.path.dirname(__file__), '..', 'examples', 'batch')
+for size in (100, 1000, None):
+    x, y = load_csv(os.path.join(folder, 'water_level.csv'))
+    x, y = x[:size], y[:size]
+    print 'Samples: {0}'.format(len(x))
+    print '{0:<10}{1:>14}{2:>14}{3:>14}{4:>14}'.format(
+        'Model', 'old [1/s]', 'dict [1/s]', 'vector [1/s]', 'Speedup')
+    for name in MODELS:
+        model = modellib[name]
+        names = model.param_names
+        theta = numpy.array([model.default_params[key] for key in names])
+        
+        func = numlib.generate_func(model.funcstring)
+        old = old_residual(func, dict(model.default_params), x, y)
+        new_dict = numlib.residual_funcs(func, names, x, y)[0]
+        new_vec = numlib.residual_funcs(model, names, x, y)[0]
+        
+        c_old = calls_per_second(old, theta)
+        c_dict = calls_per_second(new_dict, theta)
+        c_vec = calls_per_second(new_vec, theta)
+        print '{0:<10}{1:>14.0f}{2:>14.0f}{3:>14.0f}{4:>13.2f}x'.format(
+            name, c_old, c_dict, c_vec, c_vec / c_old)
+    print
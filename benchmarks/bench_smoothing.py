@@ -0,0 +1,42 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Smoothing of a 25000 point series for the window lengths of the
+GUI interpolation spinner: the former ``numlib.smooth`` (padding
+with ``numpy.r_`` and ``numpy.convolve``) against the cumulative 
+sum moving average of ``sitforc.smoothing`` (also with ``out=``), 
+and the Hanning window convolved directly and with the FFT.
+'''
+
+import timeit
+
+import numpy
+
+from sitforc import smoothing
+
+SIZE = 25000
+WINDOWS = [3, 11, 51, 101, 202, 500, 1000]
+
+def cookbook_smooth(x, window_len):
+    s = numpy.r_[2*x[0]-x[window_len:1:-1], x, 2*x[-1]-x[-1:-window_len:-1]]
+    w = numpy.ones(window_len, 'd')
+    y = numpy.convolve(w/w.sum(), s, mode='same')
+    return y[window_len-1:-window_len+1]
+
+def best_time(func):
+    return min(timeit.repeat(func, number=20, repeat=5)) / 20
+
+y = numpy.cumsum(numpy.random.RandomState(0).randn(SIZE))
+out = numpy.empty(SIZE)
+print '{0:>7}{1:>12}{2:>12}{3:>12}{4:>13}{5:>12}'.format(
+    'Window', 'convolve', 'cumsum', 'cumsum out', 'hann direct', 'hann fft')
+for window_len in WINDOWS:
+    weights = smoothing.window_weights('hanning', window_len)
+    times = [best_time(lambda: cookbook_smooth(y, window_len)),
+             best_time(lambda: smoothing.moving_average(y, window_len)),
+             best_time(lambda: smoothing.moving_average(y, window_len, out)),
+             best_time(lambda: smoothing.convolve(y, weights, 'direct')),
+             best_time(lambda: smoothing.convolve(y, weights, 'fft'))]
+    print '{0:>7}'.format(window_len) + ''.join(
+        '{0:>10.3f}ms'.format(t * 1e3) for t in times)
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+'''
+Live identification of a pt2 step response which arrives in
+chunks of 500 samples: refitting ``ModelFitter`` and the ITM
+polynomial on all samples after each chunk against
+``StreamingIdentifier.update``. Prints the time of the last
+chunk and of the whole stream.
+'''
+
+import time
+import warnings
+
+import numpy
+
+from sitforc import modellib
+from sitforc.fitting import ModelFitter, PolyFitter
+from sitforc.streaming import StreamingIdentifier
+
+SAMPLES = 40000
+CHUNK = 500
+
+def refit(x, y):
+    ModelFitter(x, y, modellib.pt2)
+    PolyFitter(x, y, 11, 'chebyshev')
+
+def stream_all(x, y, update):
+    times = []
+    for i in range(0, len(x), CHUNK):
+        start = time.time()
+        update(x, y, i)
+        times.append(time.time() - start)
+    return times
+
+warnings.simplefilter('ignore')
+rng = numpy.random.RandomState(0)
+x = numpy.linspace(0, 60, SAMPLES)
+y = modellib.pt2(x, dict(c=3.2, t1=6.0, t2=2.5)) + 0.02 * rng.randn(SAMPLES)
+
+full = stream_all(x, y, lambda x, y, i: refit(x[:i + CHUNK], y[:i + CHUNK]))
+stream = StreamingIdentifier(modellib.pt2, span=(0, 60))
+online = stream_all(x, y, lambda x, y, i: stream.update(x[i:i + CHUNK], 
+                                                      y[i:i + CHUNK]))
+print '{0:<10}{1:>12}{2:>12}'.format('', 'last chunk', 'total')
+print '{0:<10}{1:>10.1f}ms{2:>10.1f}ms'.format('refit', full[-1] * 1e3, 
+                                               sum(full) * 1e3)
+print '{0:<10}{1:>10.1f}ms{2:>10.1f}ms'.format('streaming', online[-1] * 1e3,
+                                               sum(online) * 1e3)
+print 'parameters:', dict((key, round(value, 3)) 
+                          for key, value in stream.params.items())
@@ -0,0 +1,7 @@
+#!/usr/bin/python
+# coding: utf-8
+
+from sitforc.batch import main
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,6 @@ __author__ = 'Marc Schlaich'
 __version__ = '0.2.1'
 __license__ = 'MIT'
 
-from core import modellib, load_csv, identify_reg, identify_itm
-from fitting import PolyFitter, ModelFitter
+from core import modellib, load_csv, identify_reg, identify_itm, fit_all
+from fitting import PolyFitter, SplineFitter, ModelFitter, FitCache
 
@@ -0,0 +1,299 @@
+# coding: utf-8
+
+'''
+Batch identification of measurement files.
+
+The files are identified in a process pool with regression
+models (see L{core.ModelLibrary}) and with the inflectional
+tangent method. The results are written as CSV or JSON,
+including the timings for each file. Errors are recorded
+in the results and do not stop the run.
+
+Command line usage (see C{--help})::
+
+    python -m sitforc.batch -m pt2,pt3 -d 11 -o results.csv data/
+'''
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from multiprocessing import Pool, cpu_count
+
+from sitforc.core import modellib, shift_data, ITMIdentifier
+from sitforc.fitting import ModelFitter
+from sitforc.iolib import load_csv
+from sitforc.preprocessing import Preprocessor
+
+ITM_FIELDS = ['tu', 'tg', 'height', 'slope']
+
+def find_files(paths):
+    '''
+    Collects the CSV files. Each path can be a directory
+    (all "*.csv" files in it), a glob pattern or a file name.
+    '''
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+def _format_error():
+    return traceback.format_exc().strip().splitlines()[-1]
+
+def identify_file(fname, models=('pt2',), degree=11, shift=0.0,
+                  preprocessor=None, guess=False, decimate=None, 
+                  polish=False, basis='chebyshev', fitter='poly',
+                  knots=16):
+    '''
+    Identifies the data of one file with each of the given
+    models and with the inflectional tangent method (if degree
+    is not 0). Exceptions are caught and recorded.
+    @param basis: Basis of the polynomial of the inflectional
+        tangent method (see L{core.ITMIdentifier}).
+    @param fitter: "poly" or "spline" for the inflectional 
+        tangent method.
+    @param knots: Number of interior knots of the spline.
+    @param preprocessor: Applied to the data after the shift
+        (see L{preprocessing.Preprocessor}).
+    @param guess: Estimation of the start parameters of the 
+        models (see L{fitting.ModelFitter}).
+    @param decimate: Fit the decimated data (see 
+        L{core.identify_reg}).
+    @param polish: Refine the fits of the models on all data.
+    @return: Dictionary with the results. The key "methods"
+        contains one dictionary for each model and for "itm".
+    '''
+    result = dict(file=fname, error=None, methods=dict())
+    start = time.time()
+    try:
+        x, y = load_csv(fname)
+        if shift > 0:
+            x, y = shift_data(x, y, shift)
+        if preprocessor is not None:
+            x, y = preprocessor(x, y)
+    except Exception:
+        result['error'] = _format_error()
+        result['time'] = time.time() - start
+        return result
+    result['load_time'] = time.time() - start
+
+    for name in models:
+        method = result['methods'][name] = dict(error=None)
+        t = time.time()
+        try:
+            mf = ModelFitter(x, y, modellib[name], guess=guess, 
+                             decimate=decimate, polish=polish)
+            method['params'] = dict((key, float(value))
+                                    for key, value in mf.params.items())
+        except Exception:
+            method['error'] = _format_error()
+        method['time'] = time.time() - t
+
+    if degree:
+        method = result['methods']['itm'] = dict(error=None)
+        t = time.time()
+        try:
+            itmi = ITMIdentifier(x, y, degree, basis, fitter, knots,
+                                 decimate=decimate, polish=polish)
+            method['params'] = dict(tu=float(itmi.tu), tg=float(itmi.tg),
+                                    height=float(itmi.height),
+                                    slope=float(itmi.tangent_slope))
+        except Exception:
+            method['error'] = _format_error()
+        method['time'] = time.time() - t
+
+    result['time'] = time.time() - start
+    return result
+
+def _identify_task(args):
+    fname, options = args
+    return identify_file(fname, **options)
+
+def run(paths, models=('pt2',), degree=11, shift=0.0, processes=None,
+        chunksize=None, preprocessor=None, guess=False, decimate=None,
+        polish=False, basis='chebyshev', fitter='poly', knots=16):
+    '''
+    Identifies all files in a process pool.
+    @param paths: Directories, glob patterns or file names
+        (see L{find_files}).
+    @param preprocessor: L{preprocessing.Preprocessor} for
+        the data of each file.
+    @param guess: Estimation of the start parameters of the
+        models (see L{fitting.ModelFitter}).
+    @param decimate: Fit the decimated data (see 
+        L{core.identify_reg}).
+    @param polish: Refine the fits of the models on all data.
+    @param basis: Basis of the polynomial (see L{identify_file}).
+    @param fitter: Fitter of the inflectional tangent method.
+    @param knots: Number of interior knots of the spline.
+    @param processes: Number of worker processes (default: number
+        of CPUs). With 1 the files are processed in this process.
+    @param chunksize: Number of files which are sent to a worker
+        at once.
+    @return: Generator which yields the results (see
+        L{identify_file}) in the order of completion.
+    '''
+    files = find_files(paths)
+    options = dict(models=tuple(models), degree=degree, shift=shift,
+                   preprocessor=preprocessor, guess=guess, 
+                   decimate=decimate, polish=polish, basis=basis,
+                   fitter=fitter, knots=knots)
+    tasks = [(fname, options) for fname in files]
+    if processes is None:
+        processes = cpu_count()
+    processes = min(processes, len(files))
+    if processes <= 1:
+        for task in tasks:
+            yield _identify_task(task)
+        return
+
+    if chunksize is None:
+        chunksize = max(1, len(files) // (processes * 4))
+    # the workers inherit the compiled models and Jacobians
+    modellib.prepare(models)
+    pool = Pool(processes)
+    try:
+        for result in pool.imap_unordered(_identify_task, tasks, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _rows(results):
+    for result in results:
+        row = dict(file=result['file'], time=result['time'])
+        if result['error']:
+            row.update(method='', error=result['error'])
+            yield row
+        for name in sorted(result['methods']):
+            method = result['methods'][name]
+            row = dict(file=result['file'], method=name,
+                       time=method['time'], error=method['error'] or '')
+            row.update(method.get('params', {}))
+            yield row
+
+def write_csv(results, fobj, models=('pt2',)):
+    '''
+    Writes the results as CSV (one line for each file and method).
+    @param models: Models of the results, their parameters
+        are the additional columns.
+    '''
+    params = set(ITM_FIELDS)
+    for name in models:
+        params.update(modellib[name].param_names)
+    fields = ['file', 'method', 'time', 'error'] + sorted(params)
+    writer = csv.DictWriter(fobj, fields, delimiter=';')
+    writer.writeheader()
+    for row in _rows(results):
+        writer.writerow(row)
+
+def write_json(results, fobj):
+    '''
+    Writes the results as JSON list.
+    '''
+    fobj.write('[')
+    for i, result in enumerate(results):
+        if i:
+            fobj.write(',')
+        fobj.write('\n')
+        json.dump(result, fobj, sort_keys=True)
+    fobj.write('\n]\n')
+
+def main(args=None):
+    '''
+    Command line interface.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Batch identification of measurement files.')
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help='directory, glob pattern or CSV file')
+    parser.add_argument('-m', '--models', default='pt2',
+                        help='comma separated regression models '
+                             '(default: %(default)s)')
+    parser.add_argument('-d', '--degree', type=int, default=11,
+                        help='polynomial degree for the inflectional '
+                             'tangent method, 0 disables it '
+                             '(default: %(default)s)')
+    parser.add_argument('--basis', default='chebyshev',
+                        choices=['chebyshev', 'monomial'],
+                        help='basis of the polynomial '
+                             '(default: %(default)s)')
+    parser.add_argument('--spline', type=int, metavar='KNOTS',
+                        help='fit a smoothing spline with this number '
+                             'of interior knots instead of the '
+                             'polynomial')
+    parser.add_argument('-s', '--shift', type=float, default=0.0,
+                        help='shift the data by this width')
+    parser.add_argument('--offset', type=float, default=0.0,
+                        help='subtract this offset from the y values')
+    parser.add_argument('--smooth', type=int, default=0,
+                        help='window length of the moving average')
+    parser.add_argument('--resample', type=int, default=None,
+                        help='interpolate the data on this number of '
+                             'equidistant points')
+    parser.add_argument('-g', '--guess', choices=['auto', 'multistart'],
+                        help='estimate the start parameters of the models '
+                             'from the data, "multistart" fits several '
+                             'estimates')
+    parser.add_argument('--decimate', type=int, default=None,
+                        help='fit the data reduced to this number of '
+                             'points')
+    parser.add_argument('--decimation', default='bin',
+                        choices=['uniform', 'bin', 'lttb', 'minmax'],
+                        help='method of --decimate (default: %(default)s)')
+    parser.add_argument('--polish', action='store_true',
+                        help='refine the fits of the decimated data on '
+                             'all data')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes '
+                             '(default: number of CPUs)')
+    parser.add_argument('-f', '--format', choices=['csv', 'json'],
+                        help='output format (default: by extension '
+                             'of the output file or csv)')
+    parser.add_argument('-o', '--output',
+                        help='output file (default: stdout)')
+    args = parser.parse_args(args)
+
+    models = [name for name in args.models.split(',') if name]
+    for name in models:
+        try:
+            modellib[name]
+        except KeyError:
+            parser.error('Unknown model "{0}"'.format(name))
+    fmt = args.format
+    if not fmt:
+        fmt = 'json' if (args.output or '').endswith('.json') else 'csv'
+
+    preprocessor = None
+    if args.offset or args.smooth or args.resample:
+        preprocessor = Preprocessor(offset=args.offset, smooth=args.smooth,
+                                    resample=args.resample)
+    results = run(args.paths, models, args.degree, args.shift,
+                  args.processes, preprocessor=preprocessor,
+                  guess=args.guess or False, 
+                  decimate=args.decimate and (args.decimate, args.decimation),
+                  polish=args.polish, basis=args.basis,
+                  fitter='spline' if args.spline else 'poly',
+                  knots=args.spline or 16)
+    fobj = open(args.output, 'wb') if args.output else sys.stdout
+    try:
+        if fmt == 'json':
+            write_json(results, fobj)
+        else:
+            write_csv(results, fobj, models)
+    finally:
+        if fobj is not sys.stdout:
+            fobj.close()
+
+if __name__ == '__main__':
+    main()
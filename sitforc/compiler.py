@@ -0,0 +1,158 @@
+# coding: utf-8
+
+'''
+Compiler for model functions.
+
+The syntax tree of a function (see L{funcparser.parse_func})
+is translated into a vectorized Python function with
+the signature C{f(x, theta)}. The parameters C{p["..."]} are
+mapped to positional slots of the parameter vector theta
+(sorted by name) and common subexpressions are calculated
+only once.
+'''
+
+from __future__ import division
+
+import ast
+from math import factorial
+
+import numpy
+
+NAMESPACE = {'exp': numpy.exp, 'sin': numpy.sin, 'cos': numpy.cos,
+             'fac': factorial, 'numpy': numpy}
+
+BIN_OPS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+           ast.Pow: '**'}
+
+UNARY_OPS = {ast.USub: '-', ast.UAdd: '+'}
+
+SMALL_POWERS = ('1', '2', '3', '4')
+
+class CompiledFunc(object):
+    '''
+    A compiled model function. It can be called like
+    a generated lambda-function with a parameter dictionary
+    (C{f(x, p)}), L{vfunc} takes a parameter vector
+    ordered like L{param_names}.
+    '''
+    def __init__(self, vfunc, param_names, source):
+        self.vfunc = vfunc
+        self.param_names = param_names
+        self.source = source
+
+    def __call__(self, x, p):
+        return self.vfunc(x, [p[name] for name in self.param_names])
+
+class _Translator(object):
+    '''
+    Translates the nodes of a syntax tree into Python code.
+    '''
+    def __init__(self, param_names):
+        self.slots = dict((name, '_p{0}'.format(i))
+                          for i, name in enumerate(param_names))
+        self.codes = dict()
+        self.counts = dict()
+        self.temps = dict()
+        self.lines = []
+
+    def code(self, node):
+        '''
+        Generates the full code of the node and counts
+        the occurrences of each subexpression.
+        '''
+        if isinstance(node, ast.BinOp):
+            code = '({0} {1} {2})'.format(self.code(node.left),
+                                          BIN_OPS[type(node.op)],
+                                          self.code(node.right))
+        elif isinstance(node, ast.UnaryOp):
+            code = '({0}{1})'.format(UNARY_OPS[type(node.op)],
+                                     self.code(node.operand))
+        elif isinstance(node, ast.Call):
+            if (node.func.id == 'fac' and
+                isinstance(node.args[0], ast.Num)):
+                # constant folding
+                return repr(factorial(node.args[0].n))
+            args = [self.code(arg) for arg in node.args]
+            code = '{0}({1})'.format(node.func.id, ', '.join(args))
+        elif isinstance(node, ast.Subscript):
+            return self.slots[node.slice.value.s]
+        elif isinstance(node, ast.Name):
+            return node.id
+        elif isinstance(node, ast.Num):
+            return repr(node.n)
+        else:
+            raise TypeError('Cannot compile node "{0}"'
+                            .format(node.__class__.__name__))
+        self.codes[node] = code
+        self.counts[code] = self.counts.get(code, 0) + 1
+        return code
+
+    def emit(self, node):
+        '''
+        Generates the code of the node. Subexpressions which
+        occur more than once are assigned to temporary variables.
+        '''
+        if node not in self.codes:
+            return self.code(node)
+        code = self.codes[node]
+        if code in self.temps:
+            return self.temps[code]
+        if isinstance(node, ast.BinOp):
+            left = self.emit(node.left)
+            right = self.emit(node.right)
+            result = '({0} {1} {2})'.format(left, BIN_OPS[type(node.op)],
+                                            right)
+            if (isinstance(node.op, ast.Pow) and
+                right in SMALL_POWERS and
+                (left.isalnum() or left.startswith('_'))):
+                # x**3 is much slower than x*x*x for arrays
+                result = '({0})'.format(' * '.join([left] * int(right)))
+        elif isinstance(node, ast.UnaryOp):
+            result = '({0}{1})'.format(UNARY_OPS[type(node.op)],
+                                       self.emit(node.operand))
+        else:
+            args = [self.emit(arg) for arg in node.args]
+            result = '{0}({1})'.format(node.func.id, ', '.join(args))
+        if self.counts[code] > 1:
+            temp = '_t{0}'.format(len(self.temps))
+            self.temps[code] = temp
+            self.lines.append('{0} = {1}'.format(temp, result))
+            return temp
+        return result
+
+def compile_func(expr, param_names):
+    '''
+    Compiles a parsed function.
+    @param expr: Syntax tree of the function (mode "eval").
+    @param param_names: Names of the parameters used in the function.
+    @return: L{CompiledFunc} instance.
+    '''
+    param_names = tuple(sorted(param_names))
+    translator = _Translator(param_names)
+    translator.code(expr.body)
+    result = translator.emit(expr.body)
+
+    lines = ['def model(x, theta):']
+    if param_names:
+        slots = [translator.slots[name] for name in param_names]
+        lines.append('    {0}, = theta'.format(', '.join(slots)))
+    lines.extend('    ' + line for line in translator.lines)
+    lines.append('    return {0}'.format(result))
+    source = '\n'.join(lines) + '\n'
+    return compile_source(source, 'model', param_names)
+
+def compile_source(source, name, param_names):
+    '''
+    Compiles the generated source code of a function
+    (with true division).
+    @param source: Source code which defines the function.
+    @param name: Name of the defined function.
+    @param param_names: Names of the parameters in the order
+        of the parameter vector.
+    @return: L{CompiledFunc} instance.
+    '''
+    namespace = dict(NAMESPACE)
+    code = compile(source, '<{0}>'.format(name), 'exec', 
+                   division.compiler_flag, True)
+    exec code in namespace
+    return CompiledFunc(namespace[name], tuple(param_names), source)
@@ -6,34 +6,76 @@ and for working with regression models.
 '''
 
 
+import atexit
+import copy
+import hashlib
+import json
 import os
+import sys
+import tempfile
+import threading
+import time
+import weakref
 from abc import ABCMeta, abstractmethod
-from functools import partial
-from itertools import izip
+from collections import namedtuple
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from warnings import warn
 
 import numpy
 import configobj
 from configobj import ConfigObj
 
-import matplotlib
-matplotlib.use('GTKAgg')
-from matplotlib.pyplot import (figure, legend, grid, text, show,
-                               subplot, plot)
-
+from sitforc.numlib import FitTimeout
+from sitforc.compiler import compile_source
 from sitforc.funcparser import parse_func, ParseException
-from sitforc.fitting import ModelFitter, PolyFitter
+from sitforc.fitting import Fitter, ModelFitter, PolyFitter, SplineFitter
+from sitforc.iolib import load_csv
+
+CACHE_VERSION = 1
+'''
+Version of the format of the model cache (see L{ModelLibrary}).
+'''
+
+_libraries = weakref.WeakSet()
+'''
+Instances of L{ModelLibrary}, whose caches are stored at exit.
+'''
+
+def _store_caches():
+    for library in list(_libraries):
+        library._store_cache()
+
+atexit.register(_store_caches)
 
 class SitforcWarning(Warning):
     pass
 
+def _pyplot():
+    '''
+    Imports matplotlib.pyplot on first use, so numeric-only
+    use of this module does not load matplotlib (or GTK).
+    The GTKAgg backend is chosen if PyGTK is installed and
+    pyplot was not imported before.
+    '''
+    if 'matplotlib.pyplot' not in sys.modules:
+        import matplotlib
+        try:
+            import gtk
+        except ImportError:
+            pass
+        else:
+            matplotlib.use('GTKAgg')
+    from matplotlib import pyplot
+    return pyplot
+
 class Model(object):
     '''
     This class represents a regression model.
     The model itself is a string of a
     mathematical function (using Python syntax).
-    This string is parsed and evaluated to a
-    "real" (lambda-) function.
+    This string is parsed and compiled to a
+    "real" function (see L{compiler.CompiledFunc}).
     '''
     def __init__(self, name, func, funcstring, latex, **params):
         self.name = name
@@ -42,6 +84,106 @@ class Model(object):
         self.default_params = params
         self.latex = latex
         self.comment = ''
+        self._jacobian = None
+        self._jacobian_source = None
+        self._derivatives = dict()
+        self._derivative_sources = dict()
+        self._library = None
+        '''
+        Weak reference to the L{ModelLibrary} which stores the
+        generated source code.
+        '''
+        
+    @property
+    def param_names(self):
+        '''
+        Property.
+        Names of the parameters in the order of the
+        parameter vector (see L{Model.vfunc}).
+        '''
+        try:
+            return self.func.param_names
+        except AttributeError:
+            return tuple(sorted(self.default_params))
+        
+    @property
+    def vfunc(self):
+        '''
+        Property.
+        Vectorized function with the signature C{f(x, theta)},
+        theta is a parameter vector ordered like L{Model.param_names}.
+        None if the model function is not compiled.
+        '''
+        return getattr(self.func, 'vfunc', None)
+    
+    @property
+    def jacobian(self):
+        '''
+        Property.
+        Compiled partial derivatives of the function with
+        respect to the parameters (see L{symlib.generate_jacobian}).
+        They are generated on first access, i.e. by the first fit 
+        (see L{numlib.modelfit}), and cached. The L{ModelLibrary} 
+        stores the generated source code in its cache file at 
+        once, so the following fits need no sympy.
+        None if the model function is not compiled or
+        cannot be differentiated.
+        '''
+        if self._jacobian is None:
+            self._jacobian = False
+            if self.vfunc is not None:
+                names = self.param_names
+                try:
+                    source = self._jacobian_source
+                    if source is None:
+                        from sitforc import symlib
+                        source = symlib.generate_jacobian(self.funcstring, 
+                                                          names)
+                    jacobian = compile_source(source, 'jacobian', names)
+                    with numpy.errstate(all='ignore'):
+                        jacobian(numpy.ones(1), self.default_params)
+                except Exception as e:
+                    # sympy raises various exceptions for functions
+                    # which cannot be differentiated or printed
+                    warn('No Jacobian for model "{0}": {1}'
+                         .format(self.name, e), SitforcWarning)
+                else:
+                    self._jacobian = jacobian
+                    generated = self._jacobian_source is None
+                    self._jacobian_source = source
+                    library = self._library and self._library()
+                    if generated and library is not None:
+                        library._store_cache()
+        return self._jacobian or None
+    
+    def derivative(self, n):
+        '''
+        Compiled n-th derivation of the function with respect
+        to x (see L{symlib.generate_derivative}). It is generated 
+        once for each order and cached like L{Model.jacobian}.
+        @return: L{compiler.CompiledFunc} instance or None if the
+            model function is not compiled or cannot be differentiated.
+        '''
+        if n not in self._derivatives:
+            self._derivatives[n] = None
+            if self.vfunc is not None:
+                names = self.param_names
+                try:
+                    source = self._derivative_sources.get(n)
+                    if source is None:
+                        from sitforc import symlib
+                        source = symlib.generate_derivative(
+                            self.funcstring, names, n)
+                    derivative = compile_source(source, 'derivative', 
+                                                names)
+                except Exception as e:
+                    # see Model.jacobian
+                    warn('No derivation for model "{0}": {1}'
+                         .format(self.name, e), SitforcWarning)
+                else:
+                    self._derivatives[n] = derivative
+                    self._derivative_sources[n] = source
+        return self._derivatives[n]
         
     def __call__(self, x, p=None, **p_kws):
         '''
@@ -79,9 +221,11 @@ class Model(object):
         Therefore the LaTeX representation is automatically
         rendered.
         '''
-        figure(figsize=(10, 2))
-        subplot(111, frameon=False, xticks=[], yticks=[])
-        text(0.5, 0.5, self.latex, fontsize=30, horizontalalignment='center')
+        plt = _pyplot()
+        plt.figure(figsize=(10, 2))
+        plt.subplot(111, frameon=False, xticks=[], yticks=[])
+        plt.text(0.5, 0.5, self.latex, fontsize=30, 
+                 horizontalalignment='center')
         
     def plot(self, x=None):
         '''
@@ -91,9 +235,10 @@ class Model(object):
         
         if not x:
             x = numpy.arange(0, 10, 0.1)
-        figure()
-        plot(x, self(x))
-        show()
+        plt = _pyplot()
+        plt.figure()
+        plt.plot(x, self(x))
+        plt.show()
 
         
 class ModelLibrary(object):
@@ -103,39 +248,81 @@ class ModelLibrary(object):
     "modellib.sfm". New models can be added
     and saved into this file.
     
+    The models of the file are compiled on first
+    access. The compiled artefacts (LaTeX, source code of the
+    function and of the Jacobian) are stored in the file
+    "modellib.sfm.cache", which is used as long as
+    "modellib.sfm" is unchanged.
+    
     Hint: See this class as singleton. Don't
     instantiate it. Use the attribute "modellib"
     of this module if you want to work with 
     the model library.
     '''
-    def __init__(self):
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(os.path.dirname(__file__), 
+                                    'modellib.sfm')
+        self.filename = filename
         self.lib = dict()
+        self._lock = threading.RLock()
+        '''
+        Lock of the compilation and of the cache file, the 
+        models can be used by several threads.
+        '''
         self._load()
+        _libraries.add(self)
         
     def __str__(self):
-        models = '\n\n'.join((str(self.lib[k]) for k in sorted(self.lib)))
+        models = '\n\n'.join((str(self[k]) for k in self.names() 
+                               if k in self))
         return ('\n\n{0}\n\n'.format(models)
                 .join(['**** Model Library of SITforC *****'] * 2))
     
     def __getattr__(self, name):
-        return self.lib[name]
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
     
     def __getitem__(self, name):
-        return self.lib[name]
+        try:
+            return self.lib[name]
+        except KeyError:
+            model = self._compile(name)
+            if model is None:
+                raise KeyError(name)
+            return model
+    
+    def __contains__(self, name):
+        if name in self.lib:
+            return True
+        if name in self._entries:
+            return self._compile(name) is not None
+        return False
     
     def __iter__(self):
-        return iter(self.lib.values())
+        for name in self.names():
+            if name in self:
+                yield self.lib[name]
     
     def __len__(self):
-        return len(self.lib)
+        return len(list(iter(self)))
+    
+    def names(self):
+        '''
+        @return: Sorted names of the models without 
+            compiling them.
+        '''
+        return sorted(set(self.lib) | set(self._entries))
     
     def _load(self):
         '''
         Loads the defined models from "modellib.sfm".
+        The models are compiled on first access (see L{_compile}).
         '''
-        folder = os.path.dirname(__file__)
+        self._entries = dict()
         try:
-            config = ConfigObj(os.path.join(folder, 'modellib.sfm'))
+            config = ConfigObj(self.filename)
         except configobj.ConfigObjError as e:
             txt = 'File "modellib.sfm" has an error: {0}'.format(e)
             raise configobj.ConfigObjError(txt)
@@ -158,47 +345,185 @@ class ModelLibrary(object):
                      '(in "modellib.sfm").'.format(modelname), 
                      SitforcWarning)
                 continue
+            self._entries[modelname] = (funcstring, params, comment)
+        self._load_cache()
+        
+    def _compile(self, name):
+        '''
+        Compiles a model of "modellib.sfm" and adds it
+        to the library. The artefacts are taken from the
+        cache if possible. A model which is accessed by
+        several threads at once is compiled only once.
+        @return: The model or None if the model is 
+            not defined or has an error.
+        '''
+        with self._lock:
+            model = self.lib.get(name)
+            if model is None:
+                model = self._compile_entry(name)
+            return model
+        
+    def _compile_entry(self, name):
+        try:
+            funcstring, params, comment = self._entries.pop(name)
+        except KeyError:
+            return None
+        
+        cached = self._cache['models'].get(name)
+        if cached and cached['func'] == funcstring:
+            names = cached['param_names']
+            func = compile_source(cached['source'], 'model', names)
+            latex = cached['latex']
+            if set(names) - set(params):
+                cached = None
+        else:
+            cached = None
             try:
                 func, latex, ident_params = parse_func(funcstring)
             except ParseException as e:
                 warn('Function for model "{0}" in "modellib.sfm" has '
-                     'an error: {1}'.format(modelname, e), 
+                     'an error: {1}'.format(name, e), 
                      SitforcWarning)
-                continue
-
+                return None
+        
+        if cached is None:
             try:
                 func(1, params)
             except KeyError as e:
                 warn('Param {0} for model "{1}" is not defined '
-                     'in "modellib.sfm".'.format(e, modelname), 
+                     'in "modellib.sfm".'.format(e, name), 
                      SitforcWarning)
-                continue
+                return None
             
-            self.lib[modelname] = Model(modelname, func, 
-                                        funcstring, latex, 
-                                        **params)
-            self.lib[modelname].comment = comment
+        model = Model(name, func, funcstring, latex, **params)
+        model.comment = comment
+        model._library = weakref.ref(self)
+        if cached:
+            model._jacobian_source = cached['jacobian']
+            model._derivative_sources = dict(
+                (int(n), source) 
+                for n, source in cached.get('derivatives', {}).items())
+        self.lib[name] = model
+        self._compiled[name] = funcstring
+        return model
+    
+    def _hash(self):
+        '''
+        @return: Hash of "modellib.sfm" and the cache version,
+            None if the file cannot be read.
+        '''
+        try:
+            with open(self.filename, 'rb') as fobj:
+                data = fobj.read()
+        except IOError:
+            return None
+        return '{0}-{1}'.format(CACHE_VERSION, hashlib.sha1(data).hexdigest())
+    
+    def _load_cache(self):
+        '''
+        Loads the cache file if it belongs to the current
+        "modellib.sfm".
+        '''
+        self._compiled = dict()
+        self._cache = dict(hash=self._hash(), models=dict())
+        try:
+            with open(self.filename + '.cache') as fobj:
+                cache = json.load(fobj)
+        except (IOError, ValueError):
+            return
+        if cache.get('hash') == self._cache['hash'] and self._cache['hash']:
+            self._cache = cache
+        
+    def _store_cache(self):
+        '''
+        Writes the artefacts of the compiled models into the
+        cache file if they changed. The file is written under a
+        temporary name and renamed, so it is never incomplete.
+        Errors are ignored.
+        '''
+        with self._lock:
+            self._write_cache()
+    
+    def _write_cache(self):
+        if not self._cache['hash']:
+            return
+        models = dict(self._cache['models'])
+        for name, funcstring in self._compiled.items():
+            model = self.lib.get(name)
+            if model is None or model.funcstring != funcstring:
+                continue
+            models[name] = dict(func=funcstring, latex=model.latex,
+                                source=model.func.source,
+                                param_names=model.param_names,
+                                jacobian=model._jacobian_source,
+                                derivatives=model._derivative_sources)
+        cache = dict(hash=self._cache['hash'], models=models)
+        if json.loads(json.dumps(cache)) == self._cache:
+            return
+        cachename = self.filename + '.cache'
+        folder = os.path.dirname(os.path.abspath(self.filename))
+        try:
+            fd, tmpname = tempfile.mkstemp(suffix='.cache', dir=folder)
+        except (IOError, OSError):
+            return
+        try:
+            with os.fdopen(fd, 'w') as fobj:
+                json.dump(cache, fobj, indent=1, sort_keys=True)
+            if os.path.exists(cachename):
+                # os.rename cannot overwrite files on Windows
+                os.remove(cachename)
+            os.rename(tmpname, cachename)
+        except (IOError, OSError):
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            return
+        self._cache = json.loads(json.dumps(cache))
             
+    def prepare(self, names=None):
+        '''
+        Compiles the models and generates their Jacobians, which 
+        are then stored in the cache file. Call this before the
+        models are fitted in other processes, their caches are 
+        not stored.
+        @param names: Names of the models (default: all models).
+        '''
+        if names is None:
+            names = self.names()
+        for name in names:
+            if name in self:
+                self.lib[name].jacobian
+        self._store_cache()
+        
     def reset(self):
         '''
         Reset the library to the last saved state.
         '''
-        self.lib = dict()
-        self._load()
+        with self._lock:
+            self._store_cache()
+            self.lib = dict()
+            self._load()
         
     def save(self):
         '''
         Saves the library.
         '''
         config = ConfigObj()
-        folder = os.path.dirname(__file__)
-        config.filename = os.path.join(folder, 'modellib.sfm')
-        for model in self.lib.values():
-            config[model.name] = {}
-            config[model.name]['func'] = model.funcstring
-            config[model.name].update(model.default_params)
-            if model.comment:
-                config[model.name]['comment'] = model.comment
+        config.filename = self.filename
+        for name in self.names():
+            if name in self.lib:
+                model = self.lib[name]
+                funcstring = model.funcstring
+                params = model.default_params
+                comment = model.comment
+            else:
+                funcstring, params, comment = self._entries[name]
+            config[name] = {}
+            config[name]['func'] = funcstring
+            config[name].update(params)
+            if comment:
+                config[name]['comment'] = comment
         config.write()
         
     
@@ -207,7 +532,7 @@ class ModelLibrary(object):
         Adds a new model to the library.
         '''
         model = Model(name, func, funcstring, latex, **params)
-        if name not in self.lib:
+        if name not in self.lib and name not in self._entries:
             self.lib[name] = model
         else:
             warn('This Model already exists in modellib. '
@@ -251,11 +576,20 @@ class Identifier(object):
 class RegressionIdentifier(Identifier):
     '''
     Identifies data with a regression model.
+    @param guess: Estimation of the start parameters
+        (see L{ModelFitter}).
+    @param cache: L{fitting.FitCache} which is used for the fit.
+    @param decimate: Fit the decimated data (see L{ModelFitter}).
+    @param polish: Refine the fit of the decimated data on all
+        data.
     '''
-    def __init__(self, x, y, model):
+    def __init__(self, x, y, model, guess=False, cache=None, 
+                 decimate=None, polish=False):
         Identifier.__init__(self, x, y)
         
-        self.model_fitter = ModelFitter(x, y, model)
+        fit = ModelFitter if cache is None else cache.fit
+        self.model_fitter = fit(x, y, model, guess=guess, 
+                                decimate=decimate, polish=polish)
         
     def show_solution(self):
         mf = self.model_fitter
@@ -268,40 +602,91 @@ class RegressionIdentifier(Identifier):
         
     def plot_solution(self):
         mf = self.model_fitter
-        figure()
-        plot(self.x, self.y, label='data')
-        plot(mf.x, mf.y, label='fitted')
-        legend()
-        grid()
-        show()
+        plt = _pyplot()
+        plt.figure()
+        plt.plot(self.x, self.y, label='data')
+        plt.plot(mf.x, mf.y, label='fitted')
+        plt.legend()
+        plt.grid()
+        plt.show()
         
+ITMResult = namedtuple('ITMResult', 'x y slope offset tu tg height '
+                                    'split_point')
+'''
+Result of a point of inflection in L{ITMIdentifier}: the point
+(x, y), the tangent (slope, offset) and the identified values.
+'''
+
 class ITMIdentifier(Identifier):
     '''
     Identifies data with the inflectional tangent method.
+    The data is approximated with a polynomial in the
+    Chebyshev basis (see L{PolyFitter}) or with a 
+    spline (see L{SplineFitter}).
     '''
-    def __init__(self, x, y, degree):
+    def __init__(self, x, y, degree=11, basis='chebyshev', fitter='poly',
+                 knots=16, precompute=False, threads=None, decimate=None,
+                 polish=False):
+        '''
+        @param degree: Degree of the polynomial (fitter "poly").
+        @param basis: Basis of the polynomial (fitter "poly").
+        @param fitter: "poly", "spline" or a fitter of the data
+            with points of inflection (e.g. a L{PolyFitter}).
+        @param knots: Number of interior knots (fitter "spline").
+        @param precompute: Calculate all points of inflection at
+            once (see L{calculate_all}).
+        @param threads: Number of threads for precompute.
+        @param decimate: Fit the polynomial or the spline and the 
+            model of the approach to the decimated data (see 
+            L{PolyFitter}).
+        @param polish: Refine the fit of the model on all data.
+        '''
         Identifier.__init__(self, x, y)
+        self.decimate = decimate
+        self.polish = polish
         
-        self.poly_fitter = PolyFitter(x, y, degree)
-        self.i_points = self.poly_fitter.get_inflec_points()
+        if fitter == 'poly':
+            self.fitter = PolyFitter(x, y, degree, basis, 
+                                     decimate=decimate)
+        elif fitter == 'spline':
+            self.fitter = SplineFitter(x, y, knots, decimate=decimate)
+        elif isinstance(fitter, Fitter):
+            self.fitter = fitter
+        else:
+            raise ValueError('Unknown fitter "{0}"'.format(fitter))
+        self.i_points = self.fitter.get_inflec_points()
+        self._results = dict()
+        '''
+        Results of the calculated points of inflection 
+        (see L{calculate_inflec_point}), the number of the point
+        is the key.
+        '''
         
+        if precompute:
+            self.calculate_all(threads)
         self.calculate_inflec_point(0)
     
+    @property
+    def poly_fitter(self):
+        '''
+        Property.
+        The fitter of the data (former name of L{fitter}).
+        '''
+        return self.fitter
+    
     @property    
     def t_x(self):
         ''' 
         x-values of the tangent.
         '''
-        return numpy.arange(self.death_time, self.end_time, 0.1)
+        return self._tangent()[0]
     
     @property    
     def t_y(self):
         '''
         y-values of the tangent.
         '''
-        m = self.tangent_slope
-        b = self.tangent_offset
-        return m * self.t_x + b
+        return self._tangent()[1]
     
     @property
     def tu(self):
@@ -310,43 +695,136 @@ class ITMIdentifier(Identifier):
     @property
     def tg(self):
         return self.end_time - self.death_time
+    
+    def _tangent(self):
+        '''
+        Calculates the x- and y-values of the tangent once 
+        for each point of inflection.
+        '''
+        result = self._results[self.inflec_point]
+        if result['tangent'] is None:
+            t_x = numpy.arange(self.death_time, self.end_time, 0.1)
+            t_y = self.tangent_slope * t_x + self.tangent_offset
+            result['tangent'] = t_x, t_y
+        return result['tangent']
         
     def calculate_inflec_point(self, num):
         '''
-        Calculates the point of inflection.
+        Calculates the point of inflection. The results are 
+        cached, so switching back to a calculated point
+        does not fit the data again.
+        '''
+        if num not in self._results:
+            self._results[num] = self._calculate_result(num)
+        result = self._results[num]
+        self.inflec_point = num
+        self.death_time = result['death_time']
+        self.tangent_slope = result['tangent_slope']
+        self.tangent_offset = result['tangent_offset']
+        self.split_point = result['split_point']
+        self.model_fitter = result['model_fitter']
+        self.height = result['height']
+        self.end_time = result['end_time']
+    
+    def select(self, num):
+        '''
+        Selects the point of inflection like 
+        L{calculate_inflec_point}, but in a copy of the identifier.
+        The identifier itself is not changed, so it can still be 
+        read by other threads. The copy shares the data and the
+        fitter, but not the results.
+        @return: The copy of the identifier.
+        '''
+        ident = copy.copy(self)
+        ident._results = dict((key, dict(result)) 
+                              for key, result in self._results.items())
+        ident.calculate_inflec_point(num)
+        return ident
+    
+    def calculate_all(self, threads=None):
+        '''
+        Calculates the results of all points of inflection which 
+        are not calculated yet. Switching between the points does 
+        not fit the data afterwards.
+        @param threads: Number of threads which calculate the 
+            points in parallel (default: one).
+        @return: List of L{ITMResult} in the order of L{i_points}.
+        '''
+        todo = [num for num in range(len(self.i_points)) 
+                if num not in self._results]
+        if threads > 1 and len(todo) > 1:
+            # fill the shared caches before the threads read them
+            self.fitter.get_values(1)
+            modellib.exp_approach
+            pool = ThreadPool(min(threads, len(todo)))
+            try:
+                results = pool.map(self._calculate_result, todo)
+            finally:
+                pool.close()
+        else:
+            results = map(self._calculate_result, todo)
+        self._results.update(zip(todo, results))
+        return self.results
+    
+    @property
+    def results(self):
+        '''
+        Property.
+        Table of the calculated points of inflection.
+        @return: List of L{ITMResult}, None for each point 
+            which is not calculated yet.
         '''
-        # Each tuple in i_points contains the x and y-value
-        # plus the slope
+        table = []
+        for num, (x, y, m) in enumerate(self.i_points):
+            result = self._results.get(num)
+            if result is None:
+                table.append(None)
+                continue
+            tu = result['death_time']
+            table.append(ITMResult(x, y, m, result['tangent_offset'], tu,
+                                   result['end_time'] - tu, result['height'],
+                                   result['split_point']))
+        return table
+    
+    def _calculate_result(self, num):
+        '''
+        Calculates the tangent, the split point and the 
+        exponential approach of a point of inflection.
+        @return: Dictionary with the values of the attributes.
+        '''
+        # Each row in i_points contains the x and y-value
+        # plus the slope (see fitting.INFLEC_DTYPE)
         x, y, m = self.i_points[num]
         
         # tangential form: "mx + b = y"
         b = y - m*x
-        self.death_time = -b/m
-        self.tangent_slope = m
-        self.tangent_offset = b
-        self.split_point = self._calculate_split_point(x)
+        split_point = self._calculate_split_point(x, m)
         
-        i = numpy.nonzero(self.x > self.split_point)
+        i = numpy.nonzero(self.x > split_point)
         x, y = self.x[i], self.y[i]
         
-        self.model_fitter = ModelFitter(x, y, modellib.exp_approach)
-        mf = self.model_fitter
-        self.height = mf.params['c']
-        self.end_time = (self.height - b) / m
+        mf = ModelFitter(x, y, modellib.exp_approach, 
+                         decimate=self.decimate, polish=self.polish)
+        height = mf.params['c']
+        return dict(death_time=-b/m, tangent_slope=m, tangent_offset=b,
+                    split_point=split_point, model_fitter=mf,
+                    height=height, end_time=(height - b) / m, 
+                    tangent=None)
         
-    def _calculate_split_point(self, begin):
+    def _calculate_split_point(self, begin, slope):
         '''
         Calculate a useful point, where the tangent should stop
-        and the exponential function begin.
+        and the exponential function begin: the first x-value 
+        after begin, where the slope of the data deviates from
+        the slope of the tangent.
         '''
         delta = 0.1
-        x = self.poly_fitter.x
-        y = self.poly_fitter.get_values(1)
-        i = numpy.nonzero(x > begin)
-        x, y = x[i], y[i]
-        for x_val, y_val in izip(x, y):
-            if abs(y_val - self.tangent_slope) > delta:
-                return x_val
+        x = self.fitter.x
+        y = self.fitter.get_values(1)
+        deviates = (x > begin) & (numpy.abs(y - slope) > delta)
+        i = deviates.argmax()
+        if deviates[i]:
+            return x[i]
         
         
     def show_solution(self):
@@ -361,12 +839,13 @@ class ITMIdentifier(Identifier):
         
     def plot_solution(self):
         c = self.height
-        plot(self.x, self.y, label='data')
-        plot([self.x[0], self.x[-1]], [c, c], '--', label='limit')
-        plot(self.t_x, self.t_y, label='tangent')
-        legend()
-        grid()
-        show()
+        plt = _pyplot()
+        plt.plot(self.x, self.y, label='data')
+        plt.plot([self.x[0], self.x[-1]], [c, c], '--', label='limit')
+        plt.plot(self.t_x, self.t_y, label='tangent')
+        plt.legend()
+        plt.grid()
+        plt.show()
     
 def shift_data(x, y, width):
     '''
@@ -377,29 +856,113 @@ def shift_data(x, y, width):
     i = numpy.nonzero(x > width)
     return x[i] - width, y[i]
 
-def identify_reg(x, y, model, shift=0.0):
+def identify_reg(x, y, model, shift=0.0, preprocessor=None, guess=False,
+                 decimate=None, polish=False):
     '''
     Processes regression model identifying.
+    @param preprocessor: Applied to the data after the shift 
+        (see L{preprocessing.Preprocessor}).
+    @param guess: Estimation of the start parameters
+        (see L{ModelFitter}).
+    @param decimate: Fit the decimated data, e.g. C{2000} or
+        C{(2000, 'lttb')} (see L{numlib.decimate}).
+    @param polish: Refine the fit of the decimated data on all
+        data.
     '''
     if shift > 0:
         x, y = shift_data(x, y, shift)
-    ri = RegressionIdentifier(x, y, model)
+    if preprocessor is not None:
+        x, y = preprocessor(x, y)
+    ri = RegressionIdentifier(x, y, model, guess, decimate=decimate,
+                              polish=polish)
     ri.show_solution()
     
-def identify_itm(x, y, degree=11, shift=0.0):
+def identify_itm(x, y, degree=11, shift=0.0, basis='chebyshev', 
+                 fitter='poly', knots=16, preprocessor=None, decimate=None,
+                 polish=False):
     '''
     Processes the identification with the
     inflectional tangent method.
+    @param fitter: Approximation of the data, "poly" or "spline"
+        (see L{ITMIdentifier}).
+    @param preprocessor: Applied to the data after the shift 
+        (see L{preprocessing.Preprocessor}).
+    @param decimate: Fit the decimated data (see L{identify_reg}).
+    @param polish: Refine the fit of the model on all data.
     '''
     if shift > 0:
         x, y = shift_data(x, y, shift)
-    itmi = ITMIdentifier(x, y, degree)
+    if preprocessor is not None:
+        x, y = preprocessor(x, y)
+    itmi = ITMIdentifier(x, y, degree, basis, fitter, knots, 
+                         decimate=decimate, polish=polish)
     itmi.show_solution()
 
-def _convert_excel_float(value):
-    return float(value.replace(',', '.'))  
-
-load_csv = partial(numpy.loadtxt, delimiter=';', unpack=True, 
-                   converters = {0: _convert_excel_float, 
-                                 1: _convert_excel_float} )
         
+
+FitResult = namedtuple('FitResult', 'name params rss aic bic time success '
+                                    'error')
+'''
+Result of a model in L{fit_all}. rss is the residual sum 
+of squares, aic and bic the information criteria.
+'''
+
+def _fit_model(args):
+    model, x, y, maxfev, timeout, guess = args
+    if isinstance(model, basestring):
+        model = modellib[model]
+    start = time.time()
+    try:
+        mf = ModelFitter(x, y, model, maxfev, timeout, guess)
+    except FitTimeout as e:
+        return FitResult(model.name, None, numpy.inf, numpy.inf, numpy.inf,
+                         time.time() - start, False, str(e))
+    except Exception as e:
+        return FitResult(model.name, None, numpy.inf, numpy.inf, numpy.inf,
+                         time.time() - start, False, 
+                         '{0}: {1}'.format(e.__class__.__name__, e))
+    wall_time = time.time() - start
+    
+    n = len(x)
+    k = len(model.param_names)
+    rss = float(numpy.sum((y - mf.y)**2))
+    if not numpy.isfinite(rss):
+        rss = numpy.inf
+    with numpy.errstate(divide='ignore'):
+        log_likelihood = n * numpy.log(rss / n)
+    return FitResult(model.name, mf.params, rss, log_likelihood + 2 * k,
+                     log_likelihood + k * numpy.log(n), wall_time,
+                     mf.success, None)
+
+def fit_all(x, y, models=None, criterion='aic', processes=None, 
+            threads=True, maxfev=0, timeout=None, guess=False):
+    '''
+    Fits all models to the data concurrently and ranks them.
+    @param models: List of models or model names (default: all 
+        models in L{modellib}).
+    @param criterion: Field of L{FitResult} for the ranking
+        ("rss", "aic", "bic" or "time").
+    @param processes: Number of workers (default: number of CPUs).
+    @param threads: Use threads (True) or processes (False). 
+        Only models of L{modellib} can be fitted in processes.
+    @param maxfev: Maximum number of function evaluations per model.
+    @param timeout: Time budget per model in seconds. Models 
+        exceeding it are stopped and ranked last.
+    @param guess: Estimation of the start parameters
+        (see L{ModelFitter}).
+    @return: List of L{FitResult}, the best model first. Failed
+        models have an infinite rss.
+    '''
+    if models is None:
+        models = list(modellib)
+    if not threads:
+        models = [getattr(model, 'name', model) for model in models]
+        modellib.prepare(models)
+    tasks = [(model, x, y, maxfev, timeout, guess) for model in models]
+    pool = ThreadPool(processes) if threads else Pool(processes)
+    try:
+        results = pool.map(_fit_model, tasks)
+    finally:
+        pool.close()
+    return sorted(results, key=lambda result: (bool(result.error),
+                                               getattr(result, criterion)))
@@ -2,16 +2,48 @@
 
 '''
 This module provides classes for curve fitting.
-There are a polynomial fitter (L{PolyFitter}) and
-a fitter for regression models (L{ModelFitter}).
+There are a polynomial fitter (L{PolyFitter}), a smoothing
+spline fitter (L{SplineFitter}) and a fitter for regression 
+models (L{ModelFitter}). L{FitCache} reuses the results of
+model fits for repeated fits of similar data.
 '''
 
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+import threading
+import zlib
 
 import numpy
-import sympy
+from numpy.polynomial import Chebyshev, Polynomial
+from scipy.interpolate import LSQUnivariateSpline, UnivariateSpline
 
-from sitforc import numlib, symlib
+from sitforc import numlib
+from sitforc.guess import initial_params, multistart
+
+INFLEC_DTYPE = numpy.dtype([('x', float), ('y', float), ('slope', float)])
+'''
+Data type of the points of inflection (see L{PolyFitter.get_inflec_points}).
+'''
+
+def _inflec_points(x_vals, y_vals, slopes):
+    points = numpy.empty(len(x_vals), INFLEC_DTYPE)
+    points['x'] = x_vals
+    points['y'] = y_vals
+    points['slope'] = slopes
+    return points
+
+def _decimated(x, y, decimate):
+    '''
+    @param decimate: None, the number of samples or a tuple with
+        the number of samples and the method (see 
+        L{numlib.decimate}).
+    @return: Tuple with the decimated x and y values.
+    '''
+    if not decimate:
+        return x, y
+    if isinstance(decimate, tuple):
+        return numlib.decimate(x, y, *decimate)
+    return numlib.decimate(x, y, decimate)
 
 class Fitter(object):
     '''
@@ -81,17 +113,41 @@ class Fitter(object):
 class PolyFitter(Fitter):
     '''
     Class for polynomial curve fitting.
+    
+    With basis "monomial" the polynomial is fitted with 
+    C{numpy.polyfit} and the key "obj" of L{Fitter.data_cache} 
+    contains the coefficients. With basis "chebyshev" it is
+    fitted in the Chebyshev basis on the x-range scaled to
+    [-1, 1], which is well-conditioned for high degrees. Then
+    "obj" contains a C{numpy.polynomial.Chebyshev} instance and
+    derivations and roots are calculated in this basis.
+    
+    An already fitted polynomial (coefficients or C{Chebyshev}
+    instance matching the basis, e.g. of 
+    L{streaming.RecursivePolyFit}) can be passed with poly, 
+    then the data is not fitted again.
+    
+    With decimate the polynomial is fitted to the decimated data
+    (see L{numlib.decimate}, e.g. C{decimate=2000} or 
+    C{decimate=(2000, 'lttb')}), the values are still calculated
+    for all x-values.
     '''
-    def __init__(self, x, y, degree):
+    def __init__(self, x, y, degree, basis='monomial', poly=None,
+                 decimate=None):
         Fitter.__init__(self, x, y)
+        if basis not in ('monomial', 'chebyshev'):
+            raise ValueError('Unknown basis "{0}"'.format(basis))
+        self.basis = basis
         
-        coeffs = numpy.polyfit(x, y, degree)
-        repr_str = str(numpy.poly1d(coeffs))
-        values = numpy.polyval(coeffs, self.x)
-        self._fill_cache(0, coeffs, values, repr_str)
+        x_fit, y_fit = _decimated(x, y, decimate)
+        if poly is None and basis == 'chebyshev':
+            poly = Chebyshev.fit(x_fit, y_fit, degree)
+        elif poly is None:
+            poly = numpy.polyfit(x_fit, y_fit, degree)
+        self._fill_cache(0, poly, self._polyval(poly, self.x), None)
     
     def __str__(self):
-        return self.data_cache[0]['repr']
+        return self.repr_func()
         
     @property
     def degree(self):
@@ -99,77 +155,414 @@ class PolyFitter(Fitter):
         Property.
         Degree of the approximated polynomial curve.
         '''
+        if self.basis == 'chebyshev':
+            return self.data_cache[0]['obj'].degree()
         return len(self.data_cache[0]['obj']) - 1
+    
+    def _polyval(self, poly, x):
+        if self.basis == 'chebyshev':
+            return poly(x)
+        return numpy.polyval(poly, x)
+    
+    def _polyder(self, poly, n):
+        if self.basis == 'chebyshev':
+            return poly.deriv(n)
+        return numpy.polyder(poly, n)
+    
+    def _roots(self, poly):
+        if self.basis == 'chebyshev':
+            return poly.roots()
+        return numpy.roots(poly)
+    
+    def repr_func(self, n=0):
+        '''
+        The representation is generated on demand, the conversion 
+        from the Chebyshev basis is slower than the fit.
+        @return: String representation of n-th derivation.
+        '''
+        self._derivate(n)
+        cache = self.data_cache[n]
+        if cache['repr'] is None:
+            poly = cache['obj']
+            if self.basis == 'chebyshev':
+                # coefficients in the monomial basis of x
+                poly = poly.convert(kind=Polynomial).coef[::-1]
+            cache['repr'] = str(numpy.poly1d(poly))
+        return cache['repr']
         
     def _derivate(self, n):
         if n not in self.data_cache:
             m = max((d for d in self.data_cache if d < n))
-            coeffs_m = self.data_cache[m]['obj']
+            poly_m = self.data_cache[m]['obj']
 
-            coeffs = numpy.polyder(coeffs_m, n - m)
-            repr_str = str(numpy.poly1d(coeffs))
-            values = numpy.polyval(coeffs, self.x)
-            self._fill_cache(n, coeffs, values, repr_str)
+            poly = self._polyder(poly_m, n - m)
+            values = self._polyval(poly, self.x)
+            self._fill_cache(n, poly, values, None)
             
     
+    def _derivative_obj(self, n):
+        if n in self.data_cache:
+            return self.data_cache[n]['obj']
+        return self._polyder(self.data_cache[0]['obj'], n)
+    
     def get_inflec_points(self):
         '''
         Calculates the points of inflection
         in the range of x. Points with
-        imaginary part are skipped.
-        '''
-        coeffs = self.data_cache[0]['obj']
-        self._derivate(1)
-        coeffs1 = self.data_cache[1]['obj'] # 1. Ableitung
-        self._derivate(2)
-        coeffs2 = self.data_cache[2]['obj'] # 2. Ableitung
-        self._derivate(3)
-        coeffs3 = self.data_cache[3]['obj'] # 3. Ableitung
-        inflec_points = [float(x_val) for x_val 
-                         in sorted(numpy.roots(coeffs2))
-                         if x_val.imag == 0 and 
-                         numpy.polyval(coeffs3, float(x_val)) != 0 and
-                         self.x[0] <= float(x_val) <= self.x[-1]]
-        #x_vals = numpy.array(inflec_points)
-        #y_vals = numpy.polyval(coeffs, x_vals)
-        #slopes = numpy.polyval(coeffs1, x_vals)
-        return [(x_point, numpy.polyval(coeffs, x_point), 
-                 numpy.polyval(coeffs1, x_point)) 
-                 for x_point in inflec_points]
-        #return x_vals, y_vals, slopes
+        imaginary part are skipped. Only the coefficients of the
+        derivations are needed, their values are not calculated.
+        @return: Structured array (see L{INFLEC_DTYPE}) with
+            the x and y-value plus the slope of each point, sorted
+            by x. Each row can be unpacked like a tuple, 
+            C{points.tolist()} returns a list of tuples.
+        '''
+        poly = self.data_cache[0]['obj']
+        poly1 = self._derivative_obj(1) # 1. Ableitung
+        poly2 = self._derivative_obj(2) # 2. Ableitung
+        poly3 = self._derivative_obj(3) # 3. Ableitung
+        roots = self._roots(poly2)
+        roots = numpy.sort(roots[roots.imag == 0].real)
+        roots = roots[(self.x[0] <= roots) & (roots <= self.x[-1])]
+        x_vals = roots[self._polyval(poly3, roots) != 0]
+        return _inflec_points(x_vals, self._polyval(poly, x_vals), 
+                              self._polyval(poly1, x_vals))
+    
+class SplineFitter(Fitter):
+    '''
+    Class for curve fitting with a quintic regression spline.
+    
+    The spline adapts locally to the data, so sharp steps do not
+    require a high degree as with L{PolyFitter}. The fit runs in
+    linear time in the number of samples. The derivations are 
+    splines again (key "obj" of L{Fitter.data_cache}), the second
+    one is cubic, so the inflection points are its exact roots.
+    '''
+    degree = 5
+    
+    def __init__(self, x, y, knots=16, smoothing=None, decimate=None):
+        '''
+        @param knots: Number of interior knots. They are placed
+            at the quantiles of x, so each piece covers the same
+            number of samples. More knots follow the data closer,
+            but add inflection points caused by noise.
+        @param smoothing: If given, a smoothing spline with
+            automatic knots is fitted instead, the value is the upper
+            bound of the sum of the squared residuals (parameter "s" 
+            of C{scipy.interpolate.UnivariateSpline}).
+        @param decimate: Fit the spline to the decimated data 
+            (see L{PolyFitter}). The smoothing refers to the
+            decimated data then.
+        '''
+        Fitter.__init__(self, x, y)
+        x, y = _decimated(x, y, decimate)
+        if smoothing is None:
+            q = numpy.linspace(0, 100, knots + 2)[1:-1]
+            spline = LSQUnivariateSpline(x, y, numpy.percentile(x, q), 
+                                         k=self.degree)
+        else:
+            spline = UnivariateSpline(x, y, k=self.degree, s=smoothing)
+        self._fill_cache(0, spline, spline(self.x), None)
+    
+    def __str__(self):
+        return self.repr_func()
+    
+    def repr_func(self, n=0):
+        '''
+        @return: String representation of n-th derivation.
+        '''
+        self._derivate(n)
+        cache = self.data_cache[n]
+        if cache['repr'] is None:
+            if cache['obj'] is None:
+                cache['repr'] = '0'
+            else:
+                cache['repr'] = 'Spline of degree {0} with {1} knots'.format(
+                    self.degree - n, len(cache['obj'].get_knots()))
+        return cache['repr']
+    
+    def _derivate(self, n):
+        if n not in self.data_cache:
+            if n > self.degree:
+                self._fill_cache(n, None, numpy.zeros(len(self.x)), None)
+                return
+            spline = self.data_cache[0]['obj'].derivative(n)
+            self._fill_cache(n, spline, spline(self.x), None)
+    
+    def _derivative_obj(self, n):
+        if n in self.data_cache:
+            return self.data_cache[n]['obj']
+        return self.data_cache[0]['obj'].derivative(n)
+    
+    def get_inflec_points(self):
+        '''
+        Calculates the points of inflection
+        in the range of x.
+        @return: Structured array like L{PolyFitter.get_inflec_points}.
+        '''
+        spline = self.data_cache[0]['obj']
+        spline1 = self._derivative_obj(1)
+        roots = numpy.unique(self._derivative_obj(2).roots())
+        x_vals = roots[self._derivative_obj(3)(roots) != 0]
+        return _inflec_points(x_vals, spline(x_vals), spline1(x_vals))
     
 class ModelFitter(Fitter):
     '''
     Curve fitting with a regression model.
     See L{core.Model} and L{core.ModelLibrary}
     for more information about using regression models.
+    
+    The number of function evaluations and the time of the
+    fit can be limited with maxfev and timeout 
+    (see L{numlib.modelfit}).
+    
+    By default the fit starts from the default parameters of the
+    model. With guess=True the start parameters are estimated
+    from the data (see L{guess.initial_params}), with 
+    guess="multistart" several estimates are fitted at once and
+    the best one is refined (see L{guess.multistart}). Explicitly
+    given parameters override the estimates.
+    
+    With decimate the model is fitted to the decimated data (see
+    L{PolyFitter}), with polish=True this fit is refined on all
+    data. This is faster for long recordings, because the 
+    refinement starts close to the solution.
     '''
-    def __init__(self, x, y, model, **params):
+    def __init__(self, x, y, model, maxfev=0, timeout=None, guess=False,
+                 decimate=None, polish=False, **params):
         Fitter.__init__(self, x, y)
         self.model = model
-        self.params = dict(self.model.default_params)
+        x_fit, y_fit = _decimated(x, y, decimate)
+        if guess == 'multistart':
+            self.params = multistart(model, x_fit, y_fit)
+        elif guess:
+            self.params = initial_params(model, x_fit, y_fit)
+        else:
+            self.params = dict(self.model.default_params)
         self.params.update(params)
         
-        numlib.modelfit(self.model, self.params, x, y)
+        self.success = numlib.modelfit(self.model, self.params, x_fit, 
+                                       y_fit, maxfev, timeout)
+        if polish and x_fit is not x:
+            self.success = numlib.modelfit(self.model, self.params, x, y, 
+                                           maxfev, timeout)
         
-        sym_func = symlib.generate_sym_func(self.model.funcstring, 
-                                            self.params)
-        repr_str = sympy.pretty(sym_func)
+        # The symbolic function (key "obj") and its representation
+        # are generated on demand, so a numeric fit needs no sympy.
         values = self.model(self.x, self.params)
-        self._fill_cache(0, sym_func, values, repr_str)
+        self._fill_cache(0, None, values, None)
         
     def __str__(self):
-        return self.data_cache[0]['repr']
+        return self.repr_func()
+    
+    @staticmethod
+    def fit_many(x, Y, model, maxiter=200, **params):
+        '''
+        Fits the model to many data sets with the same x-values
+        in one batched solve (see L{numlib.batch_modelfit}). This 
+        is much faster than a L{ModelFitter} for each series.
+        @param Y: y-values, shape (number of series, len(x)).
+        @param params: Start values of the parameters (default: the
+            default parameters of the model).
+        @return: Tuple with the parameter matrix (one row for each
+            series, the columns are ordered like C{model.param_names})
+            and the convergence flag of each series.
+        '''
+        start = dict(getattr(model, 'default_params', {}))
+        start.update(params)
+        theta = [start[name] for name in model.param_names]
+        return numlib.batch_modelfit(model, theta, x, Y, maxiter)
+    
+    def _sym_func(self):
+        '''
+        @return: Symbolic function of the 0th derivation,
+            it is generated on first use.
+        '''
+        cache = self.data_cache[0]
+        if cache['obj'] is None:
+            from sitforc import symlib
+            params = dict((key, float(value)) 
+                          for key, value in self.params.items())
+            cache['obj'] = symlib.generate_sym_func(self.model.funcstring, 
+                                                    params)
+        return cache['obj']
+    
+    def repr_func(self, n=0):
+        self._derivate(n)
+        cache = self.data_cache[n]
+        if cache['repr'] is None:
+            from sitforc import symlib
+            if cache['obj'] is None:
+                sym_func = self._sym_func()
+                if n:
+                    cache['obj'] = symlib.diff_func(sym_func, n)
+            cache['repr'] = symlib.pretty(cache['obj'])
+        return cache['repr']
         
     def _derivate(self, n):
+        '''
+        The values are calculated with the compiled derivation 
+        of the model (see L{core.Model.derivative}), the symbolic 
+        derivation is only generated for L{repr_func}.
+        '''
         if n not in self.data_cache:
+            derivative = getattr(self.model, 'derivative', None)
+            if derivative is not None:
+                derivative = derivative(n)
+            if derivative is not None:
+                theta = [self.params[key] for key in self.model.param_names]
+                values = numpy.empty(numpy.shape(self.x))
+                values[...] = derivative.vfunc(self.x, theta)
+                self._fill_cache(n, None, values, None)
+                return
+            
+            from sitforc import symlib
+            self._sym_func()
             m = max((d for d in self.data_cache if d < n))
             sym_func = self.data_cache[m]['obj']
-
+            
             derivate = symlib.diff_func(sym_func, n - m)
-            repr_str = sympy.pretty(derivate)
             func = numlib.generate_func(derivate)
             values = func(self.x, None)
-            self._fill_cache(n, derivate, values, repr_str)
-        
+            self._fill_cache(n, derivate, values, None)
 
+class FitCache(object):
+    '''
+    Cache of L{ModelFitter} results for repeated fits of a model,
+    e.g. after a shift of the data or for a new chunk of samples.
+    
+    The data is described by a cheap fingerprint (see
+    L{FitCache.fingerprint}). For identical data (equal fingerprint
+    and checksum) and fit options the stored fitter is returned, 
+    otherwise the fit
+    starts from the parameters of the stored fit of the same model
+    with the nearest fingerprint. If this warm started fit does not
+    converge, it is repeated from the usual start parameters.
+    The least recently used results are evicted.
+    
+    Usage::
+    
+        cache = FitCache()
+        mf = cache.fit(x, y, modellib.pt2)
+        mf = cache.fit(x, y + 0.01, modellib.pt2)  # warm start
+        print cache.stats
+    '''
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        '''
+        Number of fits which were returned from the cache.
+        '''
+        self.warm = 0
+        '''
+        Number of fits which started from a cached result.
+        '''
+        self.misses = 0
+        '''
+        Number of fits without a cached result of the model.
+        '''
+        self.fallbacks = 0
+        '''
+        Number of warm started fits which did not converge
+        and were repeated.
+        '''
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    def __len__(self):
+        return len(self._entries)
+    
+    @staticmethod
+    def fingerprint(x, y):
+        '''
+        @return: Array with the length, the x-range and the
+            minimum, maximum, mean and standard deviation of y.
+        '''
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+        if not len(x):
+            return numpy.zeros(7)
+        return numpy.array([len(x), x[0], x[-1], y.min(), y.max(), 
+                            y.mean(), y.std()])
+    
+    @staticmethod
+    def _checksum(x, y):
+        x = numpy.ascontiguousarray(x, dtype=float)
+        y = numpy.ascontiguousarray(y, dtype=float)
+        return zlib.crc32(y.data, zlib.crc32(x.data)) & 0xffffffff
+    
+    def _nearest(self, name, fingerprint):
+        best, best_distance = None, numpy.inf
+        for key, (fp, fitter) in self._entries.items():
+            if key[0] != name:
+                continue
+            scale = numpy.maximum(numpy.abs(fp), numpy.abs(fingerprint))
+            scale[scale == 0] = 1
+            distance = numpy.sum(numpy.abs(fp - fingerprint) / scale)
+            if distance < best_distance:
+                best, best_distance = fitter, distance
+        return best
+    
+    def fit(self, x, y, model, maxfev=0, timeout=None, guess=False, 
+            decimate=None, polish=False, **params):
+        '''
+        Fits the model to the data (see L{ModelFitter}) or returns
+        the cached result for identical data and options (maxfev,
+        timeout, guess, decimate, polish and the given parameters).
+        Explicitly given parameters override the parameters of the
+        cached fit.
+        @return: L{ModelFitter} instance, which must not be changed.
+        '''
+        name = getattr(model, 'name', model)
+        fingerprint = self.fingerprint(x, y)
+        options = (maxfev, timeout, guess, decimate, polish,
+                   tuple(sorted(params.items())))
+        key = (name, options, tuple(fingerprint), self._checksum(x, y))
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[1].success:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            nearest = self._nearest(name, fingerprint)
+            if nearest is None:
+                self.misses += 1
+            else:
+                self.warm += 1
+        
+        fitter = None
+        if nearest is not None:
+            start = dict(nearest.params)
+            start.update(params)
+            fitter = ModelFitter(x, y, model, maxfev, timeout, False, 
+                                 decimate, polish, **start)
+            if not fitter.success:
+                with self._lock:
+                    self.fallbacks += 1
+                fitter = None
+        if fitter is None:
+            fitter = ModelFitter(x, y, model, maxfev, timeout, guess, 
+                                 decimate, polish, **params)
+        
+        with self._lock:
+            self._entries[key] = (fingerprint, fitter)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return fitter
+    
+    @property
+    def stats(self):
+        '''
+        Property.
+        Dictionary with the numbers of hits, warm started fits,
+        misses and fallbacks (see the attributes) and the number
+        of cached results.
+        '''
+        return dict(hits=self.hits, warm=self.warm, misses=self.misses,
+                    fallbacks=self.fallbacks, size=len(self._entries))
+    
+    def clear(self):
+        '''
+        Removes all results, the statistics are kept.
+        '''
+        with self._lock:
+            self._entries.clear()
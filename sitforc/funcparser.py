@@ -8,7 +8,7 @@ from __future__ import division
 
 import ast
 
-import numlib
+from sitforc.compiler import compile_func
 
 ALLOWED_CALLS = ['fac', 'exp', 'sin', 'cos']
 
@@ -115,7 +115,7 @@ def parse_func(funcstring):
     '''
     Parses a function provided as string.
     @return: Tuple with 3 elements
-        1) Generated lambda-function.
+        1) Compiled function (see L{compiler.CompiledFunc}).
         2) Created LaTeX expression.
         3) A list containing the names of the identified parameters.
     '''
@@ -138,6 +138,6 @@ def parse_func(funcstring):
     
     ident_params = params.keys()
     
-    func = numlib.generate_func(funcstring)
+    func = compile_func(expr, ident_params)
         
     return func, latex, ident_params
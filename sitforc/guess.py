@@ -0,0 +1,257 @@
+# coding: utf-8
+
+'''
+Estimation of start parameters for the regression models.
+
+The default parameters of the models (see L{core.ModelLibrary})
+only suit data of a certain scale, the fit of other data needs
+many iterations or fails. The functions of this module estimate
+the parameters of the step response models from characteristic
+values of the data:
+
+ - the gain from the final plateau,
+ - the time constants from the times at which the response
+   reaches fractions of the gain (e.g. 63 %),
+ - the dead time from the first departure of the response.
+
+L{GUESSERS} maps the model names to the estimation functions.
+L{initial_params} estimates the parameters of a model (models
+without estimation get their default parameters), L{multistart}
+fits several variations of the estimate at once and returns
+the best one.
+'''
+
+from functools import partial
+
+import numpy
+from scipy.special import gammaincinv
+
+from sitforc import numlib
+from sitforc.smoothing import moving_average
+
+PLATEAU = 0.1
+'''
+Fraction of the values at the end of the data which are
+used to estimate the gain.
+'''
+
+DEPARTURE = 0.02
+'''
+Fraction of the gain at which the response departs from zero
+(see L{guess_exp_approach}).
+'''
+
+LEVELS = numpy.array([0.25, 0.5, 0.75])
+'''
+Fractions of the gain whose crossing times are used to
+estimate the time constants.
+'''
+
+LAG_RATIOS = numpy.linspace(0.05, 0.8, 31)
+'''
+Ratios of successive time constants in the shape table of the
+models with different time constants (see L{guess_lags}).
+'''
+
+def _plateau(y):
+    n = max(1, int(len(y) * PLATEAU))
+    return float(numpy.median(y[-n:]))
+
+def normalized_response(x, y):
+    '''
+    @return: Tuple with the gain (see L{PLATEAU}) and the
+        response divided by the gain. Noisy data is smoothed
+        with a short moving average.
+    '''
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    if len(x) < 3:
+        raise ValueError('Too few values for an estimation.')
+    gain = _plateau(y)
+    if not gain or not numpy.isfinite(gain):
+        raise ValueError('The response has no plateau.')
+    window = len(y) // 50
+    if window >= 3:
+        y = moving_average(y, window)
+    return gain, y / gain
+
+def crossing_times(x, r, levels):
+    '''
+    Times at which the normalized response first reaches the
+    levels, interpolated linearly. The running maximum of
+    the response is searched, so all levels are found with one
+    binary search.
+    @param levels: Ascending fractions of the gain.
+    @return: Array with the times, nan for levels which are
+        not reached.
+    '''
+    envelope = numpy.maximum.accumulate(r)
+    levels = numpy.asarray(levels, dtype=float)
+    i = numpy.searchsorted(envelope, levels)
+    n = len(r)
+    j = numpy.clip(i, 1, n - 1)
+    e0, e1 = envelope[j - 1], envelope[j]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        frac = numpy.where(e1 > e0, (levels - e0) / (e1 - e0), 0.0)
+    times = x[j - 1] + numpy.clip(frac, 0, 1) * (x[j] - x[j - 1])
+    times[i == 0] = x[0]
+    times[i >= n] = numpy.nan
+    return times
+
+def guess_linear(model, x, y):
+    a, b = numpy.polyfit(x, y, 1)
+    return dict(a=a, b=b)
+
+def guess_lag(model, x, y, order=1):
+    '''
+    Estimation for a step response with equal time constants
+    (pt1 and ptN_sim). Its normalized response is the
+    regularized incomplete gamma function P(order, x/t), so each
+    crossing time is a multiple of t.
+    '''
+    gain, r = normalized_response(x, y)
+    times = crossing_times(x, r, LEVELS)
+    g = gammaincinv(order, LEVELS)
+    valid = numpy.isfinite(times)
+    t = numpy.dot(times[valid], g[valid]) / numpy.dot(g[valid], g[valid])
+    return dict(c=gain, t=t)
+
+_lag_tables = dict()
+
+def _lag_table(model, names):
+    '''
+    Crossing times (see L{LEVELS}) of the model with the gain 1
+    and the time constants C{r**i} for each ratio r in
+    L{LAG_RATIOS}, calculated once for each model.
+    '''
+    table = _lag_tables.get(model.name)
+    if table is None:
+        x = numpy.linspace(0, 30, 3001)
+        table = numpy.empty((len(LAG_RATIOS), len(LEVELS)))
+        for k, ratio in enumerate(LAG_RATIOS):
+            params = dict(model.default_params)
+            params['c'] = 1.0
+            params.update((name, ratio**i) for i, name in enumerate(names))
+            table[k] = crossing_times(x, model.func(x, params), LEVELS)
+        _lag_tables[model.name] = table
+    return table
+
+def guess_lags(model, x, y):
+    '''
+    Estimation for a step response with different time
+    constants (pt2 and pt3). The time constants are assumed
+    to form a geometric series, whose ratio is interpolated
+    from the ratio of the first to the last crossing time
+    (see L{LAG_RATIOS}). The values stay distinct, the model
+    functions are singular for equal time constants.
+    '''
+    names = sorted(name for name in model.param_names
+                   if name.startswith('t'))
+    gain, r = normalized_response(x, y)
+    times = crossing_times(x, r, LEVELS)
+    if not numpy.all(numpy.isfinite(times)):
+        raise ValueError('The response does not reach the plateau.')
+    table = _lag_table(model, names)
+    shape = table[:, 0] / table[:, -1]
+    order = numpy.argsort(shape)
+    ratio = numpy.interp(times[0] / times[-1], shape[order],
+                         LAG_RATIOS[order])
+    scale = times[1] / numpy.interp(ratio, LAG_RATIOS, table[:, 1])
+    params = dict(c=gain)
+    params.update((name, scale * ratio**i) for i, name in enumerate(names))
+    return params
+
+def guess_exp_approach(model, x, y):
+    '''
+    Estimation for a first order response with dead time. The
+    first departure (see L{DEPARTURE}) and the 63 % point give
+    the time constant and the dead time.
+    '''
+    gain, r = normalized_response(x, y)
+    levels = [DEPARTURE, 1 - numpy.exp(-1)]
+    x_dep, x_63 = crossing_times(x, r, levels)
+    t = (x_63 - x_dep) / (1 + numpy.log(1 - DEPARTURE))
+    return dict(c=gain, t=t, dx=x_63 - t)
+
+def guess_gaussian(model, x, y):
+    '''
+    Estimation for the inverted Gaussian curve. The dip below
+    the plateau is a Gaussian, its mean and its area give mu
+    and sigma.
+    '''
+    height, r = normalized_response(x, y)
+    dip = numpy.clip(1 - r, 0, None)
+    area = numpy.trapz(dip, x)
+    if area <= 0:
+        raise ValueError('The data has no dip.')
+    return dict(height=height, mu=numpy.trapz(dip * x, x) / area,
+                sigma=area / numpy.sqrt(numpy.pi))
+
+GUESSERS = {'linear': guess_linear,
+            'pt1': guess_lag,
+            'pt2': guess_lags,
+            'pt3': guess_lags,
+            'exp_approach': guess_exp_approach,
+            'gaussian': guess_gaussian}
+for _order in range(2, 6):
+    GUESSERS['pt{0}_sim'.format(_order)] = partial(guess_lag, order=_order)
+del _order
+
+def initial_params(model, x, y):
+    '''
+    Estimates the start parameters of the model from the data.
+    If the model has no estimation function in L{GUESSERS} or
+    the data does not allow an estimation (e.g. no plateau),
+    the default parameters of the model are returned.
+    @return: Parameter dictionary.
+    '''
+    params = dict(getattr(model, 'default_params', {}))
+    guesser = GUESSERS.get(getattr(model, 'name', None))
+    if guesser is None:
+        return params
+    try:
+        with numpy.errstate(all='ignore'):
+            guess = guesser(model, x, y)
+    except (ValueError, ZeroDivisionError, numpy.linalg.LinAlgError):
+        return params
+    if all(numpy.isfinite(value) for value in guess.values()):
+        params.update((key, float(value)) for key, value in guess.items())
+    return params
+
+def start_params(model, x, y, starts=8, spread=3.0, seed=0):
+    '''
+    Variations of the estimated parameters (see L{initial_params})
+    for a multi-start fit. The first row is the estimate, the
+    parameters of the other rows are multiplied by random
+    factors between 1/spread and spread.
+    @return: Matrix of the start parameters (one row for each
+        start), the columns are ordered like C{model.param_names}.
+    '''
+    params = initial_params(model, x, y)
+    theta = numpy.array([params[name] for name in model.param_names])
+    random = numpy.random.RandomState(seed)
+    exponents = random.uniform(-1, 1, (starts, len(theta)))
+    exponents[0] = 0
+    return theta * spread**exponents
+
+def multistart(model, x, y, starts=8, spread=3.0, maxiter=100):
+    '''
+    Fits the model from several start parameters (see
+    L{start_params}) in one batched solve (see
+    L{numlib.batch_modelfit}) and returns the parameters with
+    the smallest residual sum of squares. Models which are
+    not compiled get the estimate of L{initial_params}.
+    @return: Parameter dictionary.
+    '''
+    if getattr(model, 'vfunc', None) is None:
+        return initial_params(model, x, y)
+    y = numpy.asarray(y, dtype=float)
+    theta = start_params(model, x, y, starts, spread)
+    Y = numpy.broadcast_to(y, (len(theta), len(y)))
+    theta, success = numlib.batch_modelfit(model, theta, x, Y, maxiter)
+    with numpy.errstate(all='ignore'):
+        residual = Y - model.vfunc(x, theta.T[:, :, numpy.newaxis])
+        rss = numpy.sum(residual**2, axis=1)
+    rss[~numpy.isfinite(rss)] = numpy.inf
+    best = theta[numpy.argmin(rss)]
+    return dict(zip(model.param_names, best))
@@ -3,8 +3,11 @@
 GUI for SITforC
 '''
 
+import threading
+
 import gtk
 import gobject
+import numpy
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_gtkagg import (FigureCanvasGTKAgg
             as FigureCanvas)
@@ -12,13 +15,23 @@ import matplotlib
 matplotlib.interactive(True)
 
 from sitforc import load_csv, modellib
-from sitforc.core import RegressionIdentifier, ITMIdentifier, shift_data
-from sitforc.numlib import smooth
+from sitforc.core import RegressionIdentifier, ITMIdentifier
+from sitforc.fitting import FitCache
+from sitforc.numlib import decimate_minmax
+from sitforc.preprocessing import Preprocessor
 
 METHOD_CORRECTION = 0
 METHOD_REGRESSION = 1
 METHOD_ITM = 2
 
+ANIMATED_LINES = frozenset(('limit', 'tangent'))
+
+REFRESH_DELAY = 150
+'''
+Delay in milliseconds after the last change of a parameter,
+before the data is processed and fitted again.
+'''
+
 class GUI(gtk.Window):
     def __init__(self):
         gtk.Window.__init__(self)
@@ -27,6 +40,15 @@ class GUI(gtk.Window):
         self.identifier = None
         self.ipoint_changed = False
         self.method = METHOD_REGRESSION
+        self.preprocessor = Preprocessor()
+        self.preprocessor_lock = threading.Lock()
+        self.fit_cache = FitCache()
+        self.refresh_source = None
+        self.generation = 0
+        '''
+        Number of the latest refresh job. The results of older
+        jobs are discarded.
+        '''
         
         self.set_title('SITforC - System Identification Toolkit for '
                        'Control Theory')
@@ -99,8 +121,7 @@ class GUI(gtk.Window):
         vbox.pack_start(self.canvas_frame, False, False, 3)
         self.canvas_frame.show()
         
-        fig = Figure()
-        self.recreate_canvas(fig)
+        self.create_canvas()
         
         self.show()
         
@@ -170,7 +191,7 @@ class GUI(gtk.Window):
         self.model_combo = gtk.combo_box_new_text()
         self.model_combo.connect('changed', self.refresh)
         self.model_combo.append_text('')
-        for modelname in sorted(model.name for model in modellib):
+        for modelname in modellib.names():
             self.model_combo.append_text(modelname)
         hbox.pack_start(self.model_combo)
         self.model_combo.show()
@@ -180,6 +201,11 @@ class GUI(gtk.Window):
         hbox.pack_start(button, False, False, 3)
         button.show()
         
+        self.guess_check = gtk.CheckButton('Estimate start values')
+        self.guess_check.connect('toggled', self.refresh)
+        reg_page.pack_start(self.guess_check, False, False, 0)
+        self.guess_check.show()
+        
         hbox = gtk.HBox()
         reg_page.pack_start(hbox)
         hbox.show()
@@ -228,7 +254,8 @@ class GUI(gtk.Window):
         label.show()
         
         self.ipoint_combo = gtk.combo_box_new_text()
-        self.ipoint_combo.connect('changed', self.change_ipoint)
+        self.ipoint_handler = self.ipoint_combo.connect('changed', 
+                                                        self.change_ipoint)
         table.attach(self.ipoint_combo, 1, 2, 1, 2)
         self.ipoint_combo.show()
         
@@ -276,44 +303,98 @@ class GUI(gtk.Window):
         self.refresh()
         
     def change_ipoint(self, combo):
-        self.ipoint_changed = True
-        self.refresh()
-        
-    def process_data(self):
-        x, y = self.data
-        x, y = shift_data(x, y, self.shift_spin.get_value())
-        y = y - self.shift_spin_y.get_value()
-        y = smooth(y, self.interpolate_spin.get_value_as_int()+2)
-        return x, y
+        self.schedule_refresh(True)
+        
+    def process_data(self, shift_x=None, shift_y=None, 
+                     interpolation=None):
+        '''
+        Shifts and smoothes the data like set in the "Data 
+        correction" page. Only the stages whose parameter changed
+        are computed again (see L{Preprocessor}).
+        '''
+        if shift_x is None:
+            shift_x = self.shift_spin.get_value()
+            shift_y = self.shift_spin_y.get_value()
+            interpolation = self.interpolate_spin.get_value_as_int()
+        with self.preprocessor_lock:
+            self.preprocessor.set(shift=shift_x, offset=shift_y, 
+                                  smooth=interpolation + 2)
+            return self.preprocessor(*self.data)
         
     def refresh(self, *args):
+        self.schedule_refresh(False)
+    
+    def schedule_refresh(self, ipoint_changed):
+        '''
+        Schedules the processing and fitting of the data. 
+        Changes within L{REFRESH_DELAY} are collected, 
+        so only the last one starts a job.
+        @param ipoint_changed: Only the point of inflection
+            was changed, the data is not fitted again.
+        '''
         if self.data == None:
             return
-        fig = Figure()
-        axes = fig.add_subplot(111)
-        x, y = self.process_data()
-        axes.plot(x, y)
-        
-        if self.method == METHOD_REGRESSION: 
-            modelname = self.model_combo.get_active_text()
-            self.params_lstore.clear()
+        if self.refresh_source is not None:
+            gobject.source_remove(self.refresh_source)
+            ipoint_changed = ipoint_changed and self.ipoint_changed
+        self.ipoint_changed = ipoint_changed
+        self.refresh_source = gobject.timeout_add(REFRESH_DELAY, 
+                                                  self.start_refresh)
+    
+    def start_refresh(self):
+        '''
+        Reads the parameters from the widgets and starts a job
+        in a worker thread (see L{compute}).
+        '''
+        self.refresh_source = None
+        self.generation += 1
+        job = dict(method=self.method,
+                   shift_x=self.shift_spin.get_value(),
+                   shift_y=self.shift_spin_y.get_value(),
+                   interpolation=self.interpolate_spin.get_value_as_int(),
+                   modelname=self.model_combo.get_active_text(),
+                   degree=self.poly_degree_spin.get_value_as_int(),
+                   guess=self.guess_check.get_active(),
+                   identifier=None, ipoint=None)
+        if (self.method == METHOD_ITM and self.ipoint_changed and
+            isinstance(self.identifier, ITMIdentifier)):
+            job['identifier'] = self.identifier
+            job['ipoint'] = self.ipoint_combo.get_active()
+            if job['ipoint'] < 0:
+                job['ipoint'] = self.identifier.inflec_point
+        self.ipoint_changed = False
+        worker = threading.Thread(target=self.compute, 
+                                  args=(self.generation, job))
+        worker.daemon = True
+        worker.start()
+        return False
+    
+    def is_stale(self, generation):
+        return generation != self.generation
+    
+    def compute(self, generation, job):
+        '''
+        Processes and fits the data in the worker thread. 
+        The result is posted to the main loop (see 
+        L{finish_refresh}), unless a newer job was started 
+        in the meantime.
+        '''
+        result = dict(method=job['method'], identifier=None, 
+                      i_points=None)
+        x, y = self.process_data(job['shift_x'], job['shift_y'],
+                                 job['interpolation'])
+        result['data'] = x, y
+        
+        if job['method'] == METHOD_REGRESSION: 
             try:
-                model = modellib[modelname]
-                #self.shift_spin.set_sensitive(False)
-                #self.shift_spin_y.set_sensitive(False)
-                #self.interpolate_spin.set_sensitive(False)
-                self.identifier = RegressionIdentifier(x, y, model)
-                mf = self.identifier.model_fitter
-                axes.plot(mf.x, mf.y)
-                for param in sorted(mf.params.keys()):
-                    value = mf.params[param]
-                    self.params_lstore.append((param, '{0:.3f}'
-                                                      .format(value)))
+                model = modellib[job['modelname']]
+                if self.is_stale(generation):
+                    return
+                result['identifier'] = RegressionIdentifier(
+                    x, y, model, guess=job['guess'], 
+                    cache=self.fit_cache)
             except KeyError:
-                #self.shift_spin.set_sensitive(True)
-                #self.shift_spin_y.set_sensitive(True)
-                #self.interpolate_spin.set_sensitive(True)
-                self.identifier = None
+                pass
             except TypeError as e:
                 if str(e) == 'Improper input parameters.':
                     #TODO: Warning
@@ -321,52 +402,148 @@ class GUI(gtk.Window):
                 else:
                     raise
                     
-        elif self.method == METHOD_ITM:
-            #self.shift_spin.set_sensitive(True)
-            #self.shift_spin_y.set_sensitive(True)
-            #self.interpolate_spin.set_sensitive(True)
+        elif job['method'] == METHOD_ITM:
             try:
-                if self.ipoint_changed:
-                    num = self.ipoint_combo.get_active()
-                    if num >= 0:
-                        self.identifier.calculate_inflec_point(num)
-                    self.ipoint_changed = False
+                ident = job['identifier']
+                if ident is not None:
+                    # the shown identifier is only read in this thread
+                    ident = ident.select(job['ipoint'])
                 else:
-                    degree = self.poly_degree_spin.get_value_as_int()
-                    self.identifier = ITMIdentifier(x, y, degree)
-                    self.ipoint_combo.get_model().clear()
-                    for x, y, xp in self.identifier.i_points:
-                        text = 'x: {0:.3f}, y: {1:.3f}'.format(x, y)
-                        self.ipoint_combo.append_text(text)
-                ident = self.identifier
-                c = ident.height
-                axes.plot([ident.x[0], ident.x[-1]], [c, c], '--')
-                axes.plot(ident.t_x, ident.t_y)
-                
-                lstore = self.itm_param_lstore
-                lstore.clear()
-                lstore.append(('Tu', '{0:.3f}'.format(ident.tu)))
-                lstore.append(('Tg','{0:.3f}'.format(ident.tg)))
-                lstore.append(('Tu/Tg', '{0:.3f}'.format(ident.tu/ident.tg)))
-                lstore.append(('Tg/Tu', '{0:.3f}'.format(ident.tg/ident.tu)))
+                    if self.is_stale(generation):
+                        return
+                    ident = ITMIdentifier(x, y, job['degree'])
+                    result['i_points'] = ident.i_points
+                result['identifier'] = ident
             except TypeError as e:
                 if str(e) == 'expected non-empty vector for x':
                     #TODO: Warning
                     print 'Parameters are badly chosen (e.g. by shifting)'
                 else:
                     raise
-                
+        
+        if not self.is_stale(generation):
+            gobject.idle_add(self.finish_refresh, generation, result)
+    
+    def finish_refresh(self, generation, result):
+        '''
+        Shows the result of a job in the main loop.
+        '''
+        if self.is_stale(generation):
+            return False
+        lines = dict(data=result['data'], fit=None, limit=None, 
+                     tangent=None)
+        
+        ident = result['identifier']
+        if result['method'] == METHOD_REGRESSION:
+            self.identifier = ident
+            self.params_lstore.clear()
+            if ident is not None:
+                mf = ident.model_fitter
+                lines['fit'] = mf.x, mf.y
+                for param in sorted(mf.params.keys()):
+                    value = mf.params[param]
+                    self.params_lstore.append((param, '{0:.3f}'
+                                                      .format(value)))
+        
+        elif result['method'] == METHOD_ITM and ident is not None:
+            self.identifier = ident
+            if result['i_points'] is not None:
+                self.ipoint_combo.handler_block(self.ipoint_handler)
+                self.ipoint_combo.get_model().clear()
+                for x, y, xp in result['i_points']:
+                    text = 'x: {0:.3f}, y: {1:.3f}'.format(x, y)
+                    self.ipoint_combo.append_text(text)
+                self.ipoint_combo.handler_unblock(self.ipoint_handler)
+            c = ident.height
+            lines['limit'] = [ident.x[0], ident.x[-1]], [c, c]
+            lines['tangent'] = ident.t_x, ident.t_y
+            
+            lstore = self.itm_param_lstore
+            lstore.clear()
+            lstore.append(('Tu', '{0:.3f}'.format(ident.tu)))
+            lstore.append(('Tg','{0:.3f}'.format(ident.tg)))
+            lstore.append(('Tu/Tg', '{0:.3f}'.format(ident.tu/ident.tg)))
+            lstore.append(('Tg/Tu', '{0:.3f}'.format(ident.tg/ident.tu)))
                     
-        self.recreate_canvas(fig)
-        self.resize(1, 1)
+        self.update_canvas(lines)
+        return False
+    
+    def create_canvas(self):
+        '''
+        Creates the figure and the canvas once. The lines are
+        updated on each refresh (see L{update_canvas}).
+        '''
+        self.figure = Figure()
+        self.axes = self.figure.add_subplot(111)
+        self.lines = dict()
+        for name, style in (('data', '-'), ('fit', '-'), ('limit', '--'), 
+                            ('tangent', '-')):
+            self.lines[name], = self.axes.plot([], [], style)
+        # limit and tangent change with the point of inflection,
+        # they are drawn separately on the cached background
+        for name in ANIMATED_LINES:
+            self.lines[name].set_animated(True)
+        self.background = None
+        
+        self.canvas = FigureCanvas(self.figure)
+        self.canvas.set_size_request(450, 200)
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.canvas_frame.add(self.canvas)
+        self.canvas.show()
+    
+    def update_canvas(self, lines):
+        '''
+        Sets the data of the lines. If only the animated lines 
+        changed and the axes keep their limits, these lines are 
+        blitted on the cached background, otherwise the canvas 
+        is redrawn.
+        @param lines: Dictionary with the x and y-values of each
+            line (None: hide the line).
+        '''
+        width = max(self.canvas.get_width_height()[0], 1)
+        changed = set()
+        for name, data in lines.items():
+            line = self.lines[name]
+            if data is None:
+                if line.get_visible():
+                    line.set_visible(False)
+                    changed.add(name)
+                continue
+            x, y = decimate_minmax(numpy.asarray(data[0]), 
+                                   numpy.asarray(data[1]), width)
+            old_x, old_y = line.get_data()
+            if (line.get_visible() and numpy.array_equal(old_x, x) and
+                numpy.array_equal(old_y, y)):
+                continue
+            line.set_data(x, y)
+            line.set_visible(True)
+            changed.add(name)
+        if not changed:
+            return
         
-    def recreate_canvas(self, fig):
-        canvas = FigureCanvas(fig)
-        canvas.set_size_request(450, 200)
-        if self.canvas_frame.get_child():
-            self.canvas_frame.remove(self.canvas_frame.get_child())
-        self.canvas_frame.add(canvas)
-        canvas.show()
+        limits = self.axes.get_xlim(), self.axes.get_ylim()
+        self.axes.relim(visible_only=True)
+        self.axes.autoscale_view()
+        if (changed.issubset(ANIMATED_LINES) and self.background and 
+            limits == (self.axes.get_xlim(), self.axes.get_ylim())):
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+        else:
+            self.canvas.draw_idle()
+    
+    def on_draw(self, event):
+        '''
+        Caches the background after a full draw and adds
+        the animated lines.
+        '''
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.draw_animated()
+    
+    def draw_animated(self):
+        for name in ANIMATED_LINES:
+            if self.lines[name].get_visible():
+                self.axes.draw_artist(self.lines[name])
+        self.canvas.blit(self.axes.bbox)
         
     def load_data(self, button):
         file_chooser = gtk.FileChooserDialog(title='CSV Datei laden',
@@ -390,6 +567,7 @@ class GUI(gtk.Window):
             pass
         
 def start_gui():
+    gobject.threads_init()
     GUI()
     gtk.main()
     
\ No newline at end of file
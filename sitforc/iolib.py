@@ -0,0 +1,158 @@
+# coding: utf-8
+
+'''
+Reading of measured data.
+
+The CSV files have two columns (x and y) separated by a
+semicolon and use the decimal comma (Excel export), e.g.::
+
+    0,002;-0,001354
+
+The parsed data is cached next to the CSV file in a binary
+file (see L{CACHE_SUFFIX}), so repeated loads of the same
+measurement are memory-mapped instead of parsed again.
+'''
+
+from string import maketrans
+import os
+import tempfile
+
+import numpy
+
+EXCEL_TABLE = maketrans(',;', '. ')
+'''
+Translation table which converts an Excel-CSV buffer into
+whitespace separated values with decimal point.
+'''
+
+CHUNK_SIZE = 1 << 20
+
+CACHE_SUFFIX = '.sfc.npy'
+'''
+Suffix of the cache file, which is appended to the name
+of the CSV file. The cache is a 2xN+1 array: the first column
+contains the size and the modification time of the CSV file,
+the remaining columns the x and y values.
+'''
+
+def _parse_buffer(buf):
+    '''
+    Parses a buffer with complete lines.
+    @return: Tuple with the x and y values.
+    '''
+    rows = buf.count(';')
+    values = numpy.fromstring(buf.translate(EXCEL_TABLE), sep=' ')
+    if values.size != 2 * rows:
+        raise ValueError('Data could not be read, each line has to '
+                         'contain exactly two values separated '
+                         'by ";".')
+    x, y = values.reshape(rows, 2).T.copy()
+    return x, y
+
+def _read(fname):
+    if hasattr(fname, 'read'):
+        return fname.read()
+    with open(fname, 'rb') as fobj:
+        return fobj.read()
+
+def _source_key(fname):
+    stat = os.stat(fname)
+    return stat.st_size, stat.st_mtime
+
+def _load_cache(fname):
+    '''
+    Memory-maps the cached data of the CSV file.
+    @return: Tuple with the x and y values or None if the cache
+        does not exist or is outdated.
+    '''
+    try:
+        data = numpy.load(fname + CACHE_SUFFIX, mmap_mode='c')
+        if data.ndim != 2 or data.shape[0] != 2:
+            return None
+        if tuple(data[:, 0]) != _source_key(fname):
+            return None
+    except (IOError, OSError, ValueError):
+        return None
+    return numpy.asarray(data[0, 1:]), numpy.asarray(data[1, 1:])
+
+def _store_cache(fname, key, x, y):
+    '''
+    Writes the cache file for the CSV file. Errors are
+    ignored (e.g. if the folder is write-protected).
+    '''
+    data = numpy.empty((2, len(x) + 1))
+    data[:, 0] = key
+    data[0, 1:] = x
+    data[1, 1:] = y
+    folder = os.path.dirname(os.path.abspath(fname))
+    try:
+        fd, tmpname = tempfile.mkstemp(suffix=CACHE_SUFFIX, dir=folder)
+    except (IOError, OSError):
+        return
+    try:
+        with os.fdopen(fd, 'wb') as fobj:
+            numpy.save(fobj, data)
+        if os.path.exists(fname + CACHE_SUFFIX):
+            # os.rename cannot overwrite files on Windows
+            os.remove(fname + CACHE_SUFFIX)
+        os.rename(tmpname, fname + CACHE_SUFFIX)
+    except (IOError, OSError):
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+
+def load_csv(fname, cache=True):
+    '''
+    Loads the data of a CSV file. The decimal commas
+    are translated for the whole file at once and the values
+    are parsed in a single vectorized pass.
+    
+    If cache is True, the parsed data is stored next to the
+    CSV file (see L{CACHE_SUFFIX}). The cache is used as long as
+    size and modification time of the CSV file are unchanged.
+    Cached data is memory-mapped copy-on-write, so loading 
+    copies nothing and changes are not written back.
+    @param fname: File name or file object.
+    @param cache: Use the binary cache (only for file names).
+    @return: Tuple with the x and y values.
+    '''
+    if not cache or hasattr(fname, 'read'):
+        return _parse_buffer(_read(fname))
+    data = _load_cache(fname)
+    if data is None:
+        key = _source_key(fname)
+        data = _parse_buffer(_read(fname))
+        _store_cache(fname, key, *data)
+    return data
+
+def iter_csv(fname, chunk_size=CHUNK_SIZE):
+    '''
+    Generator which loads a CSV file chunkwise. Use this function
+    for files which are too large to fit in memory.
+    @param fname: File name or file object.
+    @param chunk_size: Number of bytes which are read at once.
+    @return: Yields a tuple with the x and y values of each chunk.
+    '''
+    if hasattr(fname, 'read'):
+        fobj = fname
+    else:
+        fobj = open(fname, 'rb')
+    try:
+        rest = ''
+        while True:
+            chunk = fobj.read(chunk_size)
+            if not chunk:
+                break
+            buf = rest + chunk
+            end = buf.rfind('\n') + 1
+            if not end:
+                rest = buf
+                continue
+            buf, rest = buf[:end], buf[end:]
+            yield _parse_buffer(buf)
+        if rest.strip():
+            yield _parse_buffer(rest)
+    finally:
+        if fobj is not fname:
+            fobj.close()
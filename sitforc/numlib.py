@@ -4,51 +4,398 @@
 Numeric calculations.
 '''
 
+from collections import Mapping
+import time
+
 import numpy
 from scipy import optimize
 from math import factorial as fac
 from numpy import exp, sin, cos
 
+from sitforc import smoothing
+
 def generate_func(funcstring):
     return eval('lambda x,p: {0}'.format(funcstring))
 
-def modelfit(function, paramdict, x, y):
+class FitTimeout(Exception):
+    '''
+    Raised if a fit exceeds its time budget (see L{modelfit}).
+    '''
+    pass
+
+class ParamView(Mapping):
+    '''
+    Read-only dictionary view on a parameter vector. It is
+    used to call functions which expect a parameter dictionary
+    with the current parameter vector of the fit.
+    '''
+    def __init__(self, names, theta=None):
+        self.names = names
+        self.index = dict((name, i) for i, name in enumerate(names))
+        self.theta = theta
+        
+    def __getitem__(self, key):
+        return self.theta[self.index[key]]
+    
+    def __iter__(self):
+        return iter(self.names)
+    
+    def __len__(self):
+        return len(self.names)
+
+def vectorize(function, names):
+    '''
+    Converts a function with the signature C{f(x, p)} (p is a 
+    parameter dictionary) to a function C{f(x, theta)} with a
+    parameter vector ordered like names.
+    '''
+    view = ParamView(names)
+    def vfunc(x, theta):
+        view.theta = theta
+        return function(x, view)
+    return vfunc
+
+def residual_funcs(function, names, x, y):
+    '''
+    Creates the functions for the least square fit.
+    @param function: Function with the attribute "vfunc" (see 
+        L{modelfit}) or a function with a parameter dictionary.
+    @param names: Order of the parameters in the parameter vector.
+    @return: Tuple with the error function and the function which
+        calculates the Jacobian of the error (None if the function
+        has no attribute "jacobian").
+    '''
+    vfunc = getattr(function, 'vfunc', None)
+    if vfunc is None:
+        vfunc = vectorize(function, names)
+    
+    def f_error(theta):
+        return y - vfunc(x, theta)
+    
+    jacobian = getattr(function, 'jacobian', None)
+    if jacobian is None:
+        return f_error, None
+    
+    jac = numpy.empty((len(names), len(x)))
+    def f_jac(theta):
+        # derivatives of the error, one row per parameter
+        for i, values in enumerate(jacobian.vfunc(x, theta)):
+            jac[i] = values
+        return numpy.negative(jac, jac)
+    return f_error, f_jac
+
+def _with_deadline(f_error, timeout):
+    deadline = time.time() + timeout
+    def f_error_deadline(theta):
+        if time.time() >= deadline:
+            raise FitTimeout('Fit exceeded {0} s'.format(timeout))
+        return f_error(theta)
+    return f_error_deadline
+
+def modelfit(function, paramdict, x, y, maxfev=0, timeout=None):
     '''
     Fits the parameters of the function to the given
     data using the least square.
+    
+    The order of the parameters is fixed once and the 
+    optimization works on a flat parameter vector. 
+    Compiled functions (with the attributes "vfunc" and
+    "param_names", e.g. L{core.Model}) are called directly
+    with the parameter vector, other functions get a
+    L{ParamView} on it. The parameter dictionary is updated
+    after the fit. If the function provides the attribute 
+    "jacobian" (the compiled partial derivatives), the Jacobian 
+    is calculated analytically instead of by finite differences.
+    @param maxfev: Maximum number of function evaluations
+        (0: leastsq default).
+    @param timeout: Time budget of the fit in seconds. L{FitTimeout}
+        is raised if it is exceeded, the parameters are unchanged then.
+    @return: True if the fit converged.
     '''
-    params = [paramdict[key] for key in sorted(paramdict.keys())]
-    
-    def fill_pdict(params):
-        for i, key in enumerate(sorted(paramdict.keys())):
-            paramdict[key] = params[i]
-            
-    def f_error(params):
-        fill_pdict(params)
-        return y - function(x, paramdict)
-    params, success = optimize.leastsq(f_error, params) 
-    fill_pdict(params)
+    if getattr(function, 'vfunc', None) is not None:
+        names = tuple(function.param_names)
+    else:
+        names = tuple(sorted(paramdict))
+    theta = numpy.array([paramdict[key] for key in names], dtype=float)
+    f_error, f_jac = residual_funcs(function, names, x, y)
+    if timeout is not None:
+        f_error = _with_deadline(f_error, timeout)
+    theta, success = optimize.leastsq(f_error, theta, Dfun=f_jac, 
+                                      col_deriv=1, maxfev=maxfev)
+    paramdict.update(zip(names, theta))
     return (success in range(1,5))
 
-def smooth(x, window_len=11):
-    """
-    Edited from
-    http://www.scipy.org/Cookbook/SignalSmooth
-    """
+BATCH_SIZE = 1 << 15
+'''
+Number of values (series times samples) which L{batch_modelfit}
+evaluates at once. Larger batches do not fit into the CPU cache
+and are slower.
+'''
+
+def batch_modelfit(function, theta, x, Y, maxiter=200, ftol=1.49012e-8,
+                   xtol=1.49012e-8):
+    '''
+    Fits the parameters of a compiled function (e.g. L{core.Model})
+    to many data sets with the same x-values. The fits run in 
+    lock-step as batched Levenberg-Marquardt: the function and its
+    Jacobian are evaluated for a batch of series at once, with a
+    parameter vector of shape (P, S, 1). Converged series are 
+    removed from the batch.
+    @param theta: Start parameters, shape (S, P) or (P,) for all 
+        series, ordered like the attribute "param_names".
+    @param Y: y-values, shape (S, N).
+    @param maxiter: Maximum number of iterations.
+    @param ftol: Relative reduction of the sum of squares below 
+        which a fit has converged.
+    @param xtol: Relative step size below which a fit has converged.
+    @return: Tuple with the fitted parameters (shape (S, P)) and 
+        the convergence flags (shape (S,)).
+    '''
+    x = numpy.asarray(x, dtype=float)
+    Y = numpy.atleast_2d(numpy.asarray(Y, dtype=float))
+    S, N = Y.shape
+    P = numpy.shape(theta)[-1]
+    theta = numpy.array(numpy.broadcast_to(theta, (S, P)), dtype=float)
+    converged = numpy.zeros(S, dtype=bool)
+    size = max(1, BATCH_SIZE // max(N, 1))
+    for start in range(0, S, size):
+        batch = slice(start, start + size)
+        converged[batch] = _batch_lm(function, theta[batch], x, Y[batch], 
+                                     maxiter, ftol, xtol)
+    return theta, converged
 
-    if x.ndim != 1:
-        raise ValueError, "smooth only accepts 1 dimension arrays."
+def _batch_lm(function, theta, x, Y, maxiter, ftol, xtol):
+    '''
+    Levenberg-Marquardt for a batch of series, theta is 
+    updated in place.
+    @return: Convergence flags.
+    '''
+    vfunc = function.vfunc
+    jacobian = getattr(function, 'jacobian', None)
+    S, N = Y.shape
+    P = theta.shape[1]
+    
+    def evaluate(theta):
+        values = numpy.empty((len(theta), N))
+        values[...] = vfunc(x, theta.T[:, :, numpy.newaxis])
+        return values
+    
+    def jac(theta, values):
+        # derivatives of the function, shape (P, S, N)
+        J = numpy.empty((P, len(theta), N))
+        if jacobian is not None:
+            theta = theta.T[:, :, numpy.newaxis]
+            for i, d in enumerate(jacobian.vfunc(x, theta)):
+                J[i] = d
+            return J
+        for i in range(P):
+            h = 1.49012e-8 * numpy.maximum(numpy.abs(theta[:, i]), 1.0)
+            shifted = theta.copy()
+            shifted[:, i] += h
+            J[i] = (evaluate(shifted) - values) / h[:, numpy.newaxis]
+        return J
+    
+    with numpy.errstate(all='ignore'):
+        values = evaluate(theta)
+        residual = Y - values
+        cost = numpy.sum(residual**2, axis=1)
+    # normal equations, only updated after an accepted step
+    A = numpy.empty((S, P, P))
+    g = numpy.empty((S, P))
+    stale = numpy.ones(S, dtype=bool)
+    lam = numpy.full(S, 1e-3)
+    converged = numpy.zeros(S, dtype=bool)
+    active = numpy.isfinite(cost)
+    diag_index = numpy.arange(P)
+    
+    for iteration in range(maxiter):
+        idx = numpy.flatnonzero(active)
+        if not len(idx):
+            break
+        th = theta[idx]
+        with numpy.errstate(all='ignore'):
+            update = idx[stale[idx]]
+            if len(update):
+                J = jac(theta[update], values[update])
+                A[update] = numpy.einsum('isn,jsn->sij', J, J)
+                g[update] = numpy.einsum('isn,sn->si', J, residual[update])
+                stale[update] = False
+            damped = A[idx]
+            diag = damped[:, diag_index, diag_index]
+            floor = 1e-12 * diag.max(axis=1)[:, numpy.newaxis] + 1e-300
+            damped[:, diag_index, diag_index] += (lam[idx, numpy.newaxis] * 
+                                                  numpy.maximum(diag, floor))
+            valid = numpy.all(numpy.isfinite(damped), axis=(1, 2))
+            delta = numpy.zeros_like(th)
+            try:
+                delta[valid] = numpy.linalg.solve(
+                    damped[valid], g[idx[valid], :, numpy.newaxis])[..., 0]
+            except numpy.linalg.LinAlgError:
+                for i in numpy.flatnonzero(valid):
+                    delta[i] = numpy.linalg.lstsq(damped[i], g[idx[i]], 
+                                                  rcond=None)[0]
+            th_new = th + delta
+            values_new = evaluate(th_new)
+            residual_new = Y[idx] - values_new
+            cost_new = numpy.sum(residual_new**2, axis=1)
+        
+        better = cost_new < cost[idx]
+        accepted = idx[better]
+        reduction = cost[accepted] - cost_new[better]
+        theta[accepted] = th_new[better]
+        values[accepted] = values_new[better]
+        residual[accepted] = residual_new[better]
+        stale[accepted] = True
+        small_f = numpy.zeros(len(idx), dtype=bool)
+        small_f[better] = reduction <= ftol * cost[accepted]
+        cost[accepted] = cost_new[better]
+        lam[accepted] /= 10
+        lam[idx[~better]] *= 10
+        
+        small_x = numpy.all(numpy.abs(delta) <= 
+                            xtol * (numpy.abs(th) + xtol), axis=1)
+        done = (small_f | small_x | (cost[idx] == 0)) & valid
+        converged[idx[done]] = True
+        active[idx[done | ~valid | (lam[idx] > 1e16)]] = False
+    
+    return converged & numpy.isfinite(cost)
 
-    if x.size < window_len:
-        raise ValueError, "Input vector needs to be bigger than window size."
+def _check_size(size, minimum):
+    if size < minimum:
+        raise ValueError('The decimated data needs a size of at least '
+                         '{0}, not {1}.'.format(minimum, size))
 
+def decimate_minmax(x, y, size):
+    '''
+    Reduces the data for plotting. The samples are split into
+    size bins of consecutive samples (e.g. one for each pixel 
+    column), of each bin the minimum and the maximum are kept in 
+    their original order. So the plotted envelope of the data
+    does not change.
+    @param size: Number of bins (at least 1).
+    @return: Tuple with at most about 2*size x and y values. The
+        data itself if it is not larger.
+    '''
+    _check_size(size, 1)
+    n = len(y)
+    if n <= 2 * size:
+        return x, y
+    k = -(-n // size)
+    m = n // k
+    blocks = numpy.asarray(y)[:m*k].reshape(m, k)
+    offsets = numpy.arange(0, m*k, k)
+    index = [blocks.argmin(axis=1) + offsets, 
+             blocks.argmax(axis=1) + offsets, [0, n - 1]]
+    if m*k < n:
+        tail = numpy.asarray(y)[m*k:]
+        index.append([tail.argmin() + m*k, tail.argmax() + m*k])
+    index = numpy.unique(numpy.concatenate(index))
+    return x[index], y[index]
 
-    if window_len < 3:
-        return x
+DECIMATION_METHODS = ('uniform', 'bin', 'lttb', 'minmax')
+'''
+Methods of L{decimate}.
+'''
 
-    s=numpy.r_[2*x[0]-x[window_len:1:-1], x, 2*x[-1]-x[-1:-window_len:-1]]
-    #print(len(s))
-    w=numpy.ones(window_len,'d')
+def decimate_uniform(x, y, size):
+    '''
+    Keeps size equidistant samples, including the first and
+    the last one.
+    @param size: Number of samples (at least 2).
+    @return: Tuple with the x and y values. The data itself if
+        it is not larger.
+    '''
+    _check_size(size, 2)
+    n = len(y)
+    if n <= size:
+        return x, y
+    index = numpy.linspace(0, n - 1, size).round().astype(int)
+    return x[index], y[index]
+
+def decimate_bin(x, y, size):
+    '''
+    Splits the samples into size bins of consecutive samples and
+    replaces each bin by the mean of its x and y values. The
+    averaging also reduces the noise.
+    @param size: Number of bins (at least 1).
+    @return: Tuple with the x and y values. The data itself if
+        it is not larger.
+    '''
+    _check_size(size, 1)
+    n = len(y)
+    if n <= size:
+        return x, y
+    starts = numpy.arange(size) * n // size
+    counts = numpy.diff(numpy.append(starts, n))
+    return (numpy.add.reduceat(x, starts) / counts, 
+            numpy.add.reduceat(y, starts) / counts)
+
+def decimate_lttb(x, y, size):
+    '''
+    Shape preserving reduction similar to "Largest Triangle Three
+    Buckets": the first and the last sample are kept, the others
+    are split into size-2 buckets. Of each bucket the sample is
+    kept which forms the largest triangle with the means of the
+    neighbouring buckets. Using the mean instead of the selected
+    sample of the previous bucket makes all buckets independent,
+    so they are calculated at once.
+    @param size: Number of samples (at least 2).
+    @return: Tuple with the x and y values. The data itself if
+        it is not larger.
+    '''
+    _check_size(size, 2)
+    n = len(y)
+    if n <= size:
+        return x, y
+    if size == 2:
+        return x[[0, -1]], y[[0, -1]]
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    buckets = size - 2
+    starts = 1 + numpy.arange(buckets) * (n - 2) // buckets
+    counts = numpy.diff(numpy.append(starts, n - 1))
+    mean_x = numpy.add.reduceat(x[1:-1], starts - 1) / counts
+    mean_y = numpy.add.reduceat(y[1:-1], starts - 1) / counts
+    # neighbours of each bucket, the end samples at the borders
+    prev_x = numpy.concatenate(([x[0]], mean_x[:-1]))
+    prev_y = numpy.concatenate(([y[0]], mean_y[:-1]))
+    next_x = numpy.concatenate((mean_x[1:], [x[-1]]))
+    next_y = numpy.concatenate((mean_y[1:], [y[-1]]))
+    bucket = numpy.repeat(numpy.arange(buckets), counts)
+    ax, ay = prev_x[bucket], prev_y[bucket]
+    area = numpy.abs((x[1:-1] - ax) * (next_y[bucket] - ay) - 
+                     (next_x[bucket] - ax) * (y[1:-1] - ay))
+    largest = numpy.maximum.reduceat(area, starts - 1)
+    candidates = numpy.flatnonzero(area == largest[bucket])
+    first = numpy.unique(bucket[candidates], return_index=True)[1]
+    index = numpy.concatenate(([0], candidates[first] + 1, [n - 1]))
+    return x[index], y[index]
 
-    y=numpy.convolve(w/w.sum(), s, mode='same')
-    return y[window_len-1:-window_len+1]
+def decimate(x, y, size, method='bin'):
+    '''
+    Reduces the data to about size samples, e.g. before a fit
+    of a long recording.
+    @param method: "uniform" (L{decimate_uniform}), "bin" 
+        (L{decimate_bin}), "lttb" (L{decimate_lttb}) or "minmax"
+        (L{decimate_minmax}).
+    @param size: Number of samples (at least 2).
+    @return: Tuple with the x and y values. The data itself if
+        it is not larger.
+    '''
+    _check_size(size, 2)
+    if method == 'minmax':
+        return decimate_minmax(x, y, size // 2)
+    functions = dict(uniform=decimate_uniform, bin=decimate_bin, 
+                     lttb=decimate_lttb)
+    try:
+        function = functions[method]
+    except KeyError:
+        raise ValueError('Unknown decimation method "{0}"'.format(method))
+    return function(x, y, size)
+
+def smooth(x, window_len=11):
+    """
+    Moving average of x with point reflection at the borders
+    (see L{smoothing.moving_average}).
+    """
+    return smoothing.moving_average(x, window_len)
@@ -0,0 +1,182 @@
+# coding: utf-8
+
+'''
+Preprocessing of measured data before the identification.
+
+A L{Preprocessor} runs the stages shift, offset, smoothing and
+resampling in this order. Each stage caches its output, keyed by
+its parameter and by the version of the output of the stage
+before it. So changing one parameter only recomputes the stages
+after it, and calling the pipeline again with unchanged parameters
+and the same data returns the cached result.
+
+Usage::
+
+    data = load_csv('data.csv')
+    pre = Preprocessor(shift=1.8, smooth=11)
+    x, y = pre(*data)
+    pre.set(offset=0.2)   # the shift is not repeated
+    x, y = pre(*data)
+
+The data is recognized by identity, so pass the same arrays
+to reuse the cache.
+'''
+
+from abc import ABCMeta, abstractmethod
+
+import numpy
+
+from sitforc.core import shift_data
+from sitforc.numlib import smooth
+
+class Stage(object):
+    '''
+    Abstract base class for a stage of L{Preprocessor}.
+    A stage has one parameter (L{value}), a neutral value
+    passes the data unchanged.
+    '''
+    __metaclass__ = ABCMeta
+    name = None
+
+    def __init__(self, value):
+        self.value = value
+        self.version = 0
+        '''
+        Incremented each time the output is recomputed.
+        '''
+        self._key = None
+        self._output = None
+
+    def run(self, x, y, upstream):
+        '''
+        @param upstream: Version of the input data.
+        @return: Tuple with the x and y values, cached as long as
+            value and upstream do not change.
+        '''
+        key = (upstream, self.value)
+        if key != self._key:
+            self._output = self.apply(x, y)
+            self._key = key
+            self.version += 1
+        return self._output
+
+    def reset(self):
+        self._key = None
+        self._output = None
+
+    @abstractmethod
+    def apply(self, x, y):
+        '''
+        Processes the data with the current value.
+        @return: Tuple with the x and y values.
+        '''
+        pass
+
+class Shift(Stage):
+    '''
+    Shifts the data by value and cuts all values with x < 0
+    (see L{core.shift_data}).
+    '''
+    name = 'shift'
+
+    def apply(self, x, y):
+        if not self.value:
+            return x, y
+        return shift_data(x, y, self.value)
+
+class Offset(Stage):
+    '''
+    Subtracts value from the y values.
+    '''
+    name = 'offset'
+
+    def apply(self, x, y):
+        if not self.value:
+            return x, y
+        return x, y - self.value
+
+class Smooth(Stage):
+    '''
+    Smoothes the y values with a moving average, value is
+    the window length (see L{numlib.smooth}).
+    '''
+    name = 'smooth'
+
+    def apply(self, x, y):
+        if not self.value or self.value < 3:
+            return x, y
+        return x, smooth(y, self.value)
+
+class Resample(Stage):
+    '''
+    Interpolates the data linearly on value equidistant
+    x values.
+    '''
+    name = 'resample'
+
+    def apply(self, x, y):
+        if not self.value or len(x) < 2:
+            return x, y
+        x_new = numpy.linspace(x[0], x[-1], self.value)
+        return x_new, numpy.interp(x_new, x, y)
+
+STAGES = (Shift, Offset, Smooth, Resample)
+
+class Preprocessor(object):
+    '''
+    Pipeline of the preprocessing stages (see L{STAGES}).
+    The parameters are named like the stages. The returned
+    arrays are shared with the cache and must not be changed
+    in place.
+    '''
+    def __init__(self, shift=0.0, offset=0.0, smooth=0, resample=None):
+        self.stages = [stage(value) for stage, value
+                       in zip(STAGES, (shift, offset, smooth, resample))]
+        self._data = None
+        self._data_version = 0
+
+    def __getitem__(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def set(self, **params):
+        '''
+        Sets the parameters of the stages, e.g.
+        C{pre.set(shift=1.8, smooth=11)}.
+        '''
+        for name, value in params.items():
+            self[name].value = value
+
+    @property
+    def params(self):
+        '''
+        Property.
+        Dictionary with the parameters of the stages.
+        '''
+        return dict((stage.name, stage.value) for stage in self.stages)
+
+    def reset(self):
+        '''
+        Clears the caches of all stages.
+        '''
+        self._data = None
+        for stage in self.stages:
+            stage.reset()
+
+    def __call__(self, x, y):
+        '''
+        Processes the data. Only the stages whose parameter or
+        input changed since the last call are computed.
+        @return: Tuple with the x and y values.
+        '''
+        if self._data is None or not (self._data[0] is x and
+                                      self._data[1] is y):
+            self._data = x, y
+            self._data_version += 1
+        version = self._data_version
+        for stage in self.stages:
+            x, y = stage.run(x, y, version)
+            version = stage.version
+        return x, y
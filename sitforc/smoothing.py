@@ -0,0 +1,161 @@
+# coding: utf-8
+
+'''
+Smoothing of measured data.
+
+The signal is extended at both ends by point reflection
+(C{2*y[0] - y[k]}), so the smoothed signal has the same length
+and no offset at the borders. The flat window (moving average)
+is calculated with a cumulative sum in O(n) independent of the
+window length, other windows are convolved directly or, for
+long windows (see L{FFT_THRESHOLD}), with the FFT.
+All functions accept an output array (C{out}) for the result.
+Only the moving average is calculated in it, the other
+functions copy their result into it, so it only keeps the
+buffer of the caller (e.g. to smooth an array in place).
+'''
+
+import numpy
+
+WINDOWS = ('flat', 'hanning', 'hamming', 'bartlett', 'blackman',
+           'gaussian', 'savgol')
+
+FFT_THRESHOLD = 256
+'''
+Minimum window length for which the convolution is calculated
+with the FFT (method "auto").
+'''
+
+def _check(y, window_len):
+    if y.ndim != 1:
+        raise ValueError('smooth only accepts 1 dimension arrays.')
+    # the reflection at the borders needs window_len + 1 values
+    if y.size <= window_len:
+        raise ValueError('Input vector needs to be bigger than '
+                         'window size.')
+
+def _unchanged(y, out):
+    if out is None:
+        return y
+    out[...] = y
+    return out
+
+def _pad(y, window_len, lead=0):
+    '''
+    Extends the signal by window_len-1 reflected values at
+    both ends.
+    @param lead: Number of zeros before the extended signal.
+    '''
+    n = len(y)
+    k = window_len - 1
+    s = numpy.empty(lead + n + 2*k)
+    s[:lead] = 0
+    s[lead:lead + k] = y[window_len:1:-1]
+    s[lead + k:lead + k + n] = y
+    s[lead + k + n:] = y[-1:-window_len:-1]
+    # point reflection at the first and the last value
+    s[lead:lead + k] *= -1
+    s[lead:lead + k] += 2 * y[0]
+    s[lead + k + n:] *= -1
+    s[lead + k + n:] += 2 * y[-1]
+    return s
+
+def window_weights(name, window_len, std=None):
+    '''
+    @param name: Name of the window (see L{WINDOWS}, except
+        "savgol").
+    @param std: Standard deviation of the "gaussian" window in
+        samples (default: window_len/6).
+    @return: Normalized weights of the window.
+    '''
+    if name == 'flat':
+        weights = numpy.ones(window_len)
+    elif name == 'gaussian':
+        from scipy.signal.windows import gaussian
+        weights = gaussian(window_len, std or window_len / 6.0)
+    elif name in ('hanning', 'hamming', 'bartlett', 'blackman'):
+        weights = getattr(numpy, name)(window_len)
+    else:
+        raise ValueError('Unknown window "{0}"'.format(name))
+    return weights / weights.sum()
+
+def moving_average(y, window_len, out=None):
+    '''
+    Moving average with a flat window, calculated in O(n)
+    with a cumulative sum.
+    '''
+    y = numpy.asarray(y, dtype=float)
+    _check(y, window_len)
+    if window_len < 3:
+        return _unchanged(y, out)
+    n = len(y)
+    # the cumulative sum of the centered signal keeps the
+    # rounding errors small
+    mean = y.mean()
+    c = _pad(y - mean, window_len, lead=1)
+    numpy.cumsum(c, out=c)
+    start = (window_len - 1) // 2
+    if out is None:
+        out = numpy.empty(n)
+    numpy.subtract(c[start + window_len:start + window_len + n],
+                   c[start:start + n], out=out)
+    out /= window_len
+    out += mean
+    return out
+
+def convolve(y, weights, method='auto', out=None):
+    '''
+    Smoothes the signal with a window.
+    @param weights: Normalized weights of the window 
+        (see L{window_weights}).
+    @param method: "direct", "fft" or "auto" (FFT for windows
+        which are longer than L{FFT_THRESHOLD}).
+    @param out: Array into which the result is copied.
+    '''
+    y = numpy.asarray(y, dtype=float)
+    window_len = len(weights)
+    _check(y, window_len)
+    if window_len < 3:
+        return _unchanged(y, out)
+    if method == 'auto':
+        method = 'fft' if window_len >= FFT_THRESHOLD else 'direct'
+    s = _pad(y, window_len)
+    if method == 'fft':
+        from scipy.signal import fftconvolve
+        valid = fftconvolve(s, weights, mode='valid')
+    elif method == 'direct':
+        valid = numpy.convolve(s, weights, mode='valid')
+    else:
+        raise ValueError('Unknown method "{0}"'.format(method))
+    start = (window_len - 1) // 2
+    return _unchanged(valid[start:start + len(y)], out)
+
+def savgol(y, window_len, polyorder=3, out=None):
+    '''
+    Savitzky-Golay filter: fits a polynomial of polyorder to
+    each window. Keeps peaks and slopes better than the
+    moving average. Even window lengths are increased by one.
+    @param out: Array into which the result is copied.
+    '''
+    y = numpy.asarray(y, dtype=float)
+    _check(y, window_len)
+    window_len += 1 - window_len % 2
+    if window_len <= polyorder or window_len > len(y):
+        return _unchanged(y, out)
+    from scipy.signal import savgol_filter
+    return _unchanged(savgol_filter(y, window_len, polyorder), out)
+
+def smooth(y, window_len=11, window='flat', method='auto', out=None):
+    '''
+    Smoothes the signal.
+    @param window: Name of the window (see L{WINDOWS}).
+    @param method: Calculation of the convolution (see L{convolve}),
+        the flat window uses the cumulative sum with "auto".
+    @param out: Array for the result, can be y itself.
+    @return: Smoothed signal of the same length as y.
+    '''
+    if window == 'savgol':
+        return savgol(y, window_len, out=out)
+    if window == 'flat' and method == 'auto':
+        return moving_average(y, window_len, out)
+    return convolve(y, window_weights(window, window_len), method, out)
@@ -0,0 +1,419 @@
+# coding: utf-8
+
+'''
+Identification of step responses while the samples arrive.
+
+A L{StreamingIdentifier} accepts the samples in chunks. The
+samples are kept in a preallocated buffer, so the memory and the
+cost of each update are bounded by its capacity. The
+L{DecimatingBuffer} keeps the whole response with a decreasing
+resolution, the L{RingBuffer} a sliding window of the latest
+samples (e.g. for a monitoring loop):
+
+ - The parameters of the regression model are refined with a
+   few warm started iterations on the buffered samples for each
+   chunk (see L{numlib.modelfit}).
+ - The polynomial of the inflectional tangent method is fitted
+   by recursive least squares (see L{RecursivePolyFit}), whose
+   cost per chunk only depends on the chunk size and the degree.
+   In a full sliding window the polynomial is fitted again on 
+   the window for each chunk, so it only describes the latest
+   samples.
+
+Usage::
+
+    stream = StreamingIdentifier(modellib.pt2, span=(0, 60))
+    for x, y in iter_csv('data.csv', 4096):
+        stream.update(x, y)
+        print stream.params
+    itmi = stream.itm_identifier()
+'''
+
+import warnings
+
+import numpy
+from numpy.polynomial import Chebyshev
+from numpy.polynomial.chebyshev import chebvander
+
+from sitforc import numlib
+from sitforc.core import ITMIdentifier
+from sitforc.fitting import ModelFitter, PolyFitter
+from sitforc.guess import initial_params
+
+class RingBuffer(object):
+    '''
+    Preallocated buffer of the latest x and y values.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._x = numpy.empty(capacity)
+        self._y = numpy.empty(capacity)
+        self._start = 0
+        self._size = 0
+        self.stride = 1
+        '''
+        Step between the stored values, always 1 (see 
+        L{DecimatingBuffer.stride}).
+        '''
+        self.count = 0
+        '''
+        Number of all values which were appended.
+        '''
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, x, y):
+        '''
+        Appends the values, the oldest values are overwritten
+        if the buffer is full.
+        '''
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+        n = len(x)
+        self.count += n
+        if n >= self.capacity:
+            self._x[:] = x[-self.capacity:]
+            self._y[:] = y[-self.capacity:]
+            self._start, self._size = 0, self.capacity
+            return
+        end = (self._start + self._size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._x[end:end + first] = x[:first]
+        self._y[end:end + first] = y[:first]
+        self._x[:n - first] = x[first:]
+        self._y[:n - first] = y[first:]
+        overflow = max(0, self._size + n - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size += n - overflow
+
+    def data(self):
+        '''
+        @return: Tuple with copies of the x and y values,
+            oldest first.
+        '''
+        index = numpy.arange(self._start, self._start + self._size)
+        index %= self.capacity
+        return self._x[index], self._y[index]
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+class DecimatingBuffer(object):
+    '''
+    Preallocated buffer of all x and y values with a decreasing
+    resolution. If the buffer is full, every second value is
+    dropped and the following values are taken with the doubled
+    step (L{stride}). So the beginning of a step response,
+    which determines the time constants, is never dropped.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._x = numpy.empty(capacity)
+        self._y = numpy.empty(capacity)
+        self._size = 0
+        self.stride = 1
+        '''
+        Step between the stored values (in appended values).
+        '''
+        self.count = 0
+        '''
+        Number of all values which were appended.
+        '''
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, x, y):
+        '''
+        Appends every L{stride}-th value.
+        '''
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+        # the stored values have the indices 0, stride, 2*stride, ...
+        first = -self.count % self.stride
+        index = self.count + first
+        self.count += len(x)
+        x, y = x[first::self.stride], y[first::self.stride]
+        while self._size + len(x) > self.capacity:
+            size = (self._size + 1) // 2
+            self._x[:size] = self._x[:self._size:2]
+            self._y[:size] = self._y[:self._size:2]
+            self._size = size
+            offset = (-index % (2 * self.stride)) // self.stride
+            x, y = x[offset::2], y[offset::2]
+            index += offset * self.stride
+            self.stride *= 2
+        self._x[self._size:self._size + len(x)] = x
+        self._y[self._size:self._size + len(y)] = y
+        self._size += len(x)
+
+    def data(self):
+        '''
+        @return: Tuple with copies of the x and y values.
+        '''
+        return self._x[:self._size].copy(), self._y[:self._size].copy()
+
+    def clear(self):
+        self._size = 0
+        self.stride = 1
+        self.count = 0
+
+class RecursivePolyFit(object):
+    '''
+    Least squares fit of a polynomial in the Chebyshev basis,
+    which is updated chunk by chunk. The normal equations of all
+    samples are accumulated (recursive least squares in the
+    information form), so an update costs O(chunk size * degree**2)
+    and the coefficients are solved only when they are read.
+    Older samples can be discounted by a forgetting factor.
+    '''
+    def __init__(self, degree, domain, forgetting=1.0,
+                 regularization=1e-10):
+        '''
+        @param domain: x-range which is scaled to [-1, 1].
+        @param forgetting: Weight of a sample relative to the
+            next one (1: all samples have the same weight).
+        @param regularization: Relative ridge term, which keeps
+            the solution defined before enough samples arrived.
+        '''
+        self.degree = degree
+        self.domain = tuple(float(value) for value in domain)
+        self.forgetting = forgetting
+        self.regularization = regularization
+        self.count = 0
+        self._A = numpy.zeros((degree + 1, degree + 1))
+        self._b = numpy.zeros(degree + 1)
+        self._poly = None
+
+    def _scale(self, x):
+        start, end = self.domain
+        return (2 * numpy.asarray(x, dtype=float) - (start + end)) / (
+            end - start)
+
+    def update(self, x, y, weight=1):
+        '''
+        Adds the samples to the normal equations.
+        @param weight: Number of equidistant samples which each
+            sample stands for (e.g. the L{DecimatingBuffer.stride}).
+        '''
+        V = chebvander(self._scale(x), self.degree)
+        y = numpy.asarray(y, dtype=float)
+        n = len(y)
+        if self.forgetting != 1.0:
+            ages = weight * numpy.arange(n - 1, -1, -1.0)
+            weights = weight * self.forgetting ** ages
+            self._A *= self.forgetting ** (weight * n)
+            self._b *= self.forgetting ** (weight * n)
+            self._A += numpy.dot(V.T * weights, V)
+            self._b += numpy.dot(V.T, weights * y)
+        else:
+            self._A += weight * numpy.dot(V.T, V)
+            self._b += weight * numpy.dot(V.T, y)
+        self.count += n
+        self._poly = None
+
+    @property
+    def coef(self):
+        '''
+        Property.
+        Chebyshev coefficients of the current estimate.
+        '''
+        return self.poly.coef
+
+    @property
+    def poly(self):
+        '''
+        Property.
+        C{Chebyshev} instance of the current estimate.
+        '''
+        if self._poly is None:
+            A = self._A.copy()
+            diag = numpy.arange(self.degree + 1)
+            A[diag, diag] += self.regularization * (A.trace() + 1.0)
+            try:
+                coef = numpy.linalg.solve(A, self._b)
+            except numpy.linalg.LinAlgError:
+                coef = numpy.linalg.lstsq(A, self._b, rcond=None)[0]
+            self._poly = Chebyshev(coef, self.domain)
+        return self._poly
+
+    def reset(self, domain=None):
+        '''
+        Removes all samples.
+        @param domain: New x-range.
+        '''
+        if domain is not None:
+            self.domain = tuple(float(value) for value in domain)
+        self.count = 0
+        self._A[...] = 0
+        self._b[...] = 0
+        self._poly = None
+
+class StreamingIdentifier(object):
+    '''
+    Identifies a step response whose samples arrive in chunks
+    (see the module documentation). The estimates can be read
+    at any time with L{params}, L{model_fitter}, L{poly_fitter}
+    and L{itm_identifier}.
+    '''
+    def __init__(self, model=None, capacity=4096, sliding=False, 
+                 degree=11, span=None, forgetting=1.0, maxfev=50, 
+                 guess=True):
+        '''
+        @param model: Regression model, None only fits the
+            polynomial.
+        @param capacity: Capacity of the buffer.
+        @param sliding: Keep the latest samples (L{RingBuffer})
+            instead of the whole response (L{DecimatingBuffer}).
+        @param degree: Degree of the polynomial, 0 disables it.
+        @param span: Expected x-range of the response. If it is
+            unknown (None) or exceeded, the range is doubled and
+            the polynomial is fitted again on the buffered samples.
+            A full sliding window uses its own x-range.
+        @param forgetting: Forgetting factor of the polynomial
+            (see L{RecursivePolyFit}).
+        @param maxfev: Maximum number of function evaluations of
+            the model for each chunk.
+        @param guess: Estimate the start parameters of the model
+            from the first samples (see L{guess.initial_params}).
+        '''
+        self.model = model
+        self.sliding = sliding
+        if sliding:
+            self.buffer = RingBuffer(capacity)
+        else:
+            self.buffer = DecimatingBuffer(capacity)
+        self.degree = degree
+        self.span = span
+        self.forgetting = forgetting
+        self.maxfev = maxfev
+        self.guess = guess
+        self.params = None
+        '''
+        Current parameters of the model (None before the first
+        fit).
+        '''
+        self.success = False
+        self.rls = None
+        '''
+        L{RecursivePolyFit} of the polynomial.
+        '''
+        self._cache = dict()
+
+    def update(self, x, y):
+        '''
+        Adds a chunk of samples and updates the estimates.
+        '''
+        x = numpy.asarray(x, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+        if not len(x):
+            return
+        self.buffer.extend(x, y)
+        self._cache.clear()
+        if self.degree:
+            self._update_poly(x, y)
+        if self.model is not None and len(self.buffer) > 2 * len(
+            self.model.param_names):
+            self._update_model()
+
+    def _update_poly(self, x, y):
+        if self.rls is None:
+            start, end = self.span or (x[0], x[-1] + (x[-1] - x[0]))
+            if end <= start:
+                end = start + 1.0
+            self.rls = RecursivePolyFit(self.degree, (start, end),
+                                        self.forgetting)
+        if self.sliding and self.buffer.count > len(self.buffer):
+            # samples left the window, fit the window again
+            x, y = self.data
+            start, end = x.min(), x.max()
+            self.rls.reset((start, end if end > start else start + 1.0))
+            self.rls.update(x, y)
+            return
+        start, end = self.rls.domain
+        if x.min() < start or x.max() > end:
+            start = min(start, x.min())
+            while x.max() > end:
+                end = start + 2 * (end - start)
+            self.rls.reset((start, end))
+            # the buffered samples stand for the dropped ones, so
+            # they are weighted like the following full chunks
+            x, y = self.data
+            self.rls.update(x, y, self.buffer.stride)
+        else:
+            self.rls.update(x, y)
+
+    def _update_model(self):
+        x, y = self.buffer.data()
+        if self.params is None:
+            if self.guess:
+                self.params = initial_params(self.model, x, y)
+            else:
+                self.params = dict(self.model.default_params)
+        params = dict(self.params)
+        # reaching maxfev is expected, the next chunk continues
+        with numpy.errstate(all='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            success = numlib.modelfit(self.model, params, x, y,
+                                      self.maxfev)
+        if all(numpy.isfinite(value) for value in params.values()):
+            self.params = params
+            self.success = success
+
+    @property
+    def data(self):
+        '''
+        Property.
+        Tuple with the buffered x and y values.
+        '''
+        if 'data' not in self._cache:
+            self._cache['data'] = self.buffer.data()
+        return self._cache['data']
+
+    @property
+    def model_fitter(self):
+        '''
+        Property.
+        L{ModelFitter} of the buffered samples, warm started
+        from the current parameters. Like an update, the fit
+        stops after L{maxfev} function evaluations.
+        '''
+        if 'model' not in self._cache:
+            if self.params is None:
+                return None
+            x, y = self.data
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self._cache['model'] = ModelFitter(x, y, self.model,
+                                                   self.maxfev, 
+                                                   **self.params)
+        return self._cache['model']
+
+    @property
+    def poly_fitter(self):
+        '''
+        Property.
+        L{PolyFitter} with the current polynomial, its x-values
+        are the buffered samples.
+        '''
+        if 'poly' not in self._cache:
+            if self.rls is None:
+                return None
+            x, y = self.data
+            self._cache['poly'] = PolyFitter(x, y, self.degree,
+                                               'chebyshev', self.rls.poly)
+        return self._cache['poly']
+
+    def itm_identifier(self):
+        '''
+        @return: L{ITMIdentifier} with the current polynomial.
+        @raise ValueError: If there is no polynomial (degree 0
+            or no samples).
+        '''
+        if self.poly_fitter is None:
+            raise ValueError('No polynomial, its degree is 0 or no '
+                             'samples were added.')
+        x, y = self.data
+        return ITMIdentifier(x, y, fitter=self.poly_fitter)
@@ -7,7 +7,8 @@ Library for symbolic calculations.
 from sympy import factorial as fac
 from sympy import exp, sin, cos
 
-from sympy import Symbol, diff
+from sympy import Symbol, diff, cse, numbered_symbols, pretty
+from sympy.printing.pycode import NumPyPrinter
 
 def generate_sym_func(funcstring, p):
     '''
@@ -19,4 +20,66 @@ def generate_sym_func(funcstring, p):
 
 def diff_func(sym_func, n):
     x = Symbol('x')
-    return diff(sym_func, x, n)
\ No newline at end of file
+    return diff(sym_func, x, n)
+
+def _param_symbols(param_names):
+    '''
+    @return: Tuple with the symbols for the slots of the parameter 
+        vector and a dictionary which maps the parameter names 
+        to them (used as "p" in the function string).
+    '''
+    slots = [Symbol('_p{0}'.format(i)) for i in range(len(param_names))]
+    return slots, dict(zip(param_names, slots))
+
+def _generate_source(name, exprs, slots):
+    '''
+    Generates the source code of a vectorized function
+    C{name(x, theta)}, which returns the list of the given 
+    expressions (or the value of a single expression). Common 
+    subexpressions are calculated only once.
+    '''
+    single = not isinstance(exprs, list)
+    temps, exprs = cse(exprs, symbols=numbered_symbols('_t'))
+    printer = NumPyPrinter()
+    lines = ['def {0}(x, theta):'.format(name)]
+    if slots:
+        lines.append('    {0}, = theta'.format(', '.join(map(str, slots))))
+    for temp, value in temps:
+        lines.append('    {0} = {1}'.format(temp, printer.doprint(value)))
+    if single:
+        lines.append('    return {0}'.format(printer.doprint(exprs[0])))
+    else:
+        lines.append('    return [{0}]'.format(', '.join(printer.doprint(e) 
+                                                      for e in exprs)))
+    return '\n'.join(lines) + '\n'
+
+def generate_jacobian(funcstring, param_names):
+    '''
+    Differentiates the function with respect to each
+    parameter and generates the source code of a vectorized
+    function C{jacobian(x, theta)}, which returns the list of the
+    partial derivatives.
+    @param param_names: Names of the parameters in the order
+        of the parameter vector theta.
+    @return: Source code (see L{compiler.compile_source}).
+    '''
+    slots, p = _param_symbols(param_names)
+    x = Symbol('x')
+    sym_func = eval(funcstring)
+    derivates = [diff(sym_func, slot) for slot in slots]
+    return _generate_source('jacobian', derivates, slots)
+
+def generate_derivative(funcstring, param_names, n):
+    '''
+    Differentiates the function n times with respect to x
+    and generates the source code of a vectorized function 
+    C{derivative(x, theta)}. The parameters stay symbolic, so
+    the function is valid for all parameter values.
+    @param param_names: Names of the parameters in the order
+        of the parameter vector theta.
+    @return: Source code (see L{compiler.compile_source}).
+    '''
+    slots, p = _param_symbols(param_names)
+    x = Symbol('x')
+    derivate = diff(eval(funcstring), x, n)
+    return _generate_source('derivative', derivate, slots)
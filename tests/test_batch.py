@@ -0,0 +1,128 @@
+# coding: utf-8
+
+from StringIO import StringIO
+from warnings import catch_warnings
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from sitforc.batch import find_files, identify_file, run
+from sitforc.batch import write_csv, write_json, main
+
+def write_data(fname, x, y):
+    with open(fname, 'wb') as fobj:
+        for xi, yi in zip(x, y):
+            fobj.write('{0!r};{1!r}\r\n'.format(xi, yi).replace('.', ','))
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        x = numpy.linspace(0, 30, 300)
+        y = 2 * (1 - 1.25 * numpy.exp(-x / 5) + 0.25 * numpy.exp(-x))
+        self.files = []
+        for name in ('a.csv', 'b.csv'):
+            fname = os.path.join(self.folder, name)
+            write_data(fname, x, y)
+            self.files.append(fname)
+        self.bad = os.path.join(self.folder, 'bad.txt')
+        with open(self.bad, 'wb') as fobj:
+            fobj.write('0;a\r\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_find_files(self):
+        # directory: only the CSV files
+        self.assertEqual(find_files([self.folder]), self.files)
+        # glob pattern
+        pattern = os.path.join(self.folder, '*.txt')
+        self.assertEqual(find_files([pattern]), [self.bad])
+        # plain file names are taken as they are
+        self.assertEqual(find_files([self.bad, self.files[0]]),
+                         [self.bad, self.files[0]])
+
+    def test_identify_file(self):
+        result = identify_file(self.files[0], degree=11)
+        self.assertEqual(result['error'], None)
+        self.assertEqual(sorted(result['methods']), ['itm', 'pt2'])
+        params = result['methods']['pt2']['params']
+        self.assertAlmostEqual(params['c'], 2, 3)
+        self.assertTrue(result['methods']['itm']['params']['tu'] > 0)
+
+        # error of the file
+        result = identify_file(self.bad)
+        self.assertTrue(result['error'].startswith('ValueError'))
+        self.assertEqual(result['methods'], {})
+
+        # error of a method, the others are identified
+        with catch_warnings(record=True):
+            result = identify_file(self.files[0], ('nomodel', 'pt2'), 0)
+        self.assertTrue(result['methods']['nomodel']['error'])
+        self.assertEqual(result['methods']['pt2']['error'], None)
+        self.assertFalse('itm' in result['methods'])
+
+    def test_write(self):
+        results = list(run(self.files + [self.bad], processes=1))
+        self.assertEqual(len(results), 3)
+
+        fobj = StringIO()
+        write_csv(results, fobj)
+        fobj.seek(0)
+        rows = list(csv.DictReader(fobj, delimiter=';'))
+        # one row for each method of the files, one for the error
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([row['method'] for row in rows],
+                         ['itm', 'pt2', 'itm', 'pt2', ''])
+        self.assertAlmostEqual(float(rows[1]['c']), 2, 3)
+        self.assertTrue(rows[-1]['error'])
+
+        fobj = StringIO()
+        write_json(results, fobj)
+        self.assertEqual(json.loads(fobj.getvalue()), results)
+
+    def test_main(self):
+        output = os.path.join(self.folder, 'results.json')
+        main(['-j', '1', '-m', 'pt1,pt2', '-d', '0', '-o', output,
+              self.folder])
+        with open(output) as fobj:
+            results = json.load(fobj)
+        self.assertEqual(sorted(result['file'] for result in results),
+                         self.files)
+        for result in results:
+            self.assertEqual(sorted(result['methods']), ['pt1', 'pt2'])
+
+        output = os.path.join(self.folder, 'results.csv')
+        main(['-j', '1', '-o', output, self.files[0]])
+        with open(output, 'rb') as fobj:
+            rows = list(csv.DictReader(fobj, delimiter=';'))
+        self.assertEqual([row['method'] for row in rows], ['itm', 'pt2'])
+        
+        # the estimation method is required, the path is not taken
+        main(['-g', 'multistart', '-d', '0', '-j', '1', '-o', output,
+              self.files[0]])
+        with open(output, 'rb') as fobj:
+            rows = list(csv.DictReader(fobj, delimiter=';'))
+        self.assertEqual(rows[0]['file'], self.files[0])
+        self.assertAlmostEqual(float(rows[0]['c']), 2, 3)
+        
+        # fitters of the inflectional tangent method
+        output = os.path.join(self.folder, 'results.json')
+        for options in (['--basis', 'monomial'], ['--spline', '8']):
+            main(['-j', '1', '-m', '', '-o', output, self.files[0]] +
+                 options)
+            with open(output) as fobj:
+                itm = json.load(fobj)[0]['methods']['itm']
+            self.assertEqual(itm['error'], None, options)
+            self.assertAlmostEqual(itm['params']['height'], 2, 1)
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestBatch))
+
+if __name__ == '__main__':
+    unittest.main()
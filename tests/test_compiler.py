@@ -0,0 +1,39 @@
+# coding: utf-8
+
+import ast
+import unittest
+
+import numpy
+
+from sitforc.compiler import compile_func
+
+class TestCompiler(unittest.TestCase):
+    def test_compile_func(self):
+        funcstring = ('p["c"] * (1 - exp(-(x/p["t"])) * '
+                      '(1 + (x/p["t"])**2 / fac(2) + (x/p["t"])**3))')
+        expr = ast.parse(funcstring, mode='eval')
+        func = compile_func(expr, ['t', 'c'])
+        self.assertEqual(func.param_names, ('c', 't'))
+        
+        # common subexpression is calculated once
+        self.assertEqual(func.source.count('(x / _p1)'), 1)
+        
+        x = numpy.linspace(0, 10, 50)
+        p = {'c': 2.0, 't': 0.7}
+        expected = eval(funcstring, {'exp': numpy.exp, 'fac': lambda n: 2}, 
+                        {'x': x, 'p': p})
+        self.assertTrue(numpy.allclose(func(x, p), expected))
+        self.assertTrue(numpy.allclose(func.vfunc(x, [2.0, 0.7]), 
+                                       expected))
+        self.assertRaises(KeyError, func, x, {'c': 1.0})
+        
+        # true division
+        func = compile_func(ast.parse('x / 2', mode='eval'), [])
+        self.assertEqual(func(1, None), 0.5)
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestCompiler))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 # coding: utf-8
 
+from multiprocessing.pool import ThreadPool
 from warnings import catch_warnings
+import gc
 import os
+import shutil
+import tempfile
 import unittest
 
 import configobj
+import numpy
 
-from sitforc.core import Model, modellib
+from sitforc import core, numlib
+from sitforc.core import Model, ModelLibrary, modellib, fit_all
+from sitforc.core import ITMIdentifier, ITMResult
 from sitforc.core import SitforcWarning
+from sitforc.funcparser import parse_func
 
 class TestModel(unittest.TestCase):    
     def test_model(self):
@@ -25,6 +33,24 @@ class TestModel(unittest.TestCase):
         self.assertEqual(model.default_params["c"], 2)
         self.assertEqual(model(1), 3)
         
+        # no jacobian for functions which are not compiled
+        self.assertEqual(model.jacobian, None)
+        
+    def test_jacobian(self):
+        funcstring = 'p["c"] * (1 - exp(-(x/p["t"])))'
+        func, latex, params = parse_func(funcstring)
+        model = Model('m1', func, funcstring, latex, c=2.0, t=0.5)
+        x = numpy.linspace(0, 5, 20)
+        theta = numpy.array([2.0, 0.5])
+        jac = model.jacobian.vfunc(x, theta)
+        for i in range(len(theta)):
+            # compare with central differences
+            h = numpy.zeros(2)
+            h[i] = 1e-6
+            diff = (model.vfunc(x, theta + h) - 
+                    model.vfunc(x, theta - h)) / 2e-6
+            self.assertTrue(numpy.allclose(jac[i], diff))
+        
 class TestModelLibrary(unittest.TestCase): 
     def tearDown(self):
         modellib.reset()
@@ -37,6 +63,86 @@ class TestModelLibrary(unittest.TestCase):
             self.assertEqual(len(w), 1)
             self.assertTrue(issubclass(w[0].category, SitforcWarning))
     
+    def test_lazy_modellib(self):
+        folder = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(folder, 'lib.sfm')
+            with open(fname, 'w') as fobj:
+                fobj.write('[m1]\nfunc = p["c"] * x\nc = 2\n'
+                           '[m2]\nfunc = p["d"] * x\nc = 2\n')
+            lib = ModelLibrary(fname)
+            self.assertEqual(lib.names(), ['m1', 'm2'])
+            self.assertEqual(lib.lib, {})
+            self.assertEqual(lib.m1(3), 6)
+            with catch_warnings(record=True) as w:
+                self.assertRaises(KeyError, lib.__getitem__, 'm2')
+                self.assertEqual(len(w), 1)
+            self.assertEqual(len(lib), 1)
+            lib._store_cache()
+            self.assertTrue(os.path.exists(fname + '.cache'))
+            
+            # compiled from cache
+            lib = ModelLibrary(fname)
+            self.assertTrue(lib._cache['models']['m1'])
+            self.assertEqual(lib.m1(3), 6)
+            self.assertEqual(lib.m1.latex, r'$c \cdot x$')
+        finally:
+            shutil.rmtree(folder)
+    
+    def test_cached_jacobian(self):
+        folder = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(folder, 'lib.sfm')
+            with open(fname, 'w') as fobj:
+                fobj.write('[m1]\nfunc = p["c"] * (1 - exp(-x/p["t"]))\n'
+                           'c = 1\nt = 1\n[m2]\nfunc = p["c"] * x\n'
+                           'c = 1\n')
+            x = numpy.linspace(0, 5, 50)
+            y = 2 * (1 - numpy.exp(-x / 0.5))
+            lib = ModelLibrary(fname)
+            self.assertEqual(lib.m1._jacobian_source, None)
+            # the first fit generates the jacobian and stores it
+            params = dict(c=1.0, t=1.0)
+            self.assertTrue(numlib.modelfit(lib.m1, params, x, y))
+            self.assertAlmostEqual(params['t'], 0.5, 5)
+            lib2 = ModelLibrary(fname)
+            self.assertTrue(lib2._cache['models']['m1']['jacobian'])
+            self.assertEqual(lib2.m1._jacobian_source, 
+                             lib.m1._jacobian_source)
+            
+            lib2.prepare()
+            lib = ModelLibrary(fname)
+            self.assertTrue(lib._cache['models']['m2']['jacobian'])
+        finally:
+            shutil.rmtree(folder)
+    
+    def test_threads_modellib(self):
+        folder = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(folder, 'lib.sfm')
+            with open(fname, 'w') as fobj:
+                fobj.write('[m1]\nfunc = p["c"] * x\nc = 2\n')
+            lib = ModelLibrary(fname)
+            pool = ThreadPool(8)
+            try:
+                models = pool.map(lib.__getitem__, ['m1'] * 32)
+            finally:
+                pool.close()
+            self.assertEqual(len(set(map(id, models))), 1)
+            
+            # the cache is stored at exit, without keeping the library
+            self.assertTrue(lib in core._libraries)
+            lib._store_cache()
+            # no temporary file is left
+            self.assertEqual(sorted(os.listdir(folder)), 
+                             ['lib.sfm', 'lib.sfm.cache'])
+            del lib, models
+            gc.collect()
+            self.assertEqual([lib for lib in core._libraries 
+                              if lib.filename == fname], [])
+        finally:
+            shutil.rmtree(folder)
+    
     def test_fileops_modellib(self):
         # check file operations of modellib
         
@@ -73,10 +179,100 @@ c = 2
             os.rename(os.path.join(fpath, 'modellib2.sfm'),
                       os.path.join(fpath, 'modellib.sfm'))
 
+
+class TestFitAll(unittest.TestCase):
+    def test_fit_all(self):
+        x = numpy.linspace(0, 5, 100)
+        y = modellib.pt1(x, c=3.0, t=0.8)
+        results = fit_all(x, y, [modellib.linear, modellib.pt1])
+        self.assertEqual([r.name for r in results], ['pt1', 'linear'])
+        self.assertAlmostEqual(results[0].params['t'], 0.8)
+        self.assertTrue(results[0].aic < results[1].aic)
+        
+        # exceeded time budget
+        result = fit_all(x, y, [modellib.pt1], timeout=0)[0]
+        self.assertFalse(result.success)
+        self.assertEqual(result.rss, numpy.inf)
+        self.assertTrue(result.error)
+
+        
+class TestITMIdentifier(unittest.TestCase):
+    def test_fitters(self):
+        # pt2 with equal time constants: inflection point at x=t
+        x = numpy.linspace(0, 20, 4000)
+        y = 2.0 * (1 - (1 + x) * numpy.exp(-x))
+        # the spline follows the sharp step closer than the polynomial
+        for fitter, places in (('poly', 1), ('spline', 2)):
+            itmi = ITMIdentifier(x, y, 11, fitter=fitter)
+            self.assertAlmostEqual(itmi.i_points[0][0], 1.0, places)
+            self.assertAlmostEqual(itmi.tangent_slope, 2.0 / numpy.e, 
+                                   places)
+            self.assertAlmostEqual(itmi.tu, 0.282, places)
+            self.assertAlmostEqual(itmi.height, 2.0, places)
+        self.assertRaises(ValueError, ITMIdentifier, x, y, 11, 
+                          fitter='lowess')
+    
+    def test_cached_points(self):
+        x = numpy.linspace(0, 20, 4000)
+        y = 2.0 * (1 - (1 + x) * numpy.exp(-x)) + 0.01 * numpy.sin(x)
+        itmi = ITMIdentifier(x, y, 11)
+        self.assertTrue(len(itmi.i_points) > 1)
+        
+        # first x-value after the point where the slope deviates
+        dy = itmi.fitter.get_values(1)
+        x0, y0, m = itmi.i_points[0]
+        expected = [x_val for x_val, dy_val in zip(x, dy)
+                    if x_val > x0 and abs(dy_val - m) > 0.1][0]
+        self.assertEqual(itmi.split_point, expected)
         
+        mf, t_x = itmi.model_fitter, itmi.t_x
+        self.assertTrue(itmi.t_x is t_x)
+        self.assertTrue(numpy.allclose(itmi.t_y, m * t_x + 
+                                       itmi.tangent_offset))
+        itmi.calculate_inflec_point(1)
+        self.assertTrue(itmi.model_fitter is not mf)
+        self.assertEqual(itmi.tangent_slope, itmi.i_points[1][2])
+        itmi.calculate_inflec_point(0)
+        self.assertTrue(itmi.model_fitter is mf)
+        self.assertTrue(itmi.t_x is t_x)
+        self.assertEqual(itmi.tangent_slope, m)
+        
+        # selection in a copy, the identifier is unchanged
+        copy = itmi.select(2)
+        self.assertEqual(copy.tangent_slope, itmi.i_points[2][2])
+        self.assertTrue(copy.t_x is not t_x)
+        self.assertEqual(itmi.tangent_slope, m)
+        self.assertTrue(itmi.t_x is t_x)
+        self.assertFalse(2 in itmi._results)
+        self.assertTrue(copy.select(0).model_fitter is mf)
+    
+    def test_precompute(self):
+        x = numpy.linspace(0, 20, 4000)
+        y = 2.0 * (1 - (1 + x) * numpy.exp(-x)) + 0.01 * numpy.sin(x)
+        itmi = ITMIdentifier(x, y, 11)
+        results = itmi.results
+        self.assertEqual(len(results), len(itmi.i_points))
+        self.assertTrue(isinstance(results[0], ITMResult))
+        self.assertEqual(results[0].tu, itmi.tu)
+        self.assertEqual(results[0].height, itmi.height)
+        self.assertEqual(results[1:], [None] * (len(results) - 1))
+        
+        for threads in (None, 4):
+            pre = ITMIdentifier(x, y, 11, precompute=True, threads=threads)
+            self.assertEqual(len(pre._results), len(pre.i_points))
+            self.assertTrue(None not in pre.results)
+            self.assertEqual(pre.results[0], results[0])
+            for num, result in enumerate(pre.results):
+                pre.calculate_inflec_point(num)
+                self.assertEqual(pre.tg, result.tg)
+                self.assertEqual(pre.tangent_offset, result.offset)
+
+
 suite = unittest.TestSuite()
 suite.addTest(unittest.makeSuite(TestModel))
 suite.addTest(unittest.makeSuite(TestModelLibrary))
+suite.addTest(unittest.makeSuite(TestFitAll))
+suite.addTest(unittest.makeSuite(TestITMIdentifier))
 
 if __name__ == '__main__':
     unittest.main()        
@@ -0,0 +1,225 @@
+# coding: utf-8
+
+from warnings import catch_warnings
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy
+
+from sitforc.core import modellib
+from sitforc.funcparser import parse_func
+from sitforc.fitting import FitCache, ModelFitter, PolyFitter, SplineFitter
+from sitforc.fitting import INFLEC_DTYPE
+
+class TestModelFitter(unittest.TestCase):
+    def test_model_fitter(self):
+        x = numpy.linspace(0, 5, 100)
+        y = modellib.pt1(x, c=3.0, t=0.8)
+        mf = ModelFitter(x, y, modellib.pt1)
+        self.assertTrue(mf.success)
+        self.assertAlmostEqual(mf.params['c'], 3.0)
+        self.assertTrue(numpy.allclose(mf.y, y))
+        
+        # symbolic function is generated on demand
+        self.assertEqual(mf.data_cache[0]['obj'], None)
+        self.assertTrue('x' in str(mf))
+        self.assertTrue(mf.data_cache[0]['obj'] is not None)
+        
+        dy = 3.0 / 0.8 * numpy.exp(-x / 0.8)
+        self.assertTrue(numpy.allclose(mf.get_values(1), dy))
+        self.assertTrue(numpy.allclose(mf.get_values(3), 
+                                       dy / 0.8**2))
+        
+        # constant derivation
+        mf = ModelFitter(x, 2 * x, modellib.linear)
+        self.assertTrue(numpy.array_equal(mf.get_values(2), 
+                                          numpy.zeros(len(x))))
+    
+    def test_fit_without_sympy(self):
+        # only the first fit of a model imports sympy, the
+        # jacobian is stored in the cache of the library
+        folder = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(folder, 'modellib.sfm')
+            shutil.copy(os.path.join('..', 'sitforc', 'modellib.sfm'), 
+                        fname)
+            script = ('import sys, numpy\n'
+                      'from sitforc.core import ModelLibrary\n'
+                      'from sitforc.fitting import ModelFitter\n'
+                      'lib = ModelLibrary({0!r})\n'
+                      'x = numpy.linspace(0, 20, 300)\n'
+                      'mf = ModelFitter(x, lib.pt2(x), lib.pt2)\n'
+                      'print mf.success, "sympy" in sys.modules\n')
+            env = dict(os.environ, PYTHONPATH=os.path.abspath('..'))
+            for expected in (['True', 'True'], ['True', 'False']):
+                output = subprocess.check_output(
+                    [sys.executable, '-c', script.format(fname)], env=env)
+                self.assertEqual(output.split(), expected)
+        finally:
+            shutil.rmtree(folder)
+    
+    def test_fit_many(self):
+        x = numpy.linspace(0, 5, 200)
+        rng = numpy.random.RandomState(0)
+        c = rng.uniform(1, 5, 30)
+        t = rng.uniform(0.2, 2, 30)
+        Y = c[:, numpy.newaxis] * (1 - numpy.exp(-x / t[:, numpy.newaxis]))
+        Y += 0.01 * rng.randn(*Y.shape)
+        Y[-1] = numpy.nan
+        
+        params, success = ModelFitter.fit_many(x, Y, modellib.pt1)
+        self.assertEqual(params.shape, (30, 2))
+        self.assertEqual(modellib.pt1.param_names, ('c', 't'))
+        self.assertTrue(success[:-1].all())
+        self.assertFalse(success[-1])
+        self.assertTrue(numpy.allclose(params[:-1, 0], c[:-1], rtol=0.02))
+        self.assertTrue(numpy.allclose(params[:-1, 1], t[:-1], rtol=0.02))
+        for i in (0, 17):
+            mf = ModelFitter(x, Y[i], modellib.pt1)
+            self.assertAlmostEqual(params[i, 0], mf.params['c'], 5)
+            self.assertAlmostEqual(params[i, 1], mf.params['t'], 5)
+        
+        # finite differences for functions without Jacobian
+        func = parse_func('p["c"] * (1 - exp(-x / p["t"]))')[0]
+        params2, success2 = ModelFitter.fit_many(x, Y, func, c=1.0, t=1.0)
+        self.assertTrue(success2[:-1].all())
+        self.assertTrue(numpy.allclose(params2[:-1], params[:-1], 
+                                       rtol=1e-4))
+
+class TestFitCache(unittest.TestCase):
+    def test_fit_cache(self):
+        x = numpy.linspace(0, 20, 300)
+        y = modellib.pt2(x, c=4.0, t1=3.0, t2=1.2)
+        cache = FitCache(maxsize=2)
+        mf = cache.fit(x, y, modellib.pt2)
+        self.assertTrue(mf.success)
+        self.assertTrue(cache.fit(x, y.copy(), modellib.pt2) is mf)
+        self.assertEqual(cache.stats['hits'], 1)
+        
+        # warm start from the nearest result
+        mf2 = cache.fit(x, 1.01 * y, modellib.pt2)
+        self.assertTrue(mf2 is not mf)
+        self.assertAlmostEqual(mf2.params['c'], 4.04, 4)
+        mf3 = cache.fit(x, y, modellib.pt1)
+        self.assertEqual(cache.stats, dict(hits=1, warm=1, misses=2,
+                                           fallbacks=0, size=2))
+        # the least recently used result was evicted
+        self.assertTrue(cache.fit(x, y, modellib.pt2) is not mf)
+        self.assertTrue(cache.fit(x, y, modellib.pt1) is mf3)
+    
+    def test_options(self):
+        x = numpy.linspace(0, 20, 300)
+        y = modellib.pt2(x, c=4.0, t1=3.0, t2=1.2)
+        cache = FitCache()
+        mf = cache.fit(x, y, modellib.pt2)
+        # other options are no hit
+        for options in (dict(c=100.0, maxfev=1), dict(maxfev=500),
+                        dict(timeout=10.0), dict(guess=True), 
+                        dict(decimate=100), 
+                        dict(decimate=100, polish=True), dict(t1=3.0)):
+            with catch_warnings(record=True):
+                mf2 = cache.fit(x, y, modellib.pt2, **options)
+            self.assertTrue(mf2 is not mf, options)
+        self.assertEqual(cache.stats['hits'], 0)
+        self.assertTrue(cache.fit(x, y, modellib.pt2, t1=3.0) is mf2)
+        self.assertTrue(cache.fit(x, y, modellib.pt2) is mf)
+        self.assertEqual(cache.stats['hits'], 2)
+
+    def test_decimate(self):
+        x = numpy.linspace(0, 20, 20000)
+        rng = numpy.random.RandomState(0)
+        y = modellib.pt2(x, c=4.0, t1=3.0, t2=1.2) + 0.02 * rng.randn(20000)
+        expected = ModelFitter(x, y, modellib.pt2)
+        for method in ('uniform', 'bin', 'lttb'):
+            mf = ModelFitter(x, y, modellib.pt2, decimate=(1000, method))
+            self.assertEqual(len(mf.y), 20000)
+            self.assertAlmostEqual(mf.params['c'], 4.0, 1)
+        mf = ModelFitter(x, y, modellib.pt2, decimate=1000, polish=True)
+        self.assertTrue(mf.success)
+        for key, value in expected.params.items():
+            self.assertAlmostEqual(mf.params[key], value, 5)
+
+class TestPolyFitter(unittest.TestCase):
+    def test_bases(self):
+        x = numpy.linspace(0, 4, 200)
+        y = x**3 - 6 * x**2 + 2 * x
+        for basis in ('monomial', 'chebyshev'):
+            pf = PolyFitter(x, y, 3, basis)
+            self.assertEqual(pf.degree, 3)
+            self.assertTrue(numpy.allclose(pf.y, y))
+            self.assertTrue(numpy.allclose(pf.get_values(1), 
+                                           3 * x**2 - 12 * x + 2))
+            self.assertTrue(numpy.allclose(pf.get_values(2), 
+                                           6 * x - 12))
+            self.assertTrue('x' in str(pf))
+            
+            points = pf.get_inflec_points()
+            self.assertEqual(points.dtype, INFLEC_DTYPE)
+            self.assertEqual(len(points), 1)
+            x0, y0, slope = points[0]
+            self.assertAlmostEqual(x0, 2.0)
+            self.assertAlmostEqual(y0, -12.0)
+            self.assertAlmostEqual(slope, -10.0)
+            self.assertEqual(points.tolist(), [(x0, y0, slope)])
+            # the values of the derivations are not needed
+            self.assertEqual(sorted(pf.data_cache), [0, 1, 2])
+        
+        self.assertRaises(ValueError, PolyFitter, x, y, 3, 'legendre')
+    
+    def test_decimate(self):
+        x = numpy.linspace(0, 4, 20000)
+        y = x**3 - 6 * x**2 + 2 * x
+        for basis in ('monomial', 'chebyshev'):
+            pf = PolyFitter(x, y, 3, basis, decimate=500)
+            self.assertEqual(len(pf.y), 20000)
+            self.assertTrue(numpy.allclose(pf.y, y, atol=1e-3))
+        
+    def test_no_inflec_points(self):
+        x = numpy.linspace(0, 4, 200)
+        points = PolyFitter(x, x**2, 2).get_inflec_points()
+        self.assertEqual(points.dtype, INFLEC_DTYPE)
+        self.assertEqual(points.tolist(), [])
+    
+    def test_high_degree(self):
+        # long time axis, badly conditioned in the monomial basis
+        x = numpy.linspace(0, 1000, 5000)
+        y = 1 - numpy.exp(-x / 150.0) * (1 + x / 150.0)
+        pf = PolyFitter(x, y, 11, 'chebyshev')
+        self.assertTrue(numpy.abs(pf.y - y).max() < 1e-3)
+        points = pf.get_inflec_points()
+        self.assertTrue(numpy.any(numpy.abs(points['x'] - 150.0) < 5))
+
+class TestSplineFitter(unittest.TestCase):
+    def test_spline_fitter(self):
+        x = numpy.linspace(0, 4, 2000)
+        y = numpy.sin(x)
+        for sf in (SplineFitter(x, y), SplineFitter(x, y, smoothing=0)):
+            self.assertTrue(numpy.allclose(sf.y, y))
+            self.assertTrue(numpy.allclose(sf.get_values(1), numpy.cos(x),
+                                           atol=1e-6))
+            self.assertTrue(numpy.allclose(sf.get_values(3), -numpy.cos(x),
+                                           atol=1e-3))
+            self.assertTrue(numpy.array_equal(sf.get_values(6), 
+                                              numpy.zeros(len(x))))
+            self.assertTrue('knots' in str(sf))
+            
+            points = sf.get_inflec_points()
+            self.assertEqual(len(points), 1)
+            x0, y0, slope = points[0]
+            self.assertAlmostEqual(x0, numpy.pi, 4)
+            self.assertAlmostEqual(y0, 0.0, 4)
+            self.assertAlmostEqual(slope, -1.0, 4)
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestModelFitter))
+suite.addTest(unittest.makeSuite(TestFitCache))
+suite.addTest(unittest.makeSuite(TestPolyFitter))
+suite.addTest(unittest.makeSuite(TestSplineFitter))
+
+if __name__ == '__main__':
+    unittest.main()
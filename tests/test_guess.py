@@ -0,0 +1,67 @@
+# coding: utf-8
+
+import unittest
+
+import numpy
+
+from sitforc import guess
+from sitforc.core import modellib
+from sitforc.fitting import ModelFitter
+
+PARAMS = {'pt1': dict(c=3.0, t=4.0),
+          'pt2': dict(c=-2.0, t1=5.0, t2=1.5),
+          'pt3': dict(c=7.0, t1=4.0, t2=2.0, t3=0.7),
+          'pt3_sim': dict(c=2.5, t=3.0),
+          'pt5_sim': dict(c=1.5, t=1.2),
+          'exp_approach': dict(c=4.0, t=3.0, dx=2.0),
+          'gaussian': dict(height=3.0, mu=20.0, sigma=4.0),
+          'linear': dict(a=2.0, b=1.0)}
+
+class TestGuess(unittest.TestCase):
+    def setUp(self):
+        self.x = numpy.linspace(0, 40, 2000)
+        self.rng = numpy.random.RandomState(1)
+        
+    def data(self, name):
+        model = modellib[name]
+        y = model(self.x, PARAMS[name])
+        return model, y + 0.01 * self.rng.randn(len(y))
+        
+    def test_crossing_times(self):
+        x = numpy.arange(5.0)
+        r = numpy.array([0.0, 0.2, 0.1, 0.6, 1.0])
+        times = guess.crossing_times(x, r, [0.0, 0.1, 0.4, 1.0, 1.1])
+        self.assertTrue(numpy.allclose(times[:4], [0.0, 0.5, 2.5, 4.0]))
+        self.assertTrue(numpy.isnan(times[4]))
+        
+    def test_initial_params(self):
+        for name, expected in PARAMS.items():
+            model, y = self.data(name)
+            params = guess.initial_params(model, self.x, y)
+            for key, value in expected.items():
+                # close enough to converge quickly
+                self.assertTrue(abs(params[key] - value) < 
+                                0.2 * max(abs(value), 1), (name, key))
+                
+    def test_fallback(self):
+        model = modellib.pt2
+        params = guess.initial_params(model, self.x, numpy.zeros(2000))
+        self.assertEqual(params, model.default_params)
+        
+    def test_model_fitter(self):
+        for guess_mode in (True, 'multistart'):
+            model, y = self.data('pt3')
+            mf = ModelFitter(self.x, y, model, guess=guess_mode)
+            self.assertTrue(mf.success)
+            self.assertAlmostEqual(mf.params['c'], 7.0, 2)
+            self.assertAlmostEqual(sorted([mf.params['t1'], mf.params['t2'],
+                                           mf.params['t3']])[-1], 4.0, 1)
+        mf = ModelFitter(self.x, y, model, guess=True, c=5.0)
+        self.assertAlmostEqual(mf.params['c'], 7.0, 2)
+        
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestGuess))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+from StringIO import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from sitforc.iolib import load_csv, iter_csv, CACHE_SUFFIX
+
+CSV_DATA = '0;-0,003897\r\n0,002;-0,001354\r\n0,004;4,6E-05\r\n'
+
+class TestLoadCSV(unittest.TestCase):
+    def test_load_csv(self):
+        x, y = load_csv(StringIO(CSV_DATA))
+        self.assertTrue(numpy.array_equal(x, [0, 0.002, 0.004]))
+        self.assertTrue(numpy.array_equal(y, [-0.003897, -0.001354, 
+                                              4.6e-05]))
+        
+        # same values as numpy.loadtxt
+        fname = os.path.join('..', 'examples', 'data.csv')
+        x, y = load_csv(fname, cache=False)
+        conv = lambda value: float(value.replace(',', '.'))
+        x2, y2 = numpy.loadtxt(fname, delimiter=';', unpack=True,
+                               converters={0: conv, 1: conv})
+        self.assertTrue(numpy.array_equal(x, x2))
+        self.assertTrue(numpy.array_equal(y, y2))
+        
+        # malformed data
+        self.assertRaises(ValueError, load_csv, StringIO('0;1;2\n'))
+        self.assertRaises(ValueError, load_csv, StringIO('0;a\n'))
+        
+    def test_iter_csv(self):
+        # chunks smaller than a line and not ending with a newline
+        chunks = list(iter_csv(StringIO(CSV_DATA.rstrip()), chunk_size=7))
+        x = numpy.concatenate([c[0] for c in chunks])
+        y = numpy.concatenate([c[1] for c in chunks])
+        x2, y2 = load_csv(StringIO(CSV_DATA))
+        self.assertTrue(numpy.array_equal(x, x2))
+        self.assertTrue(numpy.array_equal(y, y2))
+        
+    def test_cache(self):
+        folder = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(folder, 'data.csv')
+            with open(fname, 'wb') as fobj:
+                fobj.write(CSV_DATA)
+            x, y = load_csv(fname)
+            self.assertTrue(os.path.exists(fname + CACHE_SUFFIX))
+            x2, y2 = load_csv(fname)
+            self.assertTrue(numpy.array_equal(x, x2))
+            self.assertTrue(numpy.array_equal(y, y2))
+            del x2, y2
+            
+            # changed file invalidates the cache
+            with open(fname, 'ab') as fobj:
+                fobj.write('0,006;1\r\n')
+            x, y = load_csv(fname)
+            self.assertEqual(len(x), 4)
+            self.assertEqual(y[-1], 1)
+        finally:
+            shutil.rmtree(folder)
+        
+        
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestLoadCSV))
+
+if __name__ == '__main__':
+    unittest.main()
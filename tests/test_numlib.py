@@ -0,0 +1,89 @@
+# coding: utf-8
+
+import unittest
+
+import numpy
+
+from sitforc import numlib
+
+class TestModelfit(unittest.TestCase):
+    def test_modelfit(self):
+        x = numpy.linspace(0, 5, 50)
+        y = 3.0 * (1 - numpy.exp(-x / 0.7))
+        func = lambda x, p: p['c'] * (1 - numpy.exp(-x / p['t']))
+        params = {'c': 1.0, 't': 1.0}
+        self.assertTrue(numlib.modelfit(func, params, x, y))
+        self.assertAlmostEqual(params['c'], 3.0)
+        self.assertAlmostEqual(params['t'], 0.7)
+        
+    def test_param_view(self):
+        view = numlib.ParamView(('a', 'b'), numpy.array([1.0, 2.0]))
+        self.assertEqual(view['b'], 2.0)
+        self.assertEqual(dict(view), {'a': 1.0, 'b': 2.0})
+        self.assertRaises(KeyError, view.__getitem__, 'c')
+        
+
+class TestDecimate(unittest.TestCase):
+    def test_decimate_minmax(self):
+        x = numpy.linspace(0, 10, 25001)
+        y = numpy.sin(x) + 0.1 * numpy.sin(300 * x)
+        xd, yd = numlib.decimate_minmax(x, y, 400)
+        self.assertTrue(len(xd) <= 2 * 400 + 2)
+        self.assertTrue(numpy.all(numpy.diff(xd) > 0))
+        self.assertEqual((xd[0], xd[-1]), (x[0], x[-1]))
+        self.assertEqual((yd.min(), yd.max()), (y.min(), y.max()))
+        # the envelope of each bin is kept
+        k = -(-len(x) // 400)
+        for i in (0, 137, len(x) // k - 1):
+            block = y[i*k:(i+1)*k]
+            self.assertTrue(block.min() in yd and block.max() in yd)
+        
+        xd, yd = numlib.decimate_minmax(x[:500], y[:500], 400)
+        self.assertTrue(xd is not None and len(xd) == 500)
+        
+    def test_decimate(self):
+        x = numpy.linspace(0, 10, 10001)
+        y = 2 * x + 1
+        for method in numlib.DECIMATION_METHODS:
+            xd, yd = numlib.decimate(x, y, 500, method)
+            self.assertTrue(len(xd) <= 500, method)
+            self.assertTrue(numpy.all(numpy.diff(xd) > 0), method)
+            self.assertTrue(numpy.allclose(yd, 2 * xd + 1), method)
+        self.assertTrue(numlib.decimate(x, y, 20000)[0] is x)
+        self.assertRaises(ValueError, numlib.decimate, x, y, 500, 'foo')
+        
+        xd, yd = numlib.decimate_uniform(x, y, 6)
+        self.assertEqual(xd.tolist(), [0, 2, 4, 6, 8, 10])
+        xd, yd = numlib.decimate_bin(numpy.arange(10.0), y[:10], 3)
+        self.assertEqual(xd.tolist(), [1.0, 4.0, 7.5])
+        
+        # the peaks are kept
+        y = numpy.zeros(10)
+        y[2], y[6] = 5, -3
+        xd, yd = numlib.decimate_lttb(numpy.arange(10.0), y, 4)
+        self.assertEqual(xd.tolist(), [0, 2, 6, 9])
+        xd, yd = numlib.decimate_lttb(numpy.arange(10.0), y, 2)
+        self.assertEqual(xd.tolist(), [0, 9])
+        
+        # invalid sizes
+        x = numpy.arange(10.0)
+        for size in (-1, 0, 1):
+            for method in numlib.DECIMATION_METHODS:
+                self.assertRaises(ValueError, numlib.decimate, x, y, 
+                                  size, method)
+            self.assertRaises(ValueError, numlib.decimate_uniform, x, y, 
+                              size)
+            self.assertRaises(ValueError, numlib.decimate_lttb, x, y, 
+                              size)
+        for size in (-1, 0):
+            self.assertRaises(ValueError, numlib.decimate_bin, x, y, size)
+            self.assertRaises(ValueError, numlib.decimate_minmax, x, y, 
+                              size)
+        
+        
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestModelfit))
+suite.addTest(unittest.makeSuite(TestDecimate))
+
+if __name__ == '__main__':
+    unittest.main()
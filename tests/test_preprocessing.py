@@ -0,0 +1,64 @@
+# coding: utf-8
+
+import unittest
+
+import numpy
+
+from sitforc.core import shift_data
+from sitforc.numlib import smooth
+from sitforc.preprocessing import Preprocessor
+
+class TestPreprocessor(unittest.TestCase):
+    def setUp(self):
+        self.x = numpy.linspace(0, 10, 1001)
+        self.y = numpy.sin(self.x)
+        
+    def test_stages(self):
+        pre = Preprocessor(shift=1.5, offset=0.5, smooth=11)
+        x, y = pre(self.x, self.y)
+        x_ref, y_ref = shift_data(self.x, self.y, 1.5)
+        self.assertTrue(numpy.array_equal(x, x_ref))
+        self.assertTrue(numpy.array_equal(y, smooth(y_ref - 0.5, 11)))
+        
+        pre.set(resample=50)
+        x, y = pre(self.x, self.y)
+        self.assertEqual(len(x), 50)
+        self.assertTrue(numpy.allclose(numpy.diff(x), x[1] - x[0]))
+        
+        # neutral parameters pass the data unchanged
+        x, y = Preprocessor()(self.x, self.y)
+        self.assertTrue(x is self.x and y is self.y)
+        self.assertRaises(KeyError, pre.set, scale=2)
+        
+    def test_cache(self):
+        pre = Preprocessor(shift=1.5, offset=0.5, smooth=11)
+        x, y = pre(self.x, self.y)
+        versions = [stage.version for stage in pre.stages]
+        self.assertTrue(pre(self.x, self.y)[1] is y)
+        self.assertEqual([stage.version for stage in pre.stages], versions)
+        
+        # only the stages after the changed one are computed
+        pre.set(offset=0.25)
+        x2, y2 = pre(self.x, self.y)
+        self.assertTrue(x2 is x)
+        self.assertEqual([stage.version for stage in pre.stages], 
+                         [versions[0], versions[1] + 1, versions[2] + 1, 
+                          versions[3] + 1])
+        self.assertTrue(numpy.allclose(y2, y + 0.25))
+        
+        # new data
+        pre(self.x.copy(), self.y)
+        self.assertEqual(pre['shift'].version, versions[0] + 1)
+        
+        pre.reset()
+        pre(self.x, self.y)
+        self.assertEqual(pre['shift'].version, versions[0] + 2)
+        self.assertEqual(pre.params, dict(shift=1.5, offset=0.25, smooth=11,
+                                          resample=None))
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestPreprocessor))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import unittest
+
+import numpy
+
+from sitforc import numlib, smoothing
+
+def cookbook_smooth(x, window_len):
+    # former numlib.smooth
+    s = numpy.r_[2*x[0]-x[window_len:1:-1], x, 2*x[-1]-x[-1:-window_len:-1]]
+    w = numpy.ones(window_len, 'd')
+    y = numpy.convolve(w/w.sum(), s, mode='same')
+    return y[window_len-1:-window_len+1]
+
+class TestSmoothing(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.RandomState(1)
+        self.y = numpy.cumsum(rng.randn(5000)) + 100
+        
+    def test_moving_average(self):
+        for window_len in (3, 4, 11, 12, 101, 202):
+            expected = cookbook_smooth(self.y, window_len)
+            for method in ('auto', 'direct', 'fft'):
+                y = smoothing.smooth(self.y, window_len, method=method)
+                self.assertTrue(numpy.allclose(y, expected, rtol=0, 
+                                               atol=1e-9))
+            self.assertTrue(numpy.allclose(numlib.smooth(self.y, window_len),
+                                           expected, rtol=0, atol=1e-9))
+        self.assertTrue(numlib.smooth(self.y, 2) is self.y)
+        self.assertRaises(ValueError, numlib.smooth, self.y[:5], 11)
+        for window in ('flat', 'hanning', 'savgol'):
+            self.assertRaises(ValueError, smoothing.smooth, self.y[:11], 
+                              11, window)
+            y = smoothing.smooth(self.y[:12], 11, window)
+            self.assertEqual(len(y), 12)
+        self.assertRaises(ValueError, numlib.smooth, 
+                          self.y.reshape(100, 50), 11)
+        
+    def test_windows(self):
+        x = numpy.linspace(0, 1, 1000)
+        line = 3 * x + 1
+        for window in smoothing.WINDOWS:
+            for window_len in (51, 101):
+                y = smoothing.smooth(line, window_len, window)
+                # straight lines are kept, the borders are nearly kept
+                self.assertTrue(numpy.allclose(y[60:-60], line[60:-60]), 
+                                window)
+                self.assertTrue(numpy.allclose(y, line, atol=0.01), window)
+        # Savitzky-Golay keeps polynomials up to polyorder
+        cubic = x**3 - x
+        self.assertTrue(numpy.allclose(smoothing.savgol(cubic, 51), cubic))
+        self.assertRaises(ValueError, smoothing.smooth, line, 11, 'kaiser')
+        self.assertRaises(ValueError, smoothing.smooth, line, 11, 
+                          'hanning', 'spline')
+        
+    def test_out(self):
+        for window in ('flat', 'hanning', 'savgol'):
+            expected = smoothing.smooth(self.y, 21, window)
+            out = numpy.empty_like(self.y)
+            self.assertTrue(smoothing.smooth(self.y, 21, window, 
+                                             out=out) is out)
+            self.assertTrue(numpy.array_equal(out, expected))
+            y = self.y.copy()
+            smoothing.smooth(y, 21, window, out=y)
+            self.assertTrue(numpy.array_equal(y, expected))
+
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestSmoothing))
+
+if __name__ == '__main__':
+    unittest.main()
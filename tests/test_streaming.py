@@ -0,0 +1,113 @@
+# coding: utf-8
+
+import unittest
+
+import numpy
+from numpy.polynomial import Chebyshev
+
+from sitforc.core import modellib, ITMIdentifier
+from sitforc.streaming import (DecimatingBuffer, RingBuffer, 
+                               RecursivePolyFit, StreamingIdentifier)
+
+class TestRingBuffer(unittest.TestCase):
+    def test_ring_buffer(self):
+        buf = RingBuffer(5)
+        buf.extend([0, 1, 2], [0, 10, 20])
+        self.assertEqual(len(buf), 3)
+        buf.extend([3, 4, 5, 6], [30, 40, 50, 60])
+        x, y = buf.data()
+        self.assertEqual(x.tolist(), [2, 3, 4, 5, 6])
+        self.assertEqual(y.tolist(), [20, 30, 40, 50, 60])
+        buf.extend(numpy.arange(7, 20), numpy.arange(70, 200, 10))
+        self.assertEqual(buf.data()[0].tolist(), [15, 16, 17, 18, 19])
+        self.assertEqual(buf.count, 20)
+        
+    def test_decimating_buffer(self):
+        buf = DecimatingBuffer(8)
+        for i in range(0, 40, 3):
+            buf.extend(numpy.arange(i, i + 3), -numpy.arange(i, i + 3))
+        x, y = buf.data()
+        self.assertEqual(buf.count, 42)
+        self.assertEqual(buf.stride, 8)
+        self.assertEqual(x.tolist(), [0, 8, 16, 24, 32, 40])
+        self.assertTrue(numpy.array_equal(y, -x))
+        buf.extend(numpy.arange(42, 100), numpy.arange(42, 100))
+        self.assertEqual(buf.data()[0].tolist(), range(0, 100, 16))
+        
+class TestRecursivePolyFit(unittest.TestCase):
+    def test_chunks(self):
+        x = numpy.linspace(0, 10, 1000)
+        y = numpy.sin(x) + 0.01 * numpy.random.RandomState(0).randn(1000)
+        rls = RecursivePolyFit(9, (0, 10))
+        for i in range(0, 1000, 64):
+            rls.update(x[i:i + 64], y[i:i + 64])
+        expected = Chebyshev.fit(x, y, 9)
+        self.assertTrue(numpy.allclose(rls.poly(x), expected(x), 
+                                       atol=1e-6))
+        
+        # old samples are forgotten
+        rls = RecursivePolyFit(1, (0, 10), forgetting=0.9)
+        rls.update(x[:500], numpy.zeros(500))
+        rls.update(x[500:], numpy.ones(500))
+        self.assertTrue(numpy.allclose(rls.poly(x[500:]), 1.0))
+        
+class TestStreamingIdentifier(unittest.TestCase):
+    def test_streaming(self):
+        x = numpy.linspace(0, 60, 6000)
+        rng = numpy.random.RandomState(0)
+        y = modellib.pt2(x, dict(c=3.2, t1=6.0, t2=2.5)) 
+        y += 0.02 * rng.randn(len(x))
+        stream = StreamingIdentifier(modellib.pt2, 8000)
+        self.assertEqual(stream.params, None)
+        for i in range(0, len(x), 400):
+            stream.update(x[i:i + 400], y[i:i + 400])
+        self.assertTrue(stream.success)
+        self.assertAlmostEqual(stream.params['c'], 3.2, 2)
+        self.assertTrue(stream.rls.domain[1] >= 60)
+        self.assertTrue(numpy.allclose(stream.model_fitter.y, 
+                                       modellib.pt2(x, stream.params)))
+        
+        itmi = stream.itm_identifier()
+        expected = ITMIdentifier(x, y)
+        self.assertAlmostEqual(itmi.tu, expected.tu, 1)
+        self.assertAlmostEqual(itmi.tg, expected.tg, 0)
+        
+        stream = StreamingIdentifier(modellib.pt2, degree=0)
+        stream.update(x, y)
+        self.assertEqual(stream.poly_fitter, None)
+        self.assertRaises(ValueError, stream.itm_identifier)
+    
+    def test_domain_growth(self):
+        # the range grows after the buffer was decimated
+        x = numpy.linspace(0, 60, 6000)
+        y = 3.2 * (1 - numpy.exp(-x / 6.0)) + 0.3 * numpy.sin(x)
+        stream = StreamingIdentifier(capacity=500, degree=9)
+        for i in range(0, len(x), 400):
+            stream.update(x[i:i + 400], y[i:i + 400])
+        self.assertTrue(stream.buffer.stride > 1)
+        expected = Chebyshev.fit(x, y, 9, domain=stream.rls.domain)
+        self.assertTrue(numpy.allclose(stream.rls.poly(x), expected(x), 
+                                       atol=0.03))
+    
+    def test_sliding(self):
+        x = numpy.linspace(0, 100, 10000)
+        y = numpy.sin(x / 4.0)
+        stream = StreamingIdentifier(capacity=1000, sliding=True, 
+                                     degree=9)
+        for i in range(0, len(x), 300):
+            stream.update(x[i:i + 300], y[i:i + 300])
+            wx, wy = stream.data
+            self.assertTrue(numpy.allclose(stream.poly_fitter.y, wy,
+                                           atol=1e-3))
+        # the domain follows the window
+        self.assertEqual(stream.rls.domain, (wx[0], wx[-1]))
+        self.assertEqual(wx[-1], 100)
+        self.assertEqual(stream.rls.count, 1000)
+
+suite = unittest.TestSuite()
+suite.addTest(unittest.makeSuite(TestRingBuffer))
+suite.addTest(unittest.makeSuite(TestRecursivePolyFit))
+suite.addTest(unittest.makeSuite(TestStreamingIdentifier))
+
+if __name__ == '__main__':
+    unittest.main()
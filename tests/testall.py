@@ -4,13 +4,31 @@
 import unittest
 import sys
 
+import test_batch
+import test_compiler
 import test_core
+import test_fitting
 import test_funcparser
+import test_guess
+import test_iolib
+import test_numlib
+import test_preprocessing
+import test_smoothing
+import test_streaming
 
  
 suite = unittest.TestSuite()
+suite.addTest(test_batch.suite)
+suite.addTest(test_compiler.suite)
 suite.addTest(test_core.suite)
+suite.addTest(test_fitting.suite)
 suite.addTest(test_funcparser.suite)
+suite.addTest(test_guess.suite)
+suite.addTest(test_iolib.suite)
+suite.addTest(test_numlib.suite)
+suite.addTest(test_preprocessing.suite)
+suite.addTest(test_smoothing.suite)
+suite.addTest(test_streaming.suite)
 
 
 if __name__ == '__main__':